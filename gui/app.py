@@ -1,7 +1,6 @@
 """Aplicación de interfaz gráfica para detección UAV."""
 
 import threading
-import queue
 import time
 import cv2
 from PIL import Image, ImageTk
@@ -10,7 +9,7 @@ import customtkinter as ctk
 from src import config
 from src.hotspot import levantar_hotspot, bajar_hotspot, conexion_hotspot_activa, obtener_ip_hotspot
 from src.mediamtx import iniciar_mediamtx, detener_mediamtx
-from src.video import abrir_stream, lector_frames, crear_writer
+from src.video import BuzonFrames, abrir_stream, lector_frames, crear_writer, redimensionar_para_mostrar
 from src.detector import DetectorYOLO
 
 # Configurar tema de CustomTkinter
@@ -38,11 +37,13 @@ class DeteccionUAVApp(ctk.CTk):
         self.lector_thread = None
         self.mediamtx_proc = None
         self.stop_event = threading.Event()
-        self.frame_queue = queue.Queue(maxsize=1)
+        self.buzon_frames = BuzonFrames()
         self.inferir = False
         self.fps_hist = []
         self.frame_count = 0
         self.current_model = 'uav'  # Modelo actual seleccionado
+        self.cambio_pendiente = None  # (clave, detector) listo para activarse entre dos frames
+        self.cambio_lock = threading.Lock()
         
         # Configurar ventana
         self.title("Detección UAV - Sistema RTMP")
@@ -139,6 +140,13 @@ class DeteccionUAVApp(ctk.CTk):
         self.model_selector.set(model_display_names.get('uav', 'General UAV'))
         self.model_selector.pack(pady=5, padx=20, fill="x")
         
+        self.model_status = ctk.CTkLabel(
+            control_frame,
+            text="",
+            font=ctk.CTkFont(size=11)
+        )
+        self.model_status.pack(pady=(0, 5), padx=20)
+        
         # Separador
         separator1 = ctk.CTkFrame(control_frame, height=2, fg_color="gray")
         separator1.pack(fill="x", padx=20, pady=10)
@@ -273,6 +281,7 @@ class DeteccionUAVApp(ctk.CTk):
                 self.detector = DetectorYOLO(model_path=model_path)
             else:
                 self.detector = DetectorYOLO()  # Usar modelo por defecto
+            self.detector.calentar()
             
             # Abrir stream
             self.after(0, lambda: self.stream_status.configure(text="Stream RTMP: Conectando..."))
@@ -288,7 +297,7 @@ class DeteccionUAVApp(ctk.CTk):
             # Iniciar hilo lector
             self.lector_thread = threading.Thread(
                 target=lector_frames, 
-                args=(self.cap, self.frame_queue, self.stop_event), 
+                args=(self.cap, self.buzon_frames, self.stop_event), 
                 daemon=True
             )
             self.lector_thread.start()
@@ -312,13 +321,17 @@ class DeteccionUAVApp(ctk.CTk):
         if self.stop_event.is_set():
             return
         
-        try:
-            frame = self.frame_queue.get(timeout=0.1)
-        except queue.Empty:
+        # Cambiar de modelo solo entre dos frames
+        self.aplicar_cambio_pendiente()
+        
+        resultado = self.buzon_frames.obtener(timeout=0.1)
+        if resultado is None:
             self.after(50, self.actualizar_video)
             return
+        _, frame, _ = resultado
         
-        annotated = frame.copy()
+        # Sin inferencia se muestra el frame tal cual (no se modifica, no hace falta copiarlo)
+        annotated = frame
         
         if self.inferir and self.detector:
             annotated, elapsed, _ = self.detector.detectar(frame)  # Ignoramos clases_detectadas por ahora
@@ -334,31 +347,38 @@ class DeteccionUAVApp(ctk.CTk):
         
         # Actualizar contador de frames
         self.frame_count += 1
-        self.after(0, lambda: self.frames_label.configure(text=f"Frames: {self.frame_count}"))
+        edad_ms = self.buzon_frames.ultima_edad * 1000
+        self.after(0, lambda: self.frames_label.configure(text=f"Frames: {self.frame_count} (edad {edad_ms:.0f} ms)"))
+        
+        # Con la ventana minimizada no se convierte el frame para el widget;
+        # si tampoco se está grabando, no hace falta ni redimensionarlo
+        visible = self.state() != 'iconic' and self.video_label.winfo_viewable()
+        if not visible and self.writer is None:
+            self.after(33, self.actualizar_video)
+            return
+        
+        # El frame llega a resolución nativa; se reduce una sola vez para writer y widget
+        display = redimensionar_para_mostrar(annotated)
         
         # Guardar video si es necesario
         if self.writer is not None:
             try:
-                self.writer.write(annotated)
+                self.writer.write(display)
             except Exception as exc:
                 print(f"[WARN] No se pudo escribir en archivo: {exc}")
         
-        # Convertir frame de OpenCV a formato para CustomTkinter
-        # OpenCV usa BGR, necesitamos RGB
-        annotated_rgb = cv2.cvtColor(annotated, cv2.COLOR_BGR2RGB)
-        
-        # Redimensionar si es necesario para ajustar al widget
-        display_size = (640, 480)
-        if annotated_rgb.shape[:2] != display_size:
-            annotated_rgb = cv2.resize(annotated_rgb, display_size)
-        
-        # Convertir a PIL Image y luego a PhotoImage
-        image = Image.fromarray(annotated_rgb)
-        photo = ImageTk.PhotoImage(image=image)
-        
-        # Actualizar label con la imagen
-        self.video_label.configure(image=photo, text="")
-        self.video_label.image = photo  # Mantener referencia
+        if visible:
+            # Convertir frame de OpenCV a formato para CustomTkinter
+            # OpenCV usa BGR, necesitamos RGB
+            annotated_rgb = cv2.cvtColor(display, cv2.COLOR_BGR2RGB)
+            
+            # Convertir a PIL Image y luego a PhotoImage
+            image = Image.fromarray(annotated_rgb)
+            photo = ImageTk.PhotoImage(image=image)
+            
+            # Actualizar label con la imagen
+            self.video_label.configure(image=photo, text="")
+            self.video_label.image = photo  # Mantener referencia
         
         # Programar próxima actualización
         self.after(33, self.actualizar_video)  # ~30 FPS
@@ -427,32 +447,25 @@ class DeteccionUAVApp(ctk.CTk):
             self.after(0, lambda: self.model_selector.set(current_display))
             return
         
-        # Si la inferencia está activa, detenerla primero
-        if self.inferir:
-            print("[INFO] Deteniendo inferencia antes de cambiar modelo...")
-            self.inferir = False
-            self.after(0, lambda: self.btn_inferencia.configure(
-                text="Iniciar Inferencia",
-                fg_color=("gray75", "gray25")
-            ))
-            time.sleep(0.5)  # Dar tiempo para que termine el frame actual
-        
-        # Cargar el nuevo modelo en un hilo separado para no bloquear la GUI
+        # Cargar y calentar el nuevo modelo en un hilo separado; el actual sigue
+        # sirviendo hasta que actualizar_video aplique el cambio entre dos frames
         def cargar_modelo():
             try:
                 print(f"[INFO] Cargando modelo '{model_key}' desde: {model_path}")
-                self.after(0, lambda: self.video_label.configure(text=f"Cargando modelo {selected_display_name}..."))
+                self.after(0, lambda: self.model_status.configure(text=f"Cargando {clean_name}..."))
                 
                 new_detector = DetectorYOLO(model_path=model_path)
-                self.detector = new_detector
-                self.current_model = model_key
                 
-                print(f"[OK] Modelo '{model_key}' cargado exitosamente")
-                self.after(0, lambda: self.video_label.configure(text="Modelo cargado correctamente"))
+                self.after(0, lambda: self.model_status.configure(text=f"Calentando {clean_name}..."))
+                tiempo = new_detector.calentar()
+                print(f"[INFO] Modelo '{model_key}' calentado en {tiempo:.2f}s")
+                
+                with self.cambio_lock:
+                    self.cambio_pendiente = (model_key, new_detector)
                 
             except FileNotFoundError as exc:
                 print(f"[ERROR] Modelo no encontrado: {exc}")
-                self.after(0, lambda: self.video_label.configure(
+                self.after(0, lambda: self.model_status.configure(
                     text=f"Error: Modelo no encontrado"
                 ))
                 # Revertir la selección
@@ -466,7 +479,7 @@ class DeteccionUAVApp(ctk.CTk):
                 ))
             except Exception as exc:
                 print(f"[ERROR] Error al cargar modelo: {exc}")
-                self.after(0, lambda: self.video_label.configure(
+                self.after(0, lambda: self.model_status.configure(
                     text=f"Error al cargar modelo: {str(exc)[:50]}"
                 ))
                 # Revertir la selección
@@ -482,6 +495,19 @@ class DeteccionUAVApp(ctk.CTk):
         # Ejecutar en hilo separado
         threading.Thread(target=cargar_modelo, daemon=True).start()
     
+    def aplicar_cambio_pendiente(self):
+        """Activa el modelo cargado en segundo plano, si lo hay (llamado entre dos frames)."""
+        with self.cambio_lock:
+            pendiente, self.cambio_pendiente = self.cambio_pendiente, None
+        if pendiente is None:
+            return
+        
+        model_key, new_detector = pendiente
+        self.detector = new_detector
+        self.current_model = model_key
+        print(f"[OK] Modelo '{model_key}' activado")
+        self.model_status.configure(text="Modelo activo")
+    
     def on_closing(self):
         """Maneja el cierre de la aplicación."""
         print("[INFO] Cerrando aplicación...")
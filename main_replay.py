@@ -0,0 +1,61 @@
+"""Punto de entrada para el procesado offline de videos grabados (sin RTMP ni interfaz).
+
+Ejemplos:
+    python main_replay.py mision1.mp4 mision2.mp4 -o detecciones.jsonl
+    python main_replay.py mision.mp4 -o detecciones.npz --anotados salida/ --tiempo-real
+"""
+
+import argparse
+import json
+import sys
+
+
+def main():
+    """Función principal: procesa los videos indicados e imprime el resumen de throughput."""
+    from src import config
+
+    parser = argparse.ArgumentParser(description="Procesa videos grabados con el detector YOLO.")
+    parser.add_argument('videos', nargs='+', help="Archivos de video a procesar")
+    parser.add_argument('-o', '--salida', default='detecciones.jsonl',
+                        help="Archivo de detecciones: .jsonl (una línea por frame) o .npz (columnar)")
+    parser.add_argument('--anotados', default=None, help="Carpeta donde guardar un MP4 anotado por video")
+    parser.add_argument('--modelo', default=None, help="Ruta del modelo (por defecto config.MODEL_PATH)")
+    parser.add_argument('--backend', default=None, help="Backend de inferencia (por defecto config.MODEL_BACKEND)")
+    parser.add_argument('--conf', type=float, default=None, help="Threshold de confianza")
+    parser.add_argument('--clases', nargs='*', default=None, help="Nombres de clases a conservar")
+    parser.add_argument('--lote', type=int, default=config.INFER_BATCH_MAX, help="Frames por llamada al backend")
+    parser.add_argument('--decodificadores', type=int, default=2, help="Videos decodificados en paralelo")
+    parser.add_argument('--tiempo-real', action='store_true', help="Reproducir a los FPS originales del video")
+    parser.add_argument('--teselado', action='store_true', help="Activar el modo teselado (objetos pequeños)")
+    args = parser.parse_args()
+
+    from src.detector import DetectorYOLO
+    from src.replay import procesar_videos
+
+    try:
+        detector = DetectorYOLO(model_path=args.modelo, backend=args.backend)
+    except Exception as exc:
+        print(f"[ERROR] No se pudo cargar el modelo: {exc}")
+        return 1
+    if args.teselado:
+        detector.configurar_teselado(activo=True)
+    detector.calentar()
+
+    resumen = procesar_videos(
+        args.videos,
+        args.salida,
+        detector,
+        lote=args.lote,
+        decodificadores=args.decodificadores,
+        dir_anotados=args.anotados,
+        tiempo_real=args.tiempo_real,
+        conf_threshold=args.conf,
+        selected_classes=args.clases
+    )
+    print(f"[OK] {resumen['frames']} frames en {resumen['segundos']}s ({resumen['fps']} FPS)")
+    print(json.dumps(resumen, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
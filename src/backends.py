@@ -0,0 +1,393 @@
+"""Backends de inferencia intercambiables para el detector.
+
+Cada backend carga un modelo en un runtime concreto y devuelve las detecciones
+como arrays de NumPy en coordenadas del frame original, de modo que
+DetectorYOLO no depende de ultralytics ni de torch salvo que se use ese backend.
+
+Backends disponibles:
+    - 'ultralytics': ultralytics.YOLO (PyTorch, RKNN vía AutoBackend, etc.)
+    - 'onnxruntime': modelo .onnx exportado, ejecutado en CPU con ONNX Runtime
+    - 'rknn': modelo .rknn ejecutado directamente en la NPU con rknn-toolkit-lite2
+
+Los backends ONNX Runtime y RKNN hacen su propio preprocesado (letterbox),
+decodificación de la salida cruda de YOLO y NMS en NumPy.
+"""
+
+import ast
+import pathlib
+import cv2
+import numpy as np
+from . import config
+
+
+class BackendInferencia:
+    """Interfaz común de los backends de inferencia.
+
+    Atributos:
+        nombre: Identificador del backend (clave en BACKENDS)
+        names: Diccionario {id_clase: nombre_clase} del modelo
+    """
+
+    nombre = None
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+        self.names = {}
+
+    def predecir(self, frames, conf, imgsz=None):
+        """Ejecuta la inferencia sobre una lista de frames.
+
+        Args:
+            frames: Lista de frames BGR de OpenCV
+            conf: Threshold de confianza
+            imgsz: Tamaño de entrada del modelo (None = config.MODEL_IMGSZ). Solo
+                lo respetan los backends con entrada dinámica; los modelos
+                exportados con tamaño fijo usan siempre el suyo
+
+        Returns:
+            list: Una tupla (xyxy, confianzas, class_ids) por frame, con
+                xyxy np.ndarray float32 (N, 4) en coordenadas del frame original,
+                confianzas np.ndarray float32 (N,) y class_ids np.ndarray int (N,)
+        """
+        raise NotImplementedError
+
+
+class BackendUltralytics(BackendInferencia):
+    """Backend basado en ultralytics.YOLO (preprocesado y NMS de ultralytics)."""
+
+    nombre = 'ultralytics'
+
+    def __init__(self, model_path):
+        super().__init__(model_path)
+        from ultralytics import YOLO
+        self.model = YOLO(model_path, task='detect')
+        self.names = self.model.names
+
+    def predecir(self, frames, conf, imgsz=None):
+        results = self.model.predict(
+            list(frames),
+            conf=conf,
+            verbose=False,
+            imgsz=imgsz or config.MODEL_IMGSZ
+        )
+        salida = []
+        for result in results:
+            boxes = result.boxes
+            if boxes is None or len(boxes) == 0:
+                salida.append(_sin_detecciones())
+                continue
+            # Convertir a numpy de forma segura
+            if hasattr(boxes.cls, 'cpu'):
+                class_ids = boxes.cls.cpu().numpy().astype(int)
+                confidences = boxes.conf.cpu().numpy()
+                xyxy = boxes.xyxy.cpu().numpy()
+            else:
+                class_ids = boxes.cls.numpy().astype(int) if hasattr(boxes.cls, 'numpy') else boxes.cls.astype(int)
+                confidences = boxes.conf.numpy() if hasattr(boxes.conf, 'numpy') else boxes.conf
+                xyxy = boxes.xyxy.numpy() if hasattr(boxes.xyxy, 'numpy') else boxes.xyxy
+            salida.append((np.asarray(xyxy, dtype=np.float32), np.asarray(confidences, dtype=np.float32), class_ids))
+        return salida
+
+
+class BackendOnnxRuntime(BackendInferencia):
+    """Backend ONNX Runtime en CPU para modelos YOLO exportados a .onnx."""
+
+    nombre = 'onnxruntime'
+
+    def __init__(self, model_path):
+        super().__init__(model_path)
+        import onnxruntime as ort
+        ruta = _buscar_archivo(model_path, '.onnx')
+
+        opciones = ort.SessionOptions()
+        opciones.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if config.ONNX_THREADS:
+            opciones.intra_op_num_threads = config.ONNX_THREADS
+        self.session = ort.InferenceSession(
+            str(ruta), sess_options=opciones, providers=['CPUExecutionProvider']
+        )
+
+        entrada = self.session.get_inputs()[0]
+        self.input_name = entrada.name
+        # Dimensiones fijas (N, 3, H, W) del modelo exportado; si son dinámicas usar config
+        batch, _, alto, ancho = entrada.shape
+        self.batch_dinamico = not isinstance(batch, int)
+        self.forma_dinamica = not (isinstance(alto, int) and isinstance(ancho, int))
+        if self.forma_dinamica:
+            self.imgsz = (config.MODEL_IMGSZ, config.MODEL_IMGSZ)
+        else:
+            self.imgsz = (alto, ancho)
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        if 'names' in metadata:
+            self.names = ast.literal_eval(metadata['names'])
+
+    def predecir(self, frames, conf, imgsz=None):
+        tamano = (imgsz, imgsz) if imgsz and self.forma_dinamica else self.imgsz
+        preparados = [letterbox(frame, tamano) for frame in frames]
+        entradas = [
+            np.ascontiguousarray(img[:, :, ::-1].transpose(2, 0, 1), dtype=np.float32) / 255.0
+            for img, _, _ in preparados
+        ]
+
+        if self.batch_dinamico:
+            salidas = self.session.run(None, {self.input_name: np.stack(entradas)})[0]
+        else:
+            salidas = np.concatenate([
+                self.session.run(None, {self.input_name: entrada[None]})[0]
+                for entrada in entradas
+            ])
+
+        return [
+            escalar_detecciones(decodificar_yolo(salida, conf), ratio, pad, frame.shape)
+            for salida, frame, (_, ratio, pad) in zip(salidas, frames, preparados)
+        ]
+
+
+class BackendRKNN(BackendInferencia):
+    """Backend RKNN-lite que ejecuta modelos .rknn en la NPU del RK3588."""
+
+    nombre = 'rknn'
+
+    def __init__(self, model_path, npu_core=None):
+        """Carga el modelo en la NPU.
+
+        Args:
+            model_path: Ruta al .rknn o a la carpeta exportada por ultralytics
+            npu_core: Núcleo de la NPU (0, 1 o 2). None = asignación automática
+        """
+        super().__init__(model_path)
+        from rknnlite.api import RKNNLite
+        ruta = _buscar_archivo(model_path, '.rknn')
+
+        self.rknn = RKNNLite()
+        if self.rknn.load_rknn(str(ruta)) != 0:
+            raise RuntimeError(f"No se pudo cargar el modelo RKNN {ruta}")
+        nucleos = [RKNNLite.NPU_CORE_0, RKNNLite.NPU_CORE_1, RKNNLite.NPU_CORE_2]
+        core_mask = RKNNLite.NPU_CORE_AUTO if npu_core is None else nucleos[npu_core % 3]
+        if self.rknn.init_runtime(core_mask=core_mask) != 0:
+            raise RuntimeError("No se pudo inicializar el runtime RKNN")
+
+        # ultralytics exporta metadata.yaml junto al .rknn con nombres e imgsz
+        metadata = _leer_metadata(ruta.parent / 'metadata.yaml')
+        self.names = metadata.get('names', {})
+        imgsz = metadata.get('imgsz', config.MODEL_IMGSZ)
+        self.imgsz = tuple(imgsz) if isinstance(imgsz, (list, tuple)) else (imgsz, imgsz)
+        if not self.names:
+            # Sin nombres, el filtro de clases del detector descartaría todas las detecciones:
+            # se usan ids numéricos, con el número de clases sacado de la salida del modelo
+            vacia = np.zeros((1, self.imgsz[0], self.imgsz[1], 3), dtype=np.uint8)
+            n_clases = self.rknn.inference(inputs=[vacia])[0][0].shape[0] - 4
+            self.names = {i: str(i) for i in range(n_clases)}
+            print(f"[WARN] {ruta.parent / 'metadata.yaml'} sin nombres de clase: "
+                  f"se usan ids numéricos (0-{n_clases - 1})")
+
+    def predecir(self, frames, conf, imgsz=None):
+        salida = []
+        for frame in frames:
+            img, ratio, pad = letterbox(frame, self.imgsz)
+            # RKNN espera NHWC uint8 RGB; la normalización va dentro del modelo
+            entrada = np.ascontiguousarray(img[None, :, :, ::-1])
+            cruda = self.rknn.inference(inputs=[entrada])[0][0]
+            salida.append(escalar_detecciones(decodificar_yolo(cruda, conf), ratio, pad, frame.shape))
+        return salida
+
+    def __del__(self):
+        try:
+            self.rknn.release()
+        except Exception:
+            pass
+
+
+# Registro de backends por nombre (usado en MODELOS_DISPONIBLES)
+BACKENDS = {
+    BackendUltralytics.nombre: BackendUltralytics,
+    BackendOnnxRuntime.nombre: BackendOnnxRuntime,
+    BackendRKNN.nombre: BackendRKNN,
+}
+
+
+def crear_backend(nombre, model_path, **kwargs):
+    """Crea un backend de inferencia por nombre.
+
+    Args:
+        nombre: Clave en BACKENDS (None = config.MODEL_BACKEND)
+        model_path: Ruta al modelo (archivo o carpeta exportada)
+        **kwargs: Argumentos extra propios del backend
+
+    Returns:
+        BackendInferencia: Backend con el modelo cargado
+
+    Raises:
+        ValueError: Si el backend no existe
+        FileNotFoundError: Si no se encuentra el archivo del modelo
+    """
+    nombre = nombre or config.MODEL_BACKEND
+    if nombre not in BACKENDS:
+        raise ValueError(f"Backend '{nombre}' no válido. Disponibles: {list(BACKENDS)}")
+    return BACKENDS[nombre](model_path, **kwargs)
+
+
+def letterbox(frame, imgsz, color=(114, 114, 114)):
+    """Redimensiona manteniendo la relación de aspecto y rellena hasta imgsz.
+
+    Args:
+        frame: Frame BGR de OpenCV
+        imgsz: Tamaño destino (alto, ancho)
+        color: Color de relleno
+
+    Returns:
+        tuple: (imagen, ratio, (pad_x, pad_y))
+    """
+    alto, ancho = frame.shape[:2]
+    destino_alto, destino_ancho = imgsz
+    ratio = min(destino_alto / alto, destino_ancho / ancho)
+    nuevo_ancho, nuevo_alto = int(round(ancho * ratio)), int(round(alto * ratio))
+
+    if (nuevo_ancho, nuevo_alto) != (ancho, alto):
+        frame = cv2.resize(frame, (nuevo_ancho, nuevo_alto), interpolation=cv2.INTER_LINEAR)
+
+    pad_x = (destino_ancho - nuevo_ancho) / 2
+    pad_y = (destino_alto - nuevo_alto) / 2
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    img = cv2.copyMakeBorder(frame, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return img, ratio, (left, top)
+
+
+def decodificar_yolo(salida, conf, iou=None, max_det=None):
+    """Decodifica la salida cruda (4 + n_clases, N) de un modelo YOLOv8/YOLO11.
+
+    Args:
+        salida: np.ndarray (4 + n_clases, N) con cx, cy, w, h y scores por clase
+        conf: Threshold de confianza
+        iou: Threshold de IoU para NMS (None = config.NMS_IOU)
+        max_det: Máximo de detecciones (None = config.MAX_DET)
+
+    Returns:
+        tuple: (xyxy, confianzas, class_ids) en coordenadas de la entrada del modelo
+    """
+    iou = config.NMS_IOU if iou is None else iou
+    max_det = config.MAX_DET if max_det is None else max_det
+
+    predicciones = salida.T
+    scores = predicciones[:, 4:]
+    class_ids = scores.argmax(axis=1)
+    confianzas = scores[np.arange(len(scores)), class_ids]
+
+    mantener = confianzas > conf
+    if not mantener.any():
+        return _sin_detecciones()
+    cxcywh = predicciones[mantener, :4]
+    confianzas = confianzas[mantener].astype(np.float32)
+    class_ids = class_ids[mantener]
+
+    xyxy = np.empty_like(cxcywh, dtype=np.float32)
+    xyxy[:, :2] = cxcywh[:, :2] - cxcywh[:, 2:] / 2
+    xyxy[:, 2:] = cxcywh[:, :2] + cxcywh[:, 2:] / 2
+
+    indices = nms(xyxy, confianzas, iou, class_ids)[:max_det]
+    return xyxy[indices], confianzas[indices], class_ids[indices]
+
+
+_NMS_MAX_WH = 7680  # Mayor que cualquier coordenada de box (ancho/alto máximo de imagen)
+
+
+def nms(xyxy, scores, iou, class_ids=None):
+    """Non-maximum suppression greedy en NumPy.
+
+    Si se pasan class_ids, la supresión es por clase (los boxes se desplazan
+    por clase para que no se solapen entre clases distintas).
+
+    Args:
+        xyxy: np.ndarray (N, 4)
+        scores: np.ndarray (N,)
+        iou: Threshold de IoU
+        class_ids: np.ndarray (N,) opcional
+
+    Returns:
+        np.ndarray: Índices conservados, ordenados por score descendente
+    """
+    if len(xyxy) == 0:
+        return np.empty(0, dtype=int)
+    boxes = xyxy
+    if class_ids is not None:
+        # Desplazamiento constante por clase (como ultralytics): no depende de los
+        # datos, así que boxes con coordenadas negativas no se solapan entre clases
+        boxes = xyxy + class_ids[:, None] * _NMS_MAX_WH
+
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    orden = scores.argsort()[::-1]
+    conservados = []
+    while orden.size > 0:
+        i = orden[0]
+        conservados.append(i)
+        resto = orden[1:]
+        ancho = (np.minimum(x2[i], x2[resto]) - np.maximum(x1[i], x1[resto])).clip(0)
+        alto = (np.minimum(y2[i], y2[resto]) - np.maximum(y1[i], y1[resto])).clip(0)
+        interseccion = ancho * alto
+        union = areas[i] + areas[resto] - interseccion
+        solape = interseccion / np.maximum(union, 1e-9)
+        orden = resto[solape <= iou]
+    return np.array(conservados, dtype=int)
+
+
+def escalar_detecciones(detecciones, ratio, pad, shape):
+    """Pasa boxes de coordenadas letterbox a coordenadas del frame original.
+
+    Args:
+        detecciones: Tupla (xyxy, confianzas, class_ids)
+        ratio: Factor de escala usado en letterbox
+        pad: (pad_x, pad_y) usado en letterbox
+        shape: Shape del frame original
+
+    Returns:
+        tuple: (xyxy, confianzas, class_ids) en coordenadas del frame
+    """
+    xyxy, confianzas, class_ids = detecciones
+    if len(xyxy) == 0:
+        return detecciones
+    xyxy = xyxy.copy()
+    xyxy[:, [0, 2]] = ((xyxy[:, [0, 2]] - pad[0]) / ratio).clip(0, shape[1])
+    xyxy[:, [1, 3]] = ((xyxy[:, [1, 3]] - pad[1]) / ratio).clip(0, shape[0])
+    return xyxy, confianzas, class_ids
+
+
+def _sin_detecciones():
+    """Tupla de detecciones vacía."""
+    return (
+        np.zeros((0, 4), dtype=np.float32),
+        np.zeros(0, dtype=np.float32),
+        np.zeros(0, dtype=int),
+    )
+
+
+def _buscar_archivo(model_path, extension):
+    """Localiza el archivo del modelo, admitiendo carpetas exportadas por ultralytics.
+
+    Raises:
+        FileNotFoundError: Si no existe el archivo o la carpeta no contiene ninguno
+    """
+    ruta = pathlib.Path(model_path)
+    if ruta.is_dir():
+        encontrados = sorted(ruta.glob(f"*{extension}"))
+        if not encontrados:
+            raise FileNotFoundError(f"No se encontró ningún archivo {extension} en {ruta}")
+        return encontrados[0]
+    if not ruta.exists():
+        raise FileNotFoundError(f"No se encontró el modelo {ruta}")
+    return ruta
+
+
+def _leer_metadata(ruta):
+    """Lee metadata.yaml de un modelo exportado por ultralytics (si existe)."""
+    if not ruta.exists():
+        return {}
+    try:
+        import yaml
+        with open(ruta, encoding='utf-8') as archivo:
+            return yaml.safe_load(archivo) or {}
+    except Exception as exc:
+        print(f"[WARN] No se pudo leer {ruta}: {exc}")
+        return {}
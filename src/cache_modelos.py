@@ -0,0 +1,205 @@
+"""Caché LRU de detectores cargados para cambiar de modelo sin recargar desde disco."""
+
+import os
+import pathlib
+import threading
+import time
+from collections import OrderedDict
+from . import config
+from .detector import DetectorYOLO
+
+
+def _memoria_residente_mb():
+    """Memoria residente del proceso en MB (Linux), o None si no se puede medir."""
+    try:
+        with open('/proc/self/statm') as archivo:
+            paginas = int(archivo.read().split()[1])
+        return paginas * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _tamano_en_disco_mb(ruta):
+    """Tamaño del modelo en disco (archivo o carpeta) en MB."""
+    ruta = pathlib.Path(ruta)
+    try:
+        if ruta.is_dir():
+            return sum(p.stat().st_size for p in ruta.rglob('*') if p.is_file()) / (1024 * 1024)
+        return ruta.stat().st_size / (1024 * 1024)
+    except OSError:
+        return 0.0
+
+
+class CacheModelos:
+    """Caché LRU de instancias de DetectorYOLO.
+
+    La caché está acotada por número de modelos y por memoria estimada. La
+    memoria de cada entrada se estima con el incremento de memoria residente
+    durante la carga (o el tamaño en disco si no se puede medir).
+    """
+
+    def __init__(self, max_modelos=None, max_mb=None):
+        """
+        Args:
+            max_modelos: Número máximo de detectores en memoria
+            max_mb: Memoria máxima estimada en MB (0 = sin límite)
+        """
+        self.max_modelos = config.MODEL_CACHE_MAX if max_modelos is None else max_modelos
+        self.max_mb = config.MODEL_CACHE_MAX_MB if max_mb is None else max_mb
+        self._entradas = OrderedDict()  # {nombre: entrada}, la más reciente al final
+        self._lock = threading.RLock()
+        self._cargando = {}  # {nombre: threading.Lock} mientras se carga un modelo
+        self.activo = None  # Modelo que sirve la inferencia (no se expulsa)
+        self.limite_excedido = False  # True si los modelos en uso no caben en los límites
+
+    def obtener(self, nombre, modelo):
+        """Devuelve el detector del modelo, cargándolo si no está en caché.
+
+        Args:
+            nombre: Clave del modelo en MODELOS_DISPONIBLES
+            modelo: Diccionario {'path': ..., 'backend': ...}
+
+        Returns:
+            tuple: (detector, desde_cache)
+
+        Raises:
+            Las mismas excepciones que DetectorYOLO (FileNotFoundError, etc.)
+        """
+        with self._lock:
+            detector = self._buscar(nombre, modelo)
+            if detector is not None:
+                return detector, True
+            # Un lock por modelo evita cargarlo dos veces sin bloquear los aciertos de otros
+            lock_carga = self._cargando.setdefault(nombre, threading.Lock())
+
+        with lock_carga:
+            with self._lock:
+                # Otro hilo pudo terminar la carga mientras esperábamos
+                detector = self._buscar(nombre, modelo)
+                if detector is not None:
+                    return detector, True
+
+            memoria_antes = _memoria_residente_mb()
+            inicio = time.time()
+            detector = DetectorYOLO(model_path=modelo['path'], backend=modelo.get('backend'))
+            tiempo_carga = time.time() - inicio
+            memoria_despues = _memoria_residente_mb()
+
+            if memoria_antes is not None and memoria_despues is not None and memoria_despues > memoria_antes:
+                memoria_mb = memoria_despues - memoria_antes
+            else:
+                memoria_mb = _tamano_en_disco_mb(modelo['path'])
+
+            with self._lock:
+                self._entradas[nombre] = {
+                    'detector': detector,
+                    'modelo': dict(modelo),
+                    'tiempo_carga': tiempo_carga,
+                    'ultimo_uso': time.time(),
+                    'memoria_mb': memoria_mb,
+                }
+                self._expulsar(proteger=nombre)
+            print(f"[INFO] Modelo '{nombre}' en caché (carga {tiempo_carga:.2f}s, ~{memoria_mb:.0f} MB)")
+            return detector, False
+
+    def _buscar(self, nombre, modelo):
+        """Devuelve el detector en caché y lo marca como usado (requiere self._lock)."""
+        entrada = self._entradas.get(nombre)
+        if entrada is None:
+            return None
+        if entrada['modelo'] != modelo:
+            # La ruta o el backend cambiaron: descartar la entrada vieja
+            self._entradas.pop(nombre)
+            return None
+        entrada['ultimo_uso'] = time.time()
+        self._entradas.move_to_end(nombre)
+        return entrada['detector']
+
+    def contiene(self, nombre):
+        """Indica si el modelo está cargado en caché."""
+        with self._lock:
+            return nombre in self._entradas
+
+    def activar(self, nombre):
+        """Marca el modelo que está sirviendo inferencia; nunca se expulsa.
+
+        Args:
+            nombre: Clave del modelo activo (None = ninguno)
+        """
+        with self._lock:
+            self.activo = nombre
+            self._expulsar()
+
+    def _expulsar(self, proteger=None):
+        """Expulsa las entradas menos usadas hasta cumplir los límites.
+
+        Nunca expulsa el modelo activo ni el indicado en proteger (el que se
+        acaba de cargar). Si aun así no se cumplen los límites, lo informa y
+        marca limite_excedido.
+        """
+        intocables = {self.activo, proteger}
+        while True:
+            total_mb = sum(e['memoria_mb'] for e in self._entradas.values())
+            excede = len(self._entradas) > self.max_modelos or (self.max_mb and total_mb > self.max_mb)
+            if not excede:
+                self.limite_excedido = False
+                return
+            nombre = next((n for n in self._entradas if n not in intocables), None)
+            if nombre is None:
+                break
+            self._entradas.pop(nombre)
+            print(f"[INFO] Modelo '{nombre}' expulsado de la caché")
+        self.limite_excedido = True
+        print(f"[ERROR] La caché de modelos supera sus límites ({len(self._entradas)} modelos, "
+              f"~{total_mb:.0f} MB) y solo quedan modelos en uso")
+
+    def precargar(self, modelos):
+        """Carga en segundo plano los modelos disponibles hasta llenar la caché.
+
+        No expulsa modelos: se detiene al alcanzar el límite de número de modelos.
+
+        Args:
+            modelos: Diccionario {nombre: {'path': ..., 'backend': ...} o None}
+
+        Returns:
+            threading.Thread: Hilo de precarga (daemon)
+        """
+        def _precargar():
+            for nombre, modelo in modelos.items():
+                if modelo is None or self.contiene(nombre):
+                    continue
+                with self._lock:
+                    if len(self._entradas) >= self.max_modelos:
+                        break
+                try:
+                    detector, desde_cache = self.obtener(nombre, modelo)
+                    if not desde_cache:
+                        # Calentado de antemano, el cambio a este modelo es inmediato
+                        detector.calentar()
+                except Exception as exc:
+                    print(f"[WARN] No se pudo precargar el modelo '{nombre}': {exc}")
+
+        hilo = threading.Thread(target=_precargar, daemon=True)
+        hilo.start()
+        return hilo
+
+    def estado(self):
+        """Estado de cada entrada de la caché, de la menos a la más reciente.
+
+        Returns:
+            list: Diccionarios con nombre, ruta, backend, tiempo de carga,
+                último uso (epoch), memoria estimada y si es el modelo activo
+        """
+        with self._lock:
+            return [
+                {
+                    'model': nombre,
+                    'path': entrada['modelo']['path'],
+                    'backend': entrada['modelo'].get('backend'),
+                    'tiempo_carga_s': round(entrada['tiempo_carga'], 2),
+                    'ultimo_uso': entrada['ultimo_uso'],
+                    'memoria_mb': round(entrada['memoria_mb'], 1),
+                    'activo': nombre == self.activo,
+                }
+                for nombre, entrada in self._entradas.items()
+            ]
@@ -23,15 +23,159 @@ else:
 # Configuración RTMP
 RTMP_URL = "rtmp://127.0.0.1:1935/live/dron"
 
+# Multi-dron (src/streams.py): {ruta MediaMTX: peso}. Vacío = un solo stream (RTMP_URL).
+# Ejemplo: {"live/dron": 2, "live/dron2": 1}
+STREAMS = {}
+RTMP_BASE = "rtmp://127.0.0.1:1935"  # Base de las URLs de STREAMS
+STREAM_POLICY = "wrr"  # "wrr" (round-robin ponderado) o "deadline" (primero el plazo más próximo)
+STREAM_DEADLINE = 0.2  # Plazo en segundos desde la captura (se divide por el peso del stream)
+
 # Configuración del modelo
 # En Orange Pi: carpeta Visdrone_yolo11n_rknn_model/ al mismo nivel que src/
 # Si el modelo está en una carpeta, YOLO buscará automáticamente el archivo .rknn o .pt dentro
 MODEL_PATH = "Visdrone_yolo11n_rknn_model"
 # Alternativa si el modelo es un archivo específico:
 # MODEL_PATH = "Visdrone_yolo11n_rknn_model/modelo.rknn"  # o .pt
+# Backend de inferencia por defecto: 'ultralytics', 'onnxruntime' (CPU) o 'rknn' (NPU)
+MODEL_BACKEND = "ultralytics"
 CONF_THRESH = 0.3
+NMS_IOU = 0.7  # IoU del NMS propio de los backends onnxruntime/rknn (igual que ultralytics)
+MAX_DET = 300
+ONNX_THREADS = 0  # Hilos intra-op de ONNX Runtime (0 = automático)
+
+# Modo teselado: divide el frame en tiles solapados a resolución nativa, los
+# procesa como un lote y fusiona las detecciones con NMS entre tiles. Mejora el
+# recall de objetos pequeños (VisDrone) a costa de latencia. Se puede cambiar en
+# caliente desde /api/inference/config.
+TILED_MODE = False
+TILE_SIZE = 640  # Lado de cada tile en píxeles del frame original
+TILE_OVERLAP = 0.2  # Fracción de solape entre tiles vecinos
+TILE_GRID = None  # (columnas, filas) para fijar el número de tiles; None = según TILE_SIZE
+TILE_INCLUDE_FULL = True  # Añadir el frame completo al lote (objetos grandes)
+TILE_NMS_IOU = 0.5  # IoU del NMS que fusiona detecciones entre tiles
 MODEL_IMGSZ = 1024 # 640 es el tamaño por defecto de los modelos de yolo, pero se puede aumentar para mejor precisión
-FRAME_SIZE = (640, 480)
+FRAME_SIZE = (640, 480)  # Tamaño de visualización/codificación (ancho, alto)
+# Transporte de frames por Socket.IO: True = JPEG como adjunto binario con una
+# cabecera JSON pequeña; False = JPEG en base64 dentro del JSON (formato anterior)
+WS_BINARY = True
+
+# Envío por visor (src/difusion.py): cada cliente tiene una ventana de frames sin
+# confirmar y solo guarda el último pendiente; su nivel de calidad baja si el
+# tiempo de ida y vuelta de los acks supera VIEWER_RTT_DEGRADE y sube si baja de
+# VIEWER_RTT_UPGRADE. Niveles: (ancho, alto, calidad JPEG), del mejor al peor.
+VIEWER_TIERS = [(FRAME_SIZE[0], FRAME_SIZE[1], 75), (480, 360, 60), (320, 240, 45)]
+VIEWER_WINDOW = 2  # Frames enviados sin ack por visor
+VIEWER_ACK_TIMEOUT = 2.0  # Segundos sin ack antes de dar un frame por perdido
+VIEWER_RTT_DEGRADE = 0.25
+VIEWER_RTT_UPGRADE = 0.08
+VIEWER_TIER_HOLD = 2.0  # Segundos mínimos entre dos cambios de nivel de un visor
+
+# Overlay en el cliente: el servidor no dibuja las detecciones; envía el frame
+# sin anotar y las cajas (xyxy, confianza, clase, id de track) en binario, y el
+# navegador las pinta con sus propios colores y filtro de clases
+CLIENT_OVERLAY = False
+# Tamaño al que el lector redimensiona cada frame antes de encolarlo.
+# None = conservar la resolución nativa del stream (el modelo hace su propio letterbox)
+INGEST_SIZE = None
+
+# Motor de ingesta: "opencv" (cv2.VideoCapture) o "ffmpeg" (subproceso ffmpeg que
+# entrega BGR crudo leído con readinto en un anillo de buffers preasignados).
+# Con "ffmpeg", RTMP_URL también puede ser un archivo local para pruebas.
+INGEST_ENGINE = "opencv"
+FFMPEG_BIN = "ffmpeg"
+FFPROBE_BIN = "ffprobe"
+FFMPEG_THREADS = 0  # Hilos del decodificador (0 = automático)
+# Buffers del anillo de lectura. Un buffer no se reutiliza mientras el pipeline lo
+# retenga (buzón, inferencia, micro-lotes, caché JPEG), por lento que vaya: si todos
+# están en uso el anillo crece hasta FFMPEG_RING_MAX y, por encima, se reserva un
+# buffer suelto por frame (CapturaFFmpeg.buffers_extra)
+FFMPEG_RING = 8
+FFMPEG_RING_MAX = 24
+FFMPEG_TIMEOUT = 5.0  # Segundos sin datos antes de dar la conexión por perdida
+FFMPEG_REALTIME = False  # Leer a la velocidad nativa del video (-re), para archivos locales
+
+# Codificación H.264 de las salidas por ffmpeg (video.SalidaFFmpeg). En el RK3588S
+# se puede usar el codificador por hardware: ENCODER_H264 = "h264_rkmpp", ENCODER_H264_ARGS = []
+ENCODER_H264 = "libx264"
+ENCODER_H264_ARGS = ['-preset', 'ultrafast', '-tune', 'zerolatency']
+ENCODER_BITRATE = "2M"
+ENCODER_GOP = 30  # Frames entre keyframes (un visor nuevo espera como mucho un GOP)
+
+# Republicación del video anotado en MediaMTX (src/mediamtx.py): cada stream se
+# publica por RTMP en "<ruta>_annotated" y queda disponible por RTSP/HLS/WebRTC.
+# Si el codificador va atrasado se descartan frames; la inferencia nunca espera.
+PUBLISH_ANNOTATED = False
+PUBLISH_PATH = "live/dron_annotated"  # Ruta en modo de un solo stream
+PUBLISH_SIZE = None  # (ancho, alto); None = FRAME_SIZE
+PUBLISH_RETRY = 5.0  # Segundos entre reintentos si ffmpeg termina
+
+# Grabación en el servidor (/api/recording): el video anotado se codifica con
+# ffmpeg en segmentos MP4 fragmentados dentro de RECORD_DIR/<fecha>/. Con
+# RECORD_SERVER = False la web graba en el navegador (MediaRecorder) y convierte
+# el WebM con /api/video/convert.
+RECORD_SERVER = True
+RECORD_DIR = BASE_DIR / "grabaciones"
+RECORD_SEGMENT = 60  # Segundos por segmento
+
+# Conversión a MP4 de los videos grabados en el navegador (src/conversion.py,
+# /api/video/convert). Los trabajos se encolan y los ejecuta un pool acotado; si
+# los códecs ya sirven para MP4 solo se remultiplexa. La recodificación corre con
+# prioridad baja y pocos hilos para no frenar la inferencia en vivo.
+CONVERT_WORKERS = 1  # Conversiones simultáneas
+CONVERT_QUEUE_MAX = 8  # Trabajos en espera antes de rechazar con 503
+CONVERT_THREADS = 2  # Hilos de libx264 por conversión
+CONVERT_NICE = 10  # Incremento de nice del ffmpeg que recodifica (Linux)
+CONVERT_PROGRESS_INTERVAL = 0.5  # Segundos mínimos entre eventos de progreso
+CONVERT_MAX_AGE = 3600  # Segundos que se guarda un MP4 convertido sin descargar
+# Conversión en vivo: el navegador sube cada fragmento de MediaRecorder mientras
+# graba y ffmpeg lo convierte sobre la marcha (/api/video/upload)
+CONVERT_LIVE_MAX = 4  # Grabaciones subiéndose a la vez (las demás se suben al terminar)
+CONVERT_LIVE_TIMEOUT = 60  # Segundos sin fragmentos antes de cerrar la conversión
+
+# Caché LRU de modelos cargados (src/cache_modelos.py)
+MODEL_CACHE_MAX = 2  # Número máximo de modelos en memoria
+MODEL_CACHE_MAX_MB = 1500  # Memoria máxima estimada en MB (0 = sin límite)
+MODEL_PRELOAD = False  # Precargar en segundo plano los modelos de MODELOS_DISPONIBLES
+
+# Micro-lotes de inferencia: cuando el pipeline va atrasado (ya hay otro frame
+# esperando en la cola) se agrupan hasta INFER_BATCH_MAX frames en una sola
+# llamada a predict, esperando como máximo INFER_BATCH_WAIT segundos por frame.
+# Con INFER_BATCH_MAX = 1 se desactiva y se procesa frame a frame.
+INFER_BATCH_MAX = 4
+INFER_BATCH_WAIT = 0.01
+
+# Pool de detectores en procesos separados (src/pool.py). 0 = un solo detector
+# en el proceso principal. En el RK3588S con backend 'rknn' usar 3 (un worker
+# por núcleo de NPU); con backends de CPU, un worker por núcleo A76 libre.
+POOL_WORKERS = 0
+
+# Transporte de frames por memoria compartida (src/memoria_compartida.py): los
+# frames del pool viajan en anillos de slots y por las colas solo pasan
+# descriptores (slot, secuencia). Los frames mayores que SHM_SLOT_BYTES se envían
+# serializados como antes.
+SHM_TRANSPORT = True
+SHM_SLOT_BYTES = 1920 * 1080 * 3
+# Ingesta en un proceso aparte que escribe en un anillo compartido, para que la
+# decodificación no compita por el GIL con la inferencia y Flask
+INGEST_PROCESS = False
+INGEST_SHM_SLOTS = 8  # CapturaProceso copia cada frame y descarta los que se reescribieron al copiarlos
+
+# Detección intercalada con tracker (src/tracker.py): el detector corre en un
+# hilo cada N frames y un tracker IoU propaga los boxes en los intermedios.
+# N se adapta a la latencia de inferencia dentro de [DETECT_N_MIN, DETECT_N_MAX].
+TRACKER_MODE = False
+DETECT_N_MIN = 1  # 1 = detectar en cuanto el detector quede libre
+DETECT_N_MAX = 10
+TRACKER_IOU = 0.3  # IoU mínimo para asociar detección y track
+TRACKER_MAX_MISSES = 2  # Detecciones seguidas sin asociar antes de borrar un track
+
+# Compuerta de movimiento (src/movimiento.py): si la escena apenas cambia respecto
+# al último frame inferido se reutilizan las detecciones y se salta la inferencia
+# (ahorra batería con el dron en hover). Configurable desde /api/inference/config.
+MOTION_GATE = False
+MOTION_THRESHOLD = 2.0  # Diferencia media en niveles de gris (0-255) para considerar cambio
+MOTION_MAX_SKIP = 30  # Frames seguidos sin inferir antes de forzar una inferencia
+MOTION_SIZE = (64, 48)  # Tamaño de la miniatura que se compara
 
 # Configuración de salida de video
 OUTPUT_VIDEO = None  # Por ejemplo "output_rknn.mp4" si quieres grabar
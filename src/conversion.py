@@ -0,0 +1,462 @@
+"""Cola de conversiones de video a MP4 con progreso.
+
+Los videos subidos desde el navegador (MediaRecorder) se convierten a MP4 en
+un pool acotado de hilos worker, cada uno con su subproceso ffmpeg. Si los
+códecs del archivo ya son compatibles con MP4 solo se remultiplexa
+(-c copy); si no, se recodifica con prioridad baja (nice) y pocos hilos para
+no quitarle CPU al pipeline en vivo. El progreso sale de '-progress pipe:1'
+y se notifica con una función externa (en la web, un evento de Socket.IO).
+
+Los archivos de cada trabajo se borran por conteo de referencias: la reserva
+del cliente que lo creó y cada descarga en curso; cuando no queda ninguna,
+se eliminan la entrada y el MP4.
+
+Las conversiones en vivo no esperan al archivo completo: el navegador sube
+cada fragmento de MediaRecorder mientras graba y se escribe directamente en
+el stdin de ffmpeg, así el MP4 está listo casi en cuanto termina la grabación
+y ni el navegador ni el servidor acumulan el video en memoria.
+"""
+
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from . import config
+
+# Códecs que se copian tal cual al MP4 (sin recodificar)
+CODECS_VIDEO_MP4 = ('h264', 'hevc')
+CODECS_AUDIO_MP4 = ('aac', 'mp3')
+
+
+class TrabajoConversion:
+    """Conversión de un archivo a MP4: estado, progreso y referencias a sus archivos."""
+
+    def __init__(self, entrada, salida, sid=None):
+        self.id = uuid.uuid4().hex
+        self.entrada = entrada
+        self.salida = salida
+        self.sid = sid  # Cliente al que notificar el progreso
+        self.estado = 'en_cola'  # en_cola, recibiendo (en vivo), convirtiendo, listo, error
+        self.modo = None  # 'remux' o 'transcode'
+        self.progreso = None  # Fracción 0-1 (None si no se conoce la duración)
+        self.segundos = 0.0  # Segundos de video ya convertidos
+        self.error = None
+        self.creado = time.time()
+        self.terminado = None
+        self.bloques = 0  # Fragmentos recibidos (conversión en vivo)
+        self.bytes = 0
+        self.ultimo_bloque = time.time()
+        self._proceso = None  # ffmpeg que lee del stdin (conversión en vivo)
+        self._refs = 1  # Reserva del cliente hasta la primera descarga
+        self._reservado = True
+        self._lock = threading.Lock()
+        self._lock_escritura = threading.Lock()  # Serializa las escrituras en el stdin de ffmpeg
+
+    def adquirir(self):
+        """Toma una referencia a los archivos (p. ej. durante una descarga).
+
+        Returns:
+            bool: False si los archivos ya se eliminaron
+        """
+        with self._lock:
+            if self._refs == 0:
+                return False
+            self._refs += 1
+            return True
+
+    def liberar(self):
+        """Suelta una referencia; con la última se eliminan los archivos."""
+        with self._lock:
+            self._refs -= 1
+            borrar = self._refs == 0
+        if borrar:
+            for ruta in (self.entrada, self.salida):
+                if ruta is None:
+                    continue
+                try:
+                    os.remove(ruta)
+                    print(f"[INFO] Archivo temporal eliminado: {ruta}")
+                except FileNotFoundError:
+                    pass
+                except OSError as exc:
+                    print(f"[WARN] Error al eliminar archivo temporal {ruta}: {exc}")
+
+    def liberar_reserva(self):
+        """Suelta la reserva del cliente (una sola vez)."""
+        with self._lock:
+            if not self._reservado:
+                return
+            self._reservado = False
+        self.liberar()
+
+    @property
+    def vivo(self):
+        """Indica si los archivos del trabajo siguen en disco."""
+        return self._refs > 0
+
+    def a_dict(self):
+        """Estado del trabajo para la API y los eventos de progreso."""
+        return {
+            'id': self.id,
+            'estado': self.estado,
+            'modo': self.modo,
+            'progreso': round(self.progreso, 3) if self.progreso is not None else None,
+            'segundos': round(self.segundos, 1),
+            'bloques': self.bloques,
+            'error': self.error,
+        }
+
+
+def sondear_codecs(ruta):
+    """Obtiene los códecs y la duración de un archivo con ffprobe.
+
+    Returns:
+        tuple: (codec_video, codec_audio, duracion); None en lo que no se pudo leer
+    """
+    comando = [
+        config.FFPROBE_BIN, '-v', 'error',
+        '-show_entries', 'stream=codec_type,codec_name:format=duration',
+        '-of', 'json', ruta,
+    ]
+    try:
+        resultado = subprocess.run(comando, capture_output=True, text=True, timeout=30)
+        datos = json.loads(resultado.stdout or '{}')
+    except (OSError, subprocess.TimeoutExpired, ValueError) as exc:
+        print(f"[WARN] No se pudo sondear {ruta} con ffprobe: {exc}")
+        return None, None, None
+    codecs = {}
+    for stream in datos.get('streams', []):
+        codecs.setdefault(stream.get('codec_type'), stream.get('codec_name'))
+    try:
+        duracion = float(datos.get('format', {}).get('duration'))
+    except (TypeError, ValueError):
+        duracion = None  # Los WebM de MediaRecorder no suelen llevar duración
+    return codecs.get('video'), codecs.get('audio'), duracion
+
+
+def codec_de_mime(mime):
+    """Códec de video declarado en el tipo MIME de MediaRecorder (p. ej. 'video/webm;codecs=h264').
+
+    Returns:
+        str o None: 'h264' si se puede remultiplexar a MP4; None si hay que recodificar
+    """
+    mime = (mime or '').lower()
+    if 'avc1' in mime or 'h264' in mime or mime.startswith('video/mp4'):
+        # MediaRecorder solo graba H.264 en contenedor MP4
+        return 'h264'
+    return None
+
+
+def comando_conversion(entrada, salida, codec_video, codec_audio):
+    """Comando ffmpeg que convierte a MP4, copiando los códecs compatibles.
+
+    Returns:
+        tuple: (comando, modo) con modo 'remux' si no se recodifica nada
+    """
+    comando = [config.FFMPEG_BIN, '-hide_banner', '-loglevel', 'error', '-nostdin', '-y',
+               '-progress', 'pipe:1', '-nostats', '-i', entrada]
+    recodifica = False
+    if codec_video in CODECS_VIDEO_MP4:
+        comando += ['-c:v', 'copy']
+    else:
+        comando += ['-c:v', 'libx264', '-preset', 'fast', '-crf', '23',
+                    '-pix_fmt', 'yuv420p', '-threads', str(config.CONVERT_THREADS)]
+        recodifica = True
+    if codec_audio is None:
+        comando += ['-an']
+    elif codec_audio in CODECS_AUDIO_MP4:
+        comando += ['-c:a', 'copy']
+    else:
+        comando += ['-c:a', 'aac', '-b:a', '128k']
+        recodifica = True
+    comando += ['-movflags', '+faststart', salida]
+    return comando, 'transcode' if recodifica else 'remux'
+
+
+def _bajar_prioridad():
+    """Baja la prioridad del subproceso ffmpeg (solo Linux)."""
+    os.nice(config.CONVERT_NICE)
+
+
+class ColaConversiones:
+    """Trabajos de conversión y pool acotado de workers que los ejecuta."""
+
+    def __init__(self, directorio, notificar=None, n_workers=None):
+        """
+        Args:
+            directorio: Carpeta de los archivos temporales
+            notificar: Función notificar(trabajo) llamada al cambiar el estado o el progreso
+            n_workers: Conversiones simultáneas (None = config.CONVERT_WORKERS)
+        """
+        self.directorio = directorio
+        self._notificar = notificar
+        self._n_workers = n_workers or config.CONVERT_WORKERS
+        self._cola = queue.Queue(maxsize=config.CONVERT_QUEUE_MAX)
+        self._trabajos = {}
+        self._lock = threading.Lock()
+        self._hilos = []
+
+    def _arrancar_workers(self):
+        # Los workers se crean con el primer trabajo
+        if self._hilos:
+            return
+        for i in range(self._n_workers):
+            hilo = threading.Thread(target=self._worker, name=f"conversion-{i}", daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+
+    def nueva_entrada(self, extension='webm'):
+        """Ruta para guardar un archivo subido antes de encolar su conversión."""
+        os.makedirs(self.directorio, exist_ok=True)
+        return os.path.join(self.directorio, f'temp_{uuid.uuid4().hex}.{extension}')
+
+    def encolar(self, entrada, sid=None):
+        """Encola la conversión de un archivo ya guardado en disco.
+
+        Returns:
+            TrabajoConversion o None si la cola está llena (la entrada se elimina)
+        """
+        salida = os.path.splitext(entrada)[0] + '.mp4'
+        trabajo = TrabajoConversion(entrada, salida, sid)
+        with self._lock:
+            self._arrancar_workers()
+            try:
+                self._cola.put_nowait(trabajo)
+            except queue.Full:
+                trabajo.liberar_reserva()
+                return None
+            self._trabajos[trabajo.id] = trabajo
+        self._avisar(trabajo)
+        return trabajo
+
+    def obtener(self, id_trabajo):
+        """Trabajo por id (None si no existe o ya se purgó)."""
+        return self._trabajos.get(id_trabajo)
+
+    def _avisar(self, trabajo):
+        if self._notificar is not None:
+            try:
+                self._notificar(trabajo)
+            except Exception as exc:
+                print(f"[WARN] Error al notificar progreso de conversión: {exc}")
+
+    def _worker(self):
+        while True:
+            trabajo = self._cola.get()
+            try:
+                self._convertir(trabajo)
+            except Exception as exc:
+                trabajo.estado = 'error'
+                trabajo.error = str(exc)
+            finally:
+                trabajo.terminado = time.time()
+                # La entrada ya no hace falta: solo se conserva el MP4 hasta descargarlo
+                try:
+                    os.remove(trabajo.entrada)
+                except OSError:
+                    pass
+                if trabajo.estado == 'error':
+                    print(f"[ERROR] Error en conversión {trabajo.id}: {trabajo.error}")
+                    trabajo.liberar_reserva()
+                self._avisar(trabajo)
+
+    def _convertir(self, trabajo):
+        codec_video, codec_audio, duracion = sondear_codecs(trabajo.entrada)
+        if codec_video is None:
+            raise RuntimeError("El archivo no contiene video")
+        comando, trabajo.modo = comando_conversion(trabajo.entrada, trabajo.salida, codec_video, codec_audio)
+        trabajo.estado = 'convirtiendo'
+        print(f"[INFO] Convirtiendo {trabajo.entrada} a MP4 ({trabajo.modo}, {codec_video}/{codec_audio})")
+        self._avisar(trabajo)
+        self._seguir_progreso(trabajo, self._lanzar(comando, trabajo.modo), duracion)
+
+    @staticmethod
+    def _lanzar(comando, modo, en_vivo=False):
+        return subprocess.Popen(
+            comando,
+            stdin=subprocess.PIPE if en_vivo else None,
+            bufsize=0 if en_vivo else -1,  # Cada fragmento llega a ffmpeg al escribirlo
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=not en_vivo,
+            preexec_fn=_bajar_prioridad if sys.platform != "win32" and modo == 'transcode' else None
+        )
+
+    def _seguir_progreso(self, trabajo, proceso, duracion):
+        """Lee el progreso de ffmpeg hasta que termina y marca el trabajo como listo.
+
+        Raises:
+            RuntimeError: Si ffmpeg falla o no genera el MP4
+        """
+        errores = []
+        hilo_errores = threading.Thread(target=lambda: errores.extend(proceso.stderr), daemon=True)
+        hilo_errores.start()
+        ultimo_aviso = 0.0
+        for linea in proceso.stdout:
+            if isinstance(linea, bytes):
+                linea = linea.decode(errors='replace')
+            clave, _, valor = linea.strip().partition('=')
+            if clave == 'out_time_us' and valor.isdigit():
+                trabajo.segundos = int(valor) / 1_000_000
+                if duracion:
+                    trabajo.progreso = min(trabajo.segundos / duracion, 1.0)
+            elif clave == 'progress':
+                ahora = time.monotonic()
+                if ahora - ultimo_aviso >= config.CONVERT_PROGRESS_INTERVAL:
+                    ultimo_aviso = ahora
+                    self._avisar(trabajo)
+        proceso.wait()
+        hilo_errores.join(timeout=1.0)
+        if proceso.returncode != 0 or not os.path.exists(trabajo.salida):
+            if errores and isinstance(errores[0], bytes):
+                errores = [linea.decode(errors='replace') for linea in errores]
+            raise RuntimeError(''.join(errores)[-200:] or f"ffmpeg terminó con código {proceso.returncode}")
+        trabajo.progreso = 1.0
+        trabajo.estado = 'listo'
+        print(f"[OK] Video convertido: {trabajo.salida}")
+
+    def iniciar_en_vivo(self, mime, sid=None):
+        """Lanza una conversión que recibe el video por fragmentos mientras se graba.
+
+        Args:
+            mime: Tipo MIME de MediaRecorder; decide si se remultiplexa o recodifica
+            sid: Cliente al que notificar el progreso
+
+        Returns:
+            TrabajoConversion o None si ya hay config.CONVERT_LIVE_MAX en curso
+        """
+        self.purgar(config.CONVERT_MAX_AGE)
+        with self._lock:
+            en_vivo = sum(1 for t in self._trabajos.values() if t.estado == 'recibiendo')
+            if en_vivo >= config.CONVERT_LIVE_MAX:
+                return None
+            os.makedirs(self.directorio, exist_ok=True)
+            salida = os.path.join(self.directorio, f'temp_{uuid.uuid4().hex}.mp4')
+            trabajo = TrabajoConversion(None, salida, sid)
+            # Sin audio: MediaRecorder graba el canvas del video
+            comando, trabajo.modo = comando_conversion('pipe:0', salida, codec_de_mime(mime), None)
+            trabajo._proceso = self._lanzar(comando, trabajo.modo, en_vivo=True)
+            trabajo.estado = 'recibiendo'
+            self._trabajos[trabajo.id] = trabajo
+        print(f"[INFO] Conversión en vivo iniciada ({trabajo.modo}, {mime})")
+        threading.Thread(target=self._finalizar_en_vivo, args=(trabajo,), daemon=True).start()
+        self._avisar(trabajo)
+        return trabajo
+
+    def _finalizar_en_vivo(self, trabajo):
+        # Lee el progreso desde el principio para que ffmpeg nunca se bloquee escribiendo
+        try:
+            self._seguir_progreso(trabajo, trabajo._proceso, None)
+        except Exception as exc:
+            trabajo.estado = 'error'
+            trabajo.error = trabajo.error or str(exc)
+        finally:
+            trabajo.terminado = time.time()
+            if trabajo.estado == 'error':
+                print(f"[ERROR] Error en conversión en vivo {trabajo.id}: {trabajo.error}")
+                trabajo.liberar_reserva()
+            self._avisar(trabajo)
+
+    def anadir(self, trabajo, indice, datos):
+        """Escribe en ffmpeg el siguiente fragmento de una conversión en vivo.
+
+        Args:
+            indice: Número de fragmento (empieza en 0); deben llegar en orden
+
+        Returns:
+            str o None: Motivo del rechazo, o None si se escribió
+        """
+        # La escritura se hace fuera de trabajo._lock: si ffmpeg va atrasado solo
+        # espera esta petición, no terminar_en_vivo ni purgar
+        with trabajo._lock_escritura:
+            with trabajo._lock:
+                if trabajo.estado != 'recibiendo':
+                    error = "La conversión ya no recibe fragmentos"
+                elif indice != trabajo.bloques:
+                    error = f"Se esperaba el fragmento {trabajo.bloques}"
+                else:
+                    error = None
+            if error is None:
+                try:
+                    trabajo._proceso.stdin.write(datos)
+                except (BrokenPipeError, OSError) as exc:
+                    error = f"ffmpeg dejó de aceptar datos: {exc}"
+                else:
+                    with trabajo._lock:
+                        trabajo.bloques += 1
+                        trabajo.bytes += len(datos)
+                        trabajo.ultimo_bloque = time.time()
+        # Si se terminó durante la escritura, cerrar el stdin que no se pudo cerrar entonces
+        self._cerrar_entrada(trabajo)
+        return error
+
+    def terminar_en_vivo(self, trabajo):
+        """Cierra la entrada de una conversión en vivo: ffmpeg termina el MP4.
+
+        No espera a una escritura en curso: en ese caso cierra el stdin la
+        propia petición de anadir() al terminar de escribir.
+        """
+        with trabajo._lock:
+            if trabajo.estado != 'recibiendo':
+                return
+            trabajo.estado = 'convirtiendo'
+        self._cerrar_entrada(trabajo)
+        self._avisar(trabajo)
+
+    @staticmethod
+    def _cerrar_entrada(trabajo):
+        # Cierra el stdin de una conversión que ya no recibe fragmentos, salvo que
+        # otro hilo esté escribiendo (él lo cerrará al soltar _lock_escritura)
+        if trabajo.estado == 'recibiendo' or not trabajo._lock_escritura.acquire(blocking=False):
+            return
+        try:
+            if not trabajo._proceso.stdin.closed:
+                trabajo._proceso.stdin.close()
+        except OSError:
+            pass
+        finally:
+            trabajo._lock_escritura.release()
+
+    def cancelar_en_vivo(self, trabajo):
+        """Descarta una conversión en vivo y sus archivos."""
+        if trabajo._proceso is None or trabajo.estado not in ('recibiendo', 'convirtiendo'):
+            return
+        trabajo.error = "Cancelada"
+        # Sin tomar el lock: una escritura bloqueada en el stdin termina con el proceso
+        trabajo._proceso.kill()
+
+    def purgar(self, max_edad):
+        """Suelta la reserva de los trabajos terminados hace más de max_edad segundos
+        y olvida los que ya no tienen archivos. Las conversiones en vivo sin
+        fragmentos nuevos durante config.CONVERT_LIVE_TIMEOUT se cierran con lo recibido."""
+        ahora = time.time()
+        with self._lock:
+            trabajos = list(self._trabajos.values())
+        for trabajo in trabajos:
+            if trabajo.estado == 'recibiendo' and ahora - trabajo.ultimo_bloque > config.CONVERT_LIVE_TIMEOUT:
+                print(f"[WARN] Conversión en vivo {trabajo.id} sin datos: se cierra con lo recibido")
+                self.terminar_en_vivo(trabajo)
+            if trabajo.terminado is not None and ahora - trabajo.terminado > max_edad:
+                trabajo.liberar_reserva()
+            if not trabajo.vivo:
+                with self._lock:
+                    self._trabajos.pop(trabajo.id, None)
+
+    def archivos(self):
+        """Rutas de los archivos de trabajos vivos (no deben borrarse por antigüedad)."""
+        with self._lock:
+            return {ruta for t in self._trabajos.values() if t.vivo
+                    for ruta in (t.entrada, t.salida) if ruta is not None}
+
+    def stats(self):
+        """Trabajos por estado (para /api/status)."""
+        with self._lock:
+            trabajos = list(self._trabajos.values())
+        conteo = {}
+        for trabajo in trabajos:
+            conteo[trabajo.estado] = conteo.get(trabajo.estado, 0) + 1
+        return {'workers': self._n_workers, 'en_cola': self._cola.qsize(), 'trabajos': conteo}
@@ -3,23 +3,61 @@
 import time
 import cv2
 import numpy as np
-from ultralytics import YOLO
 from . import config
+from .backends import crear_backend, nms
 
 
 class DetectorYOLO:
     """Clase para manejar la detección de objetos con YOLO."""
     
-    def __init__(self, model_path=None):
+    def __init__(self, model_path=None, backend=None, **backend_kwargs):
         """Inicializa el detector cargando el modelo.
         
         Args:
             model_path: Ruta al modelo. Si es None, usa config.MODEL_PATH
+            backend: Backend de inferencia ('ultralytics', 'onnxruntime', 'rknn').
+                Si es None, usa config.MODEL_BACKEND
+            **backend_kwargs: Argumentos extra del backend (p. ej. npu_core para 'rknn')
         """
         print("[INFO] Cargando modelo YOLO…")
         path = model_path if model_path else config.MODEL_PATH
-        self.model = YOLO(path, task='detect')
-        print("[OK] Modelo cargado.")
+        self.backend = crear_backend(backend, path, **backend_kwargs)
+        print(f"[OK] Modelo cargado (backend: {self.backend.nombre}).")
+        
+        # Modo teselado (inferencia por tiles para objetos pequeños)
+        self.teselado = {
+            'activo': config.TILED_MODE,
+            'tile_size': config.TILE_SIZE,
+            'overlap': config.TILE_OVERLAP,
+            'grid': config.TILE_GRID,
+            'incluir_completo': config.TILE_INCLUDE_FULL,
+        }
+        self.stats_teselado = {}
+    
+    def configurar_teselado(self, activo=None, tile_size=None, overlap=None, grid=None, incluir_completo=None):
+        """Actualiza la configuración del modo teselado en caliente.
+        
+        Los parámetros a None conservan su valor actual.
+        
+        Args:
+            activo: Activa o desactiva el modo teselado
+            tile_size: Lado de cada tile en píxeles del frame original
+            overlap: Fracción de solape entre tiles vecinos [0, 0.9]
+            grid: (columnas, filas) para fijar el número de tiles, o False para
+                calcularlo a partir de tile_size y overlap
+            incluir_completo: Añadir también el frame completo al lote
+                (recupera objetos grandes que quedan cortados entre tiles)
+        """
+        if activo is not None:
+            self.teselado['activo'] = bool(activo)
+        if tile_size is not None:
+            self.teselado['tile_size'] = max(32, int(tile_size))
+        if overlap is not None:
+            self.teselado['overlap'] = max(0.0, min(0.9, float(overlap)))
+        if grid is not None:
+            self.teselado['grid'] = (max(1, int(grid[0])), max(1, int(grid[1]))) if grid else None
+        if incluir_completo is not None:
+            self.teselado['incluir_completo'] = bool(incluir_completo)
     
     def detectar(self, frame, conf_threshold=None, selected_classes=None, class_colors=None):
         """Realiza detección en un frame.
@@ -37,92 +75,332 @@ class DetectorYOLO:
                 - clases_detectadas: Diccionario con conteo de clases {nombre_clase: cantidad}
         """
         start_time = time.time()
-        clases_detectadas = {}
-        annotated = frame.copy()
         
         try:
             # Usar threshold personalizado o el de config
             conf = conf_threshold if conf_threshold is not None else config.CONF_THRESH
             
-            results = self.model.predict(
-                frame,
-                conf=conf,
-                verbose=False,
-                imgsz=config.MODEL_IMGSZ
-            )
+            detecciones = self.inferir(frame, conf)
             elapsed = time.time() - start_time
             
-            # Extraer detecciones y dibujar bboxes
-            try:
-                result = results[0]
-                if result.boxes is not None and len(result.boxes) > 0:
-                    # Obtener datos de las detecciones
-                    boxes = result.boxes
-                    
-                    # Convertir a numpy de forma segura
-                    if hasattr(boxes.cls, 'cpu'):
-                        class_ids = boxes.cls.cpu().numpy().astype(int)
-                        confidences = boxes.conf.cpu().numpy()
-                        xyxy = boxes.xyxy.cpu().numpy()
-                    else:
-                        class_ids = boxes.cls.numpy().astype(int) if hasattr(boxes.cls, 'numpy') else boxes.cls.astype(int)
-                        confidences = boxes.conf.numpy() if hasattr(boxes.conf, 'numpy') else boxes.conf
-                        xyxy = boxes.xyxy.numpy() if hasattr(boxes.xyxy, 'numpy') else boxes.xyxy
-                    
-                    # Filtrar por clases seleccionadas si se especificó
-                    if selected_classes is not None and len(selected_classes) > 0:
-                        # Convertir selected_classes a set para búsqueda rápida
-                        selected_set = set(selected_classes)
-                        filtered_indices = []
-                        for i, class_id in enumerate(class_ids):
-                            if class_id in result.names:
-                                class_name = result.names[class_id]
-                                if class_name in selected_set:
-                                    filtered_indices.append(i)
-                        # Filtrar arrays
-                        if filtered_indices:
-                            class_ids = class_ids[filtered_indices]
-                            confidences = confidences[filtered_indices]
-                            xyxy = xyxy[filtered_indices]
-                        else:
-                            # No hay detecciones que coincidan con las clases seleccionadas
-                            class_ids = np.array([], dtype=int)
-                            confidences = np.array([])
-                            xyxy = np.array([])
-                    
-                    # Dibujar bboxes sin texto, solo rectángulos con colores
-                    # Verificar que hay detecciones antes de iterar
-                    if len(xyxy) > 0 and len(class_ids) > 0 and len(confidences) > 0:
-                        for i, (box, class_id, conf) in enumerate(zip(xyxy, class_ids, confidences)):
-                            if class_id in result.names:
-                                class_name = result.names[class_id]
-                                
-                                # Obtener color de la clase o usar color por defecto
-                                if class_colors and class_name in class_colors:
-                                    color = class_colors[class_name]
-                                else:
-                                    # Color por defecto (azul) si no se especifica
-                                    color = (255, 0, 0)  # BGR: azul
-                                
-                                # Convertir coordenadas a enteros
-                                x1, y1, x2, y2 = map(int, box)
-                                
-                                # Dibujar solo el rectángulo (sin texto)
-                                cv2.rectangle(annotated, (x1, y1), (x2, y2), color, 2)
-                                
-                                # Contar clase
-                                clases_detectadas[class_name] = clases_detectadas.get(class_name, 0) + 1
-                            
-            except (AttributeError, IndexError, TypeError) as exc:
-                # No hay detecciones o error al acceder
-                print(f"[DEBUG] Error al procesar detecciones: {exc}")
-                pass
-            
+            annotated, clases_detectadas = self._anotar(
+                frame, detecciones, selected_classes, class_colors
+            )
             return annotated, elapsed, clases_detectadas
         except Exception as exc:
             print(f"[WARN] Inferencia fallida: {exc}")
             elapsed = time.time() - start_time
-            return frame, elapsed, clases_detectadas
+            return frame, elapsed, {}
+    
+    def inferir(self, frame, conf):
+        """Ejecuta solo la inferencia (sin filtrar ni dibujar).
+        
+        Respeta el modo teselado si está activo.
+        
+        Args:
+            frame: Frame de OpenCV (numpy array)
+            conf: Threshold de confianza
+            
+        Returns:
+            tuple: (xyxy, confianzas, class_ids) en coordenadas del frame
+        """
+        if self.teselado['activo']:
+            return self._predecir_teselado(frame, conf)
+        return self.backend.predecir([frame], conf)[0]
+    
+    def inferir_lote(self, frames, conf):
+        """Ejecuta solo la inferencia sobre varios frames en una llamada al backend.
+        
+        Respeta el modo teselado si está activo (cada frame es su propio lote de tiles).
+        
+        Args:
+            frames: Lista de frames de OpenCV
+            conf: Threshold de confianza
+            
+        Returns:
+            list: Una tupla (xyxy, confianzas, class_ids) por frame
+        """
+        if self.teselado['activo']:
+            return [self._predecir_teselado(frame, conf) for frame in frames]
+        return self.backend.predecir(list(frames), conf)
+    
+    def calentar(self, repeticiones=1):
+        """Ejecuta inferencias sobre un frame vacío para inicializar el runtime.
+        
+        La primera inferencia suele ser mucho más lenta (reserva de memoria,
+        compilación de kernels); hacerla antes de activar el modelo evita un
+        pico de latencia en el primer frame real.
+        
+        Args:
+            repeticiones: Número de inferencias de calentamiento
+            
+        Returns:
+            float: Tiempo total de calentamiento en segundos
+        """
+        inicio = time.time()
+        ancho, alto = config.FRAME_SIZE
+        vacio = np.zeros((alto, ancho, 3), dtype=np.uint8)
+        for _ in range(repeticiones):
+            try:
+                self.inferir(vacio, config.CONF_THRESH)
+            except Exception as exc:
+                print(f"[WARN] Calentamiento del modelo fallido: {exc}")
+                break
+        return time.time() - inicio
+    
+    def anotar(self, frame, detecciones, selected_classes=None, class_colors=None):
+        """Filtra y dibuja detecciones ya calculadas (p. ej. propagadas por un tracker).
+        
+        Args:
+            frame: Frame de OpenCV (numpy array)
+            detecciones: Tupla (xyxy, confianzas, class_ids)
+            selected_classes: Lista de nombres de clases a detectar (None = todas)
+            class_colors: Diccionario {nombre_clase: (B, G, R)} para colores de bboxes
+            
+        Returns:
+            tuple: (frame_anotado, clases_detectadas)
+        """
+        return self._anotar(frame, detecciones, selected_classes, class_colors)
+    
+    def detectar_lote(self, frames, conf_threshold=None, selected_classes=None, class_colors=None):
+        """Realiza detección sobre varios frames en una sola llamada al backend.
+        
+        Agrupar frames reduce el overhead por llamada y mantiene ocupado el
+        acelerador. Los argumentos son los mismos que en detectar().
+        
+        Args:
+            frames: Lista de frames de OpenCV (numpy arrays)
+            
+        Returns:
+            list: Una tupla (frame_anotado, tiempo_inferencia, clases_detectadas)
+                por frame, en el mismo orden de entrada. tiempo_inferencia es
+                el tiempo total del lote dividido por el número de frames.
+        """
+        if not frames:
+            return []
+        
+        start_time = time.time()
+        
+        try:
+            conf = conf_threshold if conf_threshold is not None else config.CONF_THRESH
+            resultados = self.inferir_lote(frames, conf)
+            elapsed = (time.time() - start_time) / len(frames)
+            
+            salida = []
+            for frame, detecciones in zip(frames, resultados):
+                annotated, clases_detectadas = self._anotar(
+                    frame, detecciones, selected_classes, class_colors
+                )
+                salida.append((annotated, elapsed, clases_detectadas))
+            return salida
+        except Exception as exc:
+            print(f"[WARN] Inferencia por lote fallida: {exc}")
+            elapsed = (time.time() - start_time) / len(frames)
+            return [(frame, elapsed, {}) for frame in frames]
+    
+    def _predecir_teselado(self, frame, conf):
+        """Inferencia por tiles solapados a resolución nativa con NMS entre tiles.
+        
+        Todos los tiles (y opcionalmente el frame completo) se envían al backend
+        en un solo lote. Las detecciones se trasladan a coordenadas del frame y
+        se fusionan con un NMS por clase. Los tiempos quedan en self.stats_teselado.
+        
+        Args:
+            frame: Frame de OpenCV a resolución nativa
+            conf: Threshold de confianza
+            
+        Returns:
+            tuple: (xyxy, confianzas, class_ids) en coordenadas del frame
+        """
+        inicio = time.time()
+        alto, ancho = frame.shape[:2]
+        tiles = calcular_tiles(
+            alto, ancho,
+            self.teselado['tile_size'],
+            self.teselado['overlap'],
+            self.teselado['grid']
+        )
+        recortes = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in tiles]
+        if self.teselado['incluir_completo'] and len(tiles) > 1:
+            tiles.append((0, 0, ancho, alto))
+            recortes.append(frame)
+        
+        # Los tiles se pasan al modelo a su tamaño nativo (sin reescalar a MODEL_IMGSZ)
+        resultados = self.backend.predecir(recortes, conf, imgsz=self.teselado['tile_size'])
+        tiempo_inferencia = time.time() - inicio
+        
+        inicio_nms = time.time()
+        todos_xyxy, todas_conf, todos_ids = [], [], []
+        for (x1, y1, _, _), (xyxy, confianzas, class_ids) in zip(tiles, resultados):
+            if len(xyxy) == 0:
+                continue
+            todos_xyxy.append(np.asarray(xyxy, dtype=np.float32) + np.array([x1, y1, x1, y1], dtype=np.float32))
+            todas_conf.append(np.asarray(confianzas, dtype=np.float32))
+            todos_ids.append(np.asarray(class_ids, dtype=int))
+        
+        if todos_xyxy:
+            xyxy = np.concatenate(todos_xyxy)
+            confianzas = np.concatenate(todas_conf)
+            class_ids = np.concatenate(todos_ids)
+            indices = nms(xyxy, confianzas, config.TILE_NMS_IOU, class_ids)[:config.MAX_DET]
+            detecciones = (xyxy[indices], confianzas[indices], class_ids[indices])
+        else:
+            detecciones = (np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=int))
+        
+        tiempo_nms = time.time() - inicio_nms
+        self.stats_teselado = {
+            'tiles': len(tiles),
+            'tiempo_inferencia_ms': round(tiempo_inferencia * 1000, 1),
+            'tiempo_por_tile_ms': round(tiempo_inferencia * 1000 / len(tiles), 1),
+            'tiempo_nms_ms': round(tiempo_nms * 1000, 1),
+            'detecciones': len(detecciones[0]),
+        }
+        return detecciones
+    
+    def _tablas_filtro(self, names, selected_classes, class_colors):
+        """Devuelve la máscara de clases y la tabla de colores para el filtro actual.
+        
+        Las tablas se indexan por id de clase y solo se reconstruyen cuando
+        cambian los objetos de configuración (el backend los reemplaza en cada
+        llamada a /api/inference/config) o el diccionario de nombres del modelo.
+        
+        Args:
+            names: Diccionario {id_clase: nombre_clase} del modelo
+            selected_classes: Lista de nombres de clases a detectar (None = todas)
+            class_colors: Diccionario {nombre_clase: (B, G, R)} para colores de bboxes
+            
+        Returns:
+            tuple: (mascara, colores, nombres)
+                - mascara: np.ndarray bool (n_clases,) con las clases a dibujar
+                - colores: np.ndarray int (n_clases, 3) con el color BGR de cada clase
+                - nombres: Lista con el nombre de cada id de clase (None si no existe)
+        """
+        clave = (names, selected_classes, class_colors)
+        cache = getattr(self, '_filtro_cache', None)
+        if cache is not None and all(a is b for a, b in zip(cache[0], clave)):
+            return cache[1]
+        
+        n_clases = max(names.keys()) + 1 if names else 0
+        mascara = np.zeros(n_clases, dtype=bool)
+        colores = np.empty((n_clases, 3), dtype=np.int64)
+        colores[:] = (255, 0, 0)  # Color por defecto (azul) si no se especifica
+        nombres = [None] * n_clases
+        
+        selected_set = set(selected_classes) if selected_classes else None
+        for class_id, class_name in names.items():
+            nombres[class_id] = class_name
+            mascara[class_id] = selected_set is None or class_name in selected_set
+            if class_colors and class_name in class_colors:
+                colores[class_id] = class_colors[class_name]
+        
+        tablas = (mascara, colores, nombres)
+        self._filtro_cache = (clave, tablas)
+        return tablas
+    
+    def _filtrar(self, detecciones, selected_classes=None, class_colors=None):
+        """Filtra las detecciones por clase y cuenta las que quedan.
+        
+        Args:
+            detecciones: Tupla (xyxy, confianzas, class_ids) devuelta por el backend
+            selected_classes: Lista de nombres de clases a detectar (None = todas)
+            class_colors: Diccionario {nombre_clase: (B, G, R)} para colores de bboxes
+            
+        Returns:
+            tuple: (xyxy, colores, clases_detectadas) de las detecciones que pasan el filtro
+        """
+        clases_detectadas = {}
+        xyxy = np.zeros((0, 4))
+        colores = np.zeros((0, 3), dtype=np.int64)
+        try:
+            xyxy, _, class_ids = detecciones
+            if len(class_ids) > 0:
+                mascara, tabla_colores, nombres = self._tablas_filtro(
+                    self.backend.names, selected_classes, class_colors
+                )
+                
+                # Filtrar por clase con la máscara precalculada (ids fuera de rango se descartan)
+                class_ids = np.asarray(class_ids, dtype=int)
+                validos = (class_ids >= 0) & (class_ids < len(mascara))
+                validos[validos] = mascara[class_ids[validos]]
+                class_ids = class_ids[validos]
+                xyxy = np.asarray(xyxy)[validos]
+                colores = tabla_colores[class_ids]
+                
+                if len(class_ids) > 0:
+                    # Contar clases
+                    conteo = np.bincount(class_ids, minlength=len(mascara))
+                    for class_id in np.flatnonzero(conteo):
+                        clases_detectadas[nombres[class_id]] = int(conteo[class_id])
+                        
+        except (AttributeError, IndexError, TypeError, ValueError) as exc:
+            # Error al acceder a las detecciones
+            print(f"[DEBUG] Error al procesar detecciones: {exc}")
+            xyxy = np.zeros((0, 4))
+            colores = np.zeros((0, 3), dtype=np.int64)
+        
+        return xyxy, colores, clases_detectadas
+    
+    def resumir(self, detecciones, selected_classes=None):
+        """Cuenta las detecciones por clase sin dibujarlas (overlay en el cliente).
+        
+        Args:
+            detecciones: Tupla (xyxy, confianzas, class_ids)
+            selected_classes: Lista de nombres de clases a contar (None = todas)
+            
+        Returns:
+            dict: Conteo de clases {nombre_clase: cantidad}
+        """
+        return self._filtrar(detecciones, selected_classes)[2]
+    
+    def _anotar(self, frame, detecciones, selected_classes=None, class_colors=None):
+        """Filtra las detecciones de un frame y dibuja sus bboxes.
+        
+        Args:
+            frame: Frame original sobre el que se hizo la inferencia
+            detecciones: Tupla (xyxy, confianzas, class_ids) devuelta por el backend
+            selected_classes: Lista de nombres de clases a detectar (None = todas)
+            class_colors: Diccionario {nombre_clase: (B, G, R)} para colores de bboxes
+            
+        Returns:
+            tuple: (frame_anotado, clases_detectadas)
+        """
+        annotated = frame.copy()
+        xyxy, colores, clases_detectadas = self._filtrar(detecciones, selected_classes, class_colors)
+        if len(xyxy) > 0:
+            self._dibujar_bboxes(annotated, xyxy, colores)
+        return annotated, clases_detectadas
+    
+    @staticmethod
+    def _dibujar_bboxes(annotated, xyxy, colores):
+        """Dibuja rectángulos (sin texto) agrupando boxes consecutivos del mismo color.
+        
+        cv2.rectangle traza internamente una polilínea cerrada de 4 puntos, así que
+        una sola llamada a cv2.polylines por tramo de color produce los mismos
+        píxeles. Se respeta el orden original de las detecciones para que los
+        solapes entre colores distintos queden igual que dibujando box a box.
+        
+        Args:
+            annotated: Frame sobre el que se dibuja (se modifica in-place)
+            xyxy: np.ndarray (N, 4) con las coordenadas de los boxes
+            colores: np.ndarray (N, 3) con el color BGR de cada box
+        """
+        # Truncar a enteros igual que int() y construir los 4 vértices de cada box
+        coords = xyxy.astype(np.int32)
+        x1, y1, x2, y2 = coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3]
+        poligonos = np.stack([
+            np.stack([x1, y1], axis=1),
+            np.stack([x2, y1], axis=1),
+            np.stack([x2, y2], axis=1),
+            np.stack([x1, y2], axis=1),
+        ], axis=1)
+        
+        # Cortar en tramos donde cambia el color
+        cambios = np.flatnonzero(np.any(colores[1:] != colores[:-1], axis=1)) + 1
+        inicios = np.concatenate(([0], cambios))
+        finales = np.concatenate((cambios, [len(colores)]))
+        for inicio, fin in zip(inicios, finales):
+            color = tuple(int(c) for c in colores[inicio])
+            cv2.polylines(annotated, list(poligonos[inicio:fin]), True, color, 2)
     
     def get_class_names(self):
         """Obtiene los nombres de las clases disponibles en el modelo.
@@ -131,7 +409,40 @@ class DetectorYOLO:
             dict: Diccionario {id_clase: nombre_clase}
         """
         try:
-            return self.model.names
+            return self.backend.names
         except Exception:
             return {}
 
+
+
+def calcular_tiles(alto, ancho, tile_size, overlap, grid=None):
+    """Calcula las ventanas de los tiles que cubren un frame.
+    
+    Args:
+        alto: Alto del frame
+        ancho: Ancho del frame
+        tile_size: Lado del tile en píxeles (ignorado si se pasa grid)
+        overlap: Fracción de solape entre tiles vecinos
+        grid: (columnas, filas) opcional para fijar el número de tiles
+        
+    Returns:
+        list: Ventanas (x1, y1, x2, y2) en coordenadas del frame
+    """
+    def ejes(longitud, lado, n=None):
+        lado = min(lado, longitud)
+        if n is None:
+            paso = max(1.0, lado * (1.0 - overlap))
+            n = 1 if longitud <= lado else int(np.ceil((longitud - lado) / paso)) + 1
+        inicios = np.linspace(0, longitud - lado, n).round().astype(int) if n > 1 else np.array([0])
+        return [(int(i), int(i) + lado) for i in inicios]
+    
+    if grid:
+        columnas, filas = grid
+        # Lado necesario para cubrir el frame con ese número de tiles y solape
+        lado_x = int(np.ceil(ancho / (columnas - (columnas - 1) * overlap)))
+        lado_y = int(np.ceil(alto / (filas - (filas - 1) * overlap)))
+        xs, ys = ejes(ancho, lado_x, columnas), ejes(alto, lado_y, filas)
+    else:
+        xs, ys = ejes(ancho, tile_size), ejes(alto, tile_size)
+    
+    return [(x1, y1, x2, y2) for y1, y2 in ys for x1, x2 in xs]
@@ -0,0 +1,248 @@
+"""Envío de frames a cada visor con control de flujo y calidad adaptativa.
+
+Cada visor (cliente Socket.IO) tiene una ventana de frames enviados sin
+confirmar y un único hueco para el frame pendiente: si el visor va atrasado,
+el frame nuevo reemplaza al pendiente en vez de encolarse, así un cliente lento
+no acumula frames viejos ni retrasa a los demás. El 'frame_ack' del navegador
+libera la ventana y da el tiempo de ida y vuelta, con el que el visor sube o
+baja de nivel (resolución y calidad JPEG). Cada nivel se codifica una sola vez
+por frame, lo compartan uno o varios visores.
+
+CacheJPEG guarda el último frame de visualización y sus JPEG por nivel: la
+codificación se hace bajo demanda, una sola vez por frame y nivel, y la
+comparten todas las salidas (WebSocket, snapshot y MJPEG). Si nadie pide el
+frame, no se codifica.
+"""
+
+import threading
+import time
+import cv2
+from . import config
+from .video import redimensionar_para_mostrar
+
+
+class Visor:
+    """Estado de envío de un cliente: ventana, frame pendiente y nivel de calidad."""
+
+    def __init__(self, sid, sala=None):
+        self.sid = sid
+        self.sala = sala
+        self.nivel = 0  # Índice en config.VIEWER_TIERS (0 = mejor calidad)
+        self.rtt_ema = None
+        self._en_vuelo = {}  # {traza: instante de envío}
+        self._pendiente = None  # (mensaje, traza) a la espera de hueco en la ventana
+        self._ultimo_cambio = time.monotonic()
+        self._lock = threading.Lock()
+        self.enviados = 0
+        self.descartados = 0
+        self.perdidos = 0
+
+    def _cambiar_nivel(self, delta, ahora):
+        nivel = min(max(self.nivel + delta, 0), len(config.VIEWER_TIERS) - 1)
+        if nivel != self.nivel and ahora - self._ultimo_cambio >= config.VIEWER_TIER_HOLD:
+            self.nivel = nivel
+            self._ultimo_cambio = ahora
+
+    def ofrecer(self, mensaje, traza):
+        """Ofrece un frame al visor.
+
+        Returns:
+            tuple: (mensaje, traza) a enviar ya, o None si quedó como pendiente
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            # Frames sin ack durante demasiado tiempo se dan por perdidos (liberan la ventana)
+            perdidos = [t for t, enviado in self._en_vuelo.items() if ahora - enviado > config.VIEWER_ACK_TIMEOUT]
+            for t in perdidos:
+                del self._en_vuelo[t]
+            if perdidos:
+                self.perdidos += len(perdidos)
+                self._cambiar_nivel(+1, ahora)
+
+            if self._pendiente is not None:
+                self.descartados += 1  # El frame nuevo reemplaza al pendiente
+                self._pendiente = None
+            if len(self._en_vuelo) < config.VIEWER_WINDOW:
+                self._en_vuelo[traza] = ahora
+                self.enviados += 1
+                return mensaje, traza
+            self._pendiente = (mensaje, traza)
+            return None
+
+    def ack(self, traza, navegador):
+        """Procesa la confirmación de un frame.
+
+        Args:
+            traza: Identificador del frame confirmado
+            navegador: Segundos que el frame pasó en el navegador
+
+        Returns:
+            tuple: (t_envio, siguiente) con el instante de envío del frame (None si
+                no estaba en vuelo) y el (mensaje, traza) pendiente que ahora cabe
+                en la ventana, o None
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            t_envio = self._en_vuelo.pop(traza, None)
+            if t_envio is not None:
+                rtt = max(0.0, ahora - t_envio - navegador)
+                self.rtt_ema = rtt if self.rtt_ema is None else 0.8 * self.rtt_ema + 0.2 * rtt
+                if self.rtt_ema > config.VIEWER_RTT_DEGRADE:
+                    self._cambiar_nivel(+1, ahora)
+                elif self.rtt_ema < config.VIEWER_RTT_UPGRADE:
+                    self._cambiar_nivel(-1, ahora)
+
+            siguiente = None
+            if self._pendiente is not None and len(self._en_vuelo) < config.VIEWER_WINDOW:
+                siguiente = self._pendiente
+                self._pendiente = None
+                self._en_vuelo[siguiente[1]] = ahora
+                self.enviados += 1
+            return t_envio, siguiente
+
+    def stats(self):
+        """Métricas del visor para /api/status."""
+        ancho, alto, calidad = config.VIEWER_TIERS[self.nivel]
+        return {
+            'sala': self.sala,
+            'nivel': self.nivel,
+            'resolucion': f"{ancho}x{alto}",
+            'calidad': calidad,
+            'rtt_ms': round((self.rtt_ema or 0.0) * 1000, 1),
+            'en_vuelo': len(self._en_vuelo),
+            'enviados': self.enviados,
+            'descartados': self.descartados,
+            'perdidos': self.perdidos,
+        }
+
+
+class GestorVisores:
+    """Visores conectados y reparto de cada frame entre ellos."""
+
+    def __init__(self, enviar):
+        """
+        Args:
+            enviar: Función enviar(sid, mensaje) que entrega un frame a un cliente
+        """
+        self._enviar = enviar
+        self._visores = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, sid, sala=None):
+        """Da de alta un visor (al conectarse)."""
+        with self._lock:
+            self._visores[sid] = Visor(sid, sala)
+
+    def quitar(self, sid):
+        """Da de baja un visor (al desconectarse)."""
+        with self._lock:
+            self._visores.pop(sid, None)
+
+    def cambiar_sala(self, sid, sala):
+        """Cambia el stream que recibe un visor (modo multi-dron)."""
+        visor = self._visores.get(sid)
+        if visor is not None:
+            visor.sala = sala
+
+    def visores(self, sala=None):
+        """Visores que reciben los frames de una sala (None = todos)."""
+        with self._lock:
+            visores = list(self._visores.values())
+        return [v for v in visores if sala is None or v.sala == sala]
+
+    def repartir(self, visores, mensajes, traza):
+        """Ofrece a cada visor el mensaje de su nivel y envía los que caben en su ventana.
+
+        Args:
+            visores: Lista de Visor (de visores())
+            mensajes: Diccionario {nivel: mensaje} ya codificado
+            traza: Identificador del frame, el que el navegador devolverá en el ack
+        """
+        for visor in visores:
+            mensaje = mensajes.get(visor.nivel)
+            if mensaje is None:
+                continue  # El visor cambió de nivel mientras se codificaba
+            envio = visor.ofrecer(mensaje, traza)
+            if envio is not None:
+                self._enviar(visor.sid, envio[0])
+
+    def ack(self, sid, traza, navegador):
+        """Procesa el ack de un visor y le envía su frame pendiente si lo hay.
+
+        Returns:
+            float o None: Instante de envío del frame a ese visor
+        """
+        visor = self._visores.get(sid)
+        if visor is None:
+            return None
+        t_envio, siguiente = visor.ack(traza, navegador)
+        if siguiente is not None:
+            self._enviar(sid, siguiente[0])
+        return t_envio
+
+    def stats(self):
+        """Métricas de todos los visores."""
+        return [visor.stats() for visor in self.visores()]
+
+
+class CacheJPEG:
+    """Último frame de visualización y sus JPEG codificados, por número de secuencia."""
+
+    def __init__(self):
+        self._condicion = threading.Condition()
+        self._lock_codificacion = threading.Lock()
+        self._frame = None
+        self._seq = 0
+        self._jpegs = {}  # {nivel: bytes} del frame actual
+        self.codificaciones = 0
+
+    def publicar(self, frame):
+        """Registra un frame nuevo sin codificarlo.
+
+        El frame se guarda por referencia y se redimensiona y codifica solo
+        cuando alguien lo pide (jpeg()). El llamador no debe modificarlo después;
+        ningún productor lo hace: DetectorYOLO.anotar y DetectorPool.resultados
+        entregan copias y CapturaFFmpeg no reutiliza un buffer referenciado.
+
+        Returns:
+            int: Número de secuencia del frame
+        """
+        with self._condicion:
+            self._seq += 1
+            self._frame = frame
+            self._jpegs = {}
+            self._condicion.notify_all()
+            return self._seq
+
+    def jpeg(self, nivel=0):
+        """JPEG del último frame en un nivel de config.VIEWER_TIERS, codificado una sola vez.
+
+        Returns:
+            tuple: (seq, bytes) o None si aún no se publicó ningún frame
+        """
+        with self._lock_codificacion:
+            with self._condicion:
+                seq, frame, jpegs = self._seq, self._frame, self._jpegs
+            if frame is None:
+                return None
+            if nivel not in jpegs:
+                ancho, alto, calidad = config.VIEWER_TIERS[nivel]
+                # Redimensionar (solo la copia de visualización) para reducir tamaño de transmisión
+                reducido = redimensionar_para_mostrar(frame, (ancho, alto))
+                _, buffer = cv2.imencode('.jpg', reducido, [cv2.IMWRITE_JPEG_QUALITY, calidad])
+                jpegs[nivel] = buffer.tobytes()
+                self.codificaciones += 1
+            return seq, jpegs[nivel]
+
+    def esperar(self, seq_visto, timeout=1.0):
+        """Espera a que se publique un frame posterior a seq_visto.
+
+        Returns:
+            bool: True si hay un frame nuevo
+        """
+        with self._condicion:
+            return self._condicion.wait_for(lambda: self._seq > seq_visto, timeout)
+
+    def stats(self):
+        """Frames publicados y JPEG codificados (para /api/status)."""
+        return {'frames': self._seq, 'codificaciones': self.codificaciones}
@@ -0,0 +1,116 @@
+"""Trazado de latencia por frame, desde la captura hasta la pantalla del operador.
+
+Cada frame emitido lleva un identificador de traza. El servidor mide las
+etapas propias (espera en el buzón, inferencia, codificación y emisión) con
+time.monotonic(); el navegador devuelve un 'frame_ack' con el tiempo entre la
+recepción y la visualización medido con su propio reloj. Con el tiempo de ida
+y vuelta del ack se estima la red en un sentido (mitad del RTT sin la parte del
+navegador) y se compone la latencia extremo a extremo.
+
+La captura se marca al decodificar el frame en el servidor: la latencia de la
+cámara, el codificador del dron y el enlace RTMP queda fuera de la medida.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+import numpy as np
+
+# Etapas en el orden en que las atraviesa un frame
+ETAPAS = ('cola', 'inferencia', 'codificacion', 'emision', 'red', 'navegador', 'servidor', 'e2e')
+
+
+class TrazadorLatencia:
+    """Agrega latencias por etapa y calcula percentiles."""
+
+    def __init__(self, max_muestras=1000, max_pendientes=300):
+        """
+        Args:
+            max_muestras: Muestras que se conservan por etapa (ventana deslizante)
+            max_pendientes: Frames emitidos a la espera de ack que se recuerdan
+        """
+        self._muestras = {etapa: deque(maxlen=max_muestras) for etapa in ETAPAS}
+        self._pendientes = OrderedDict()  # {traza: (t_captura, t_emitido)}
+        self._max_pendientes = max_pendientes
+        self._siguiente = 0
+        self._lock = threading.Lock()
+        self.acks = 0
+
+    def registrar(self, etapa, segundos):
+        """Añade una muestra de una etapa."""
+        if segundos is not None and segundos >= 0:
+            self._muestras[etapa].append(segundos)
+
+    def nueva_traza(self):
+        """Reserva un identificador de traza para un frame que se va a emitir."""
+        with self._lock:
+            self._siguiente += 1
+            return self._siguiente
+
+    def emitido(self, traza, t_captura, etapas):
+        """Registra un frame que acaba de emitirse.
+
+        Args:
+            traza: Identificador de nueva_traza(), el que el navegador devolverá en el ack
+            t_captura: Instante de captura (time.monotonic())
+            etapas: Diccionario {etapa: segundos} medido en el servidor
+        """
+        ahora = time.monotonic()
+        for etapa, segundos in etapas.items():
+            self.registrar(etapa, segundos)
+        self.registrar('servidor', ahora - t_captura)
+        with self._lock:
+            self._pendientes[traza] = (t_captura, ahora)
+            while len(self._pendientes) > self._max_pendientes:
+                self._pendientes.popitem(last=False)
+
+    def ack(self, traza, navegador, t_envio=None):
+        """Procesa el ack de un navegador.
+
+        Args:
+            traza: Identificador recibido en el evento 'frame'
+            navegador: Segundos entre la recepción y la visualización en el navegador
+            t_envio: Instante en que el frame se envió a ese navegador, si se
+                retuvo por control de flujo (None = instante de emisión)
+
+        Returns:
+            bool: False si la traza ya no se recuerda
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            pendiente = self._pendientes.get(traza)
+        if pendiente is None:
+            return False
+        t_captura, t_emitido = pendiente
+        if t_envio is not None:
+            t_emitido = max(t_emitido, t_envio)
+        navegador = max(0.0, float(navegador))
+        # Ida y vuelta menos lo que el frame pasó en el navegador, repartido a partes iguales
+        red = max(0.0, (ahora - t_emitido - navegador) / 2)
+        self.registrar('red', red)
+        self.registrar('navegador', navegador)
+        self.registrar('e2e', (t_emitido - t_captura) + red + navegador)
+        self.acks += 1
+        return True
+
+    def percentiles(self):
+        """Percentiles por etapa en milisegundos.
+
+        Returns:
+            dict: {etapa: {'n', 'p50', 'p90', 'p99', 'max'}} (solo etapas con muestras)
+        """
+        resumen = {}
+        for etapa in ETAPAS:
+            # list() copia el deque de una vez, sin iterarlo mientras otro hilo añade
+            muestras = np.array(list(self._muestras[etapa]), dtype=np.float64)
+            if not len(muestras):
+                continue
+            p50, p90, p99 = np.percentile(muestras, (50, 90, 99)) * 1000
+            resumen[etapa] = {
+                'n': int(len(muestras)),
+                'p50': round(float(p50), 1),
+                'p90': round(float(p90), 1),
+                'p99': round(float(p99), 1),
+                'max': round(float(muestras.max()) * 1000, 1),
+            }
+        return resumen
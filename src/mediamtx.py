@@ -1,4 +1,4 @@
-"""Módulo para gestión del servidor MediaMTX."""
+"""Módulo para gestión del servidor MediaMTX y publicación del video anotado."""
 
 import signal
 import subprocess
@@ -178,3 +178,69 @@ def detener_mediamtx(proceso):
             proceso.kill()
             print("[WARN] MediaMTX forzado con kill().")
 
+
+
+class PublicadorMediaMTX:
+    """Publica frames anotados en una ruta de MediaMTX como H.264 (ffmpeg por stdin).
+
+    Los frames se entregan con publicar(), que nunca bloquea: si el codificador
+    va atrasado el frame se descarta y se cuenta. Si ffmpeg termina (MediaMTX
+    reiniciado, red caída), se relanza cada config.PUBLISH_RETRY segundos.
+    """
+
+    def __init__(self, ruta, size=None):
+        """
+        Args:
+            ruta: Ruta de MediaMTX donde publicar (p. ej. "live/dron_annotated")
+            size: (ancho, alto) del video publicado (None = config.PUBLISH_SIZE o FRAME_SIZE)
+        """
+        from .video import SalidaFFmpeg
+
+        self.ruta = ruta
+        self.url = f"{config.RTMP_BASE}/{ruta}"
+        self._size = size or config.PUBLISH_SIZE or config.FRAME_SIZE
+        self._crear_salida = SalidaFFmpeg
+        self._salida = None
+        self._ultimo_intento = None
+        self._escritos = 0
+        self._descartados = 0
+        self.reinicios = 0
+
+    def publicar(self, frame):
+        """Entrega un frame al codificador; relanza ffmpeg si terminó."""
+        if self._salida is None or not self._salida.activa:
+            ahora = time.monotonic()
+            if self._ultimo_intento is not None and ahora - self._ultimo_intento < config.PUBLISH_RETRY:
+                return
+            self._ultimo_intento = ahora
+            if self._salida is not None:
+                self._acumular(self._salida)
+                self._salida.cerrar(timeout=1.0)
+                self.reinicios += 1
+            print(f"[INFO] Publicando video anotado en {self.url}")
+            self._salida = self._crear_salida(['-f', 'flv', self.url], self._size, nombre=self.ruta)
+        self._salida.escribir(frame)
+
+    def _acumular(self, salida):
+        self._escritos += salida.escritos
+        self._descartados += salida.descartados
+
+    def stats(self):
+        """Estado de la publicación (para /api/status)."""
+        salida = self._salida.stats() if self._salida is not None else {}
+        return {
+            'ruta': self.ruta,
+            'activa': salida.get('activa', False),
+            'resolucion': salida.get('resolucion'),
+            'escritos': self._escritos + salida.get('escritos', 0),
+            'descartados': self._descartados + salida.get('descartados', 0),
+            'reinicios': self.reinicios,
+            'error': salida.get('error'),
+        }
+
+    def cerrar(self):
+        """Termina la publicación."""
+        if self._salida is not None:
+            self._acumular(self._salida)
+            self._salida.cerrar()
+            self._salida = None
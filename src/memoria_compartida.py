@@ -0,0 +1,290 @@
+"""Transporte de frames entre procesos por memoria compartida.
+
+AnilloFrames es un anillo de slots en multiprocessing.shared_memory: el
+proceso que escribe copia el frame en el siguiente slot y por las colas solo
+viaja un descriptor (slot, secuencia); el lector obtiene una vista NumPy del
+slot sin serializar ni copiar píxeles. Cada slot guarda en una cabecera su
+secuencia y forma, así el lector detecta si el slot ya fue sobrescrito.
+
+CapturaProceso lleva la captura y decodificación del stream a un proceso
+aparte que escribe en un anillo, para que la ingesta no compita por el GIL
+con la inferencia, la codificación y Flask.
+"""
+
+import multiprocessing as mp
+import queue
+import time
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+from . import config
+
+_CAMPOS_CABECERA = 4  # Por slot: secuencia, alto, ancho, canales
+
+
+class AnilloFrames:
+    """Anillo de slots de tamaño fijo en memoria compartida (un solo escritor)."""
+
+    def __init__(self, n_slots, bytes_slot, nombre=None):
+        """
+        Args:
+            n_slots: Número de slots; un slot se reutiliza tras n_slots escrituras
+            bytes_slot: Capacidad de cada slot en bytes
+            nombre: Nombre de un segmento existente al que adjuntarse
+                (None = crear uno nuevo, del que este objeto es propietario)
+        """
+        self.n_slots = int(n_slots)
+        self.bytes_slot = int(bytes_slot)
+        bytes_cabecera = self.n_slots * _CAMPOS_CABECERA * 8
+        self._propietario = nombre is None
+        if self._propietario:
+            self._shm = shared_memory.SharedMemory(create=True, size=bytes_cabecera + self.n_slots * self.bytes_slot)
+        else:
+            # Los procesos del pool y de la ingesta se lanzan con spawn desde el
+            # principal y comparten su resource_tracker: adjuntarse no duplica el registro
+            self._shm = shared_memory.SharedMemory(name=nombre)
+        self.nombre = self._shm.name
+        self._cabecera = np.ndarray((self.n_slots, _CAMPOS_CABECERA), dtype=np.int64, buffer=self._shm.buf)
+        self._datos = np.ndarray((self.n_slots, self.bytes_slot), dtype=np.uint8,
+                                 buffer=self._shm.buf, offset=bytes_cabecera)
+        if self._propietario:
+            self._cabecera[:] = 0
+        self._siguiente = 0
+        self._seq = 0
+
+    def descriptor(self):
+        """Datos necesarios para adjuntarse al anillo desde otro proceso."""
+        return (self.nombre, self.n_slots, self.bytes_slot)
+
+    @classmethod
+    def adjuntar(cls, descriptor):
+        """Abre un anillo creado en otro proceso a partir de su descriptor()."""
+        nombre, n_slots, bytes_slot = descriptor
+        return cls(n_slots, bytes_slot, nombre=nombre)
+
+    def _vista(self, slot, forma):
+        return self._datos[slot, :int(np.prod(forma))].reshape(forma)
+
+    def escribir(self, frame):
+        """Copia un frame en el siguiente slot.
+
+        Args:
+            frame: np.ndarray uint8 (alto, ancho, canales)
+
+        Returns:
+            tuple: (slot, seq) para enviar como descriptor, o None si el frame
+                no cabe en un slot (el llamador debe enviarlo por otra vía)
+        """
+        if frame.dtype != np.uint8 or frame.ndim != 3 or frame.nbytes > self.bytes_slot:
+            return None
+        slot = self._siguiente
+        self._siguiente = (slot + 1) % self.n_slots
+        self._seq += 1
+        # Secuencia 0 mientras se escribe: un lector no acepta un slot a medio copiar
+        self._cabecera[slot, 0] = 0
+        np.copyto(self._vista(slot, frame.shape), frame)
+        self._cabecera[slot, 1:] = frame.shape
+        self._cabecera[slot, 0] = self._seq
+        return slot, self._seq
+
+    def leer(self, slot, seq):
+        """Vista NumPy del frame de un slot, sin copiarlo.
+
+        Returns:
+            np.ndarray o None si el slot ya fue sobrescrito con otro frame
+        """
+        if self._cabecera[slot, 0] != seq:
+            return None
+        return self._vista(slot, tuple(int(v) for v in self._cabecera[slot, 1:]))
+
+    def leer_copia(self, slot, seq):
+        """Copia del frame de un slot, validada como un seqlock.
+
+        La secuencia se comprueba antes y después de copiar: si el escritor
+        empezó a reutilizar el slot durante la copia (la cabecera pasa a 0 y
+        luego a otra secuencia) el frame podría estar mezclado y se descarta.
+
+        Returns:
+            np.ndarray propio o None si el slot se sobrescribió antes o durante la copia
+        """
+        vista = self.leer(slot, seq)
+        if vista is None:
+            return None
+        copia = vista.copy()
+        if not self.vigente(slot, seq):
+            return None
+        return copia
+
+    def vigente(self, slot, seq):
+        """Indica si el slot sigue conteniendo el frame con esa secuencia."""
+        return self._cabecera[slot, 0] == seq
+
+    def cerrar(self):
+        """Libera el segmento (y lo elimina si este objeto lo creó)."""
+        self._cabecera = None
+        self._datos = None
+        try:
+            self._shm.close()
+        except BufferError:
+            # Aún hay vistas vivas de algún frame: el mapeo se libera cuando desaparezcan
+            pass
+        if self._propietario:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _proceso_ingesta(url, motor, ingest_size, n_slots, descriptores, stop_event, descartados):
+    """Proceso de ingesta: captura, decodifica y publica descriptores de slots.
+
+    Mensajes hacia el proceso principal:
+        ('frame', slot, seq, t_captura, descriptor_anillo), ('fin', motivo)
+
+    Si el proceso principal va atrasado, el descriptor pendiente más antiguo se
+    sustituye por el nuevo: en la cola solo espera el frame más reciente.
+    descartados (multiprocessing.Value) cuenta los frames sustituidos.
+    """
+    from .video import CapturaFFmpeg
+
+    cap = CapturaFFmpeg(url) if motor == "ffmpeg" else cv2.VideoCapture(url)
+    anillo = None
+    motivo = "fin del stream"
+    try:
+        if not cap.isOpened():
+            motivo = "no se pudo abrir el stream"
+            return
+        while not stop_event.is_set():
+            ret, frame = cap.read()
+            t_captura = time.monotonic()
+            if not ret:
+                break
+            if ingest_size is not None and (frame.shape[1], frame.shape[0]) != tuple(ingest_size):
+                frame = cv2.resize(frame, tuple(ingest_size))
+            if anillo is None:
+                # El tamaño de slot se fija con el primer frame
+                anillo = AnilloFrames(n_slots, frame.nbytes)
+            referencia = anillo.escribir(frame)
+            if referencia is None:
+                motivo = "la resolución del stream cambió"
+                break
+            # El descriptor del anillo viaja con cada frame: cualquier mensaje de
+            # la cola se puede sustituir sin perder el aviso de adjuntarse
+            mensaje = ('frame', *referencia, t_captura, anillo.descriptor())
+            try:
+                descriptores.put_nowait(mensaje)
+            except queue.Full:
+                # Sacar el descriptor viejo (si el principal no lo tomó ya) y dejar el nuevo
+                perdidos = 0
+                try:
+                    descriptores.get(timeout=0.01)
+                    perdidos += 1
+                except queue.Empty:
+                    pass
+                try:
+                    descriptores.put_nowait(mensaje)
+                except queue.Full:
+                    perdidos += 1
+                if perdidos:
+                    with descartados.get_lock():
+                        descartados.value += perdidos
+    except Exception as exc:
+        motivo = f"error en la ingesta: {exc}"
+    finally:
+        cap.release()
+        try:
+            descriptores.put(('fin', f"{motivo} (descartados en ingesta: {descartados.value})"), timeout=1.0)
+        except queue.Full:
+            pass
+        if anillo is not None:
+            # Dar tiempo al proceso principal a adjuntarse antes de eliminar el segmento
+            time.sleep(0.5)
+            anillo.cerrar()
+
+
+class CapturaProceso:
+    """Captura en un proceso aparte con la interfaz de cv2.VideoCapture.
+
+    read() copia cada frame fuera del AnilloFrames (leer_copia): el proceso
+    de ingesta reutiliza el slot config.INGEST_SHM_SLOTS frames más tarde, sin
+    saber cuánto lo retiene el pipeline del proceso principal.
+    """
+
+    def __init__(self, url):
+        contexto = mp.get_context('spawn')
+        # Un solo descriptor pendiente: el lector siempre recibe el frame más reciente
+        self._descriptores = contexto.Queue(maxsize=1)
+        self._stop_event = contexto.Event()
+        self._descartados = contexto.Value('L', 0)
+        self._anillo = None
+        self._terminado = False
+        self.ultimo_t_captura = None
+        self._proceso = contexto.Process(
+            target=_proceso_ingesta,
+            args=(url, config.INGEST_ENGINE, config.INGEST_SIZE, config.INGEST_SHM_SLOTS,
+                  self._descriptores, self._stop_event, self._descartados),
+            daemon=True
+        )
+        self._proceso.start()
+
+    @property
+    def descartados(self):
+        """Frames perdidos en la ingesta: sustituidos en la cola o reescritos al copiarlos."""
+        return self._descartados.value
+
+    def isOpened(self):
+        """Indica si el proceso de ingesta sigue vivo."""
+        return not self._terminado and self._proceso.is_alive()
+
+    def read(self):
+        """Espera el siguiente frame del proceso de ingesta.
+
+        Returns:
+            tuple: (ret, frame) con una copia propia del frame
+        """
+        while not self._terminado:
+            try:
+                mensaje = self._descriptores.get(timeout=config.FFMPEG_TIMEOUT)
+            except queue.Empty:
+                return False, None
+            tipo = mensaje[0]
+            if tipo == 'frame':
+                _, slot, seq, t_captura, descriptor = mensaje
+                if self._anillo is None:
+                    try:
+                        self._anillo = AnilloFrames.adjuntar(descriptor)
+                    except FileNotFoundError:
+                        # El proceso de ingesta ya terminó y eliminó el anillo
+                        self._terminado = True
+                        break
+                frame = self._anillo.leer_copia(slot, seq)
+                if frame is None:
+                    # El proceso de ingesta reutilizó el slot antes o durante la copia
+                    with self._descartados.get_lock():
+                        self._descartados.value += 1
+                    continue
+                self.ultimo_t_captura = t_captura
+                return True, frame
+            elif tipo == 'fin':
+                print(f"[INFO] Proceso de ingesta terminado: {mensaje[1]}")
+                self._terminado = True
+        return False, None
+
+    def set(self, propiedad, valor):
+        """Compatibilidad con cv2.VideoCapture."""
+        return propiedad == cv2.CAP_PROP_BUFFERSIZE
+
+    def get(self, propiedad):
+        """Compatibilidad con cv2.VideoCapture (sin propiedades disponibles)."""
+        return 0.0
+
+    def release(self):
+        """Detiene el proceso de ingesta y libera el anillo."""
+        self._terminado = True
+        self._stop_event.set()
+        self._proceso.join(timeout=2.0)
+        if self._proceso.is_alive():
+            self._proceso.terminate()
+        if self._anillo is not None:
+            self._anillo.cerrar()
+            self._anillo = None
@@ -0,0 +1,101 @@
+"""Detección de cambios de escena para saltar inferencias en escenas estáticas."""
+
+import cv2
+import numpy as np
+from . import config
+
+
+class CompuertaMovimiento:
+    """Decide si un frame cambió lo suficiente como para volver a inferir.
+
+    Compara una miniatura en escala de grises del frame con la del último
+    frame en el que se ejecutó la inferencia. Si la diferencia media absoluta
+    (niveles de gris 0-255) queda por debajo del umbral, se reutilizan las
+    detecciones anteriores. Al comparar contra el último frame inferido, un
+    cambio lento acumulado termina disparando la inferencia igualmente.
+    """
+
+    def __init__(self, umbral=None, max_saltos=None, activa=None):
+        """
+        Args:
+            umbral: Diferencia media mínima para considerar que hubo cambio
+            max_saltos: Frames seguidos sin inferir antes de forzar una inferencia
+            activa: Si es False, hay_cambio() siempre devuelve True
+        """
+        self.activa = config.MOTION_GATE if activa is None else activa
+        self.umbral = config.MOTION_THRESHOLD if umbral is None else umbral
+        self.max_saltos = config.MOTION_MAX_SKIP if max_saltos is None else max_saltos
+        self._referencia = None
+        self._saltos_seguidos = 0
+        self.ultima_diferencia = 0.0
+        self.frames = 0
+        self.saltados = 0
+
+    def configurar(self, activa=None, umbral=None, max_saltos=None):
+        """Actualiza los parámetros en caliente (None conserva el valor actual)."""
+        if activa is not None:
+            self.activa = bool(activa)
+        if umbral is not None:
+            self.umbral = max(0.0, float(umbral))
+        if max_saltos is not None:
+            self.max_saltos = max(0, int(max_saltos))
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Olvida el frame de referencia para forzar la próxima inferencia."""
+        self._referencia = None
+        self._saltos_seguidos = 0
+
+    def hay_cambio(self, frame):
+        """Indica si hay que inferir sobre este frame.
+
+        Si devuelve True, el frame pasa a ser la nueva referencia.
+
+        Args:
+            frame: Frame BGR de OpenCV
+
+        Returns:
+            bool: True si la escena cambió (o la compuerta está desactivada)
+        """
+        self.frames += 1
+        if not self.activa:
+            return True
+
+        miniatura = cv2.cvtColor(
+            cv2.resize(frame, config.MOTION_SIZE, interpolation=cv2.INTER_AREA),
+            cv2.COLOR_BGR2GRAY
+        )
+        if self._referencia is None:
+            self.ultima_diferencia = 0.0
+            cambio = True
+        else:
+            self.ultima_diferencia = float(np.mean(cv2.absdiff(miniatura, self._referencia)))
+            cambio = (
+                self.ultima_diferencia >= self.umbral
+                or self._saltos_seguidos >= self.max_saltos
+            )
+
+        if cambio:
+            self._referencia = miniatura
+            self._saltos_seguidos = 0
+        else:
+            self._saltos_seguidos += 1
+            self.saltados += 1
+        return cambio
+
+    def stats(self):
+        """Estadísticas y parámetros actuales de la compuerta.
+
+        Returns:
+            dict: activa, umbral, max_saltos, frames, saltados, ratio de salto
+                y última diferencia medida
+        """
+        return {
+            'activa': self.activa,
+            'umbral': self.umbral,
+            'max_saltos': self.max_saltos,
+            'frames': self.frames,
+            'saltados': self.saltados,
+            'ratio_salto': round(self.saltados / self.frames, 3) if self.frames else 0.0,
+            'ultima_diferencia': round(self.ultima_diferencia, 2),
+        }
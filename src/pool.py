@@ -0,0 +1,321 @@
+"""Pool de detectores en procesos separados.
+
+Cada worker es un proceso con su propia réplica de DetectorYOLO. Los frames se
+reparten en round-robin y los resultados se reordenan por número de secuencia
+antes de devolverse, de modo que el consumidor los recibe en el mismo orden en
+que se enviaron. Con el backend 'rknn' cada worker se fija a un núcleo de la
+NPU del RK3588S; con backends de CPU cada worker usa sus propios núcleos.
+
+Con config.SHM_TRANSPORT los frames no se serializan: el proceso principal
+copia cada frame en un anillo de memoria compartida y por la cola solo viaja
+su descriptor (slot, secuencia); cada worker escribe el frame anotado en su
+propio anillo de salida, del que el proceso principal lo copia al recibirlo:
+el slot se reutiliza unos pocos resultados después, y el frame anotado se
+guarda en la caché JPEG y en las salidas durante un tiempo arbitrario.
+"""
+
+import multiprocessing as mp
+import queue
+import time
+import numpy as np
+from . import config
+from .memoria_compartida import AnilloFrames
+
+
+# Mensajes hacia los workers
+_MSG_FRAME = 'frame'
+_MSG_CONFIG = 'config'
+_MSG_TESELADO = 'teselado'
+_MSG_STOP = 'stop'
+
+
+def _trabajador_pool(worker_id, model_path, backend, backend_kwargs, entrada, salida,
+                     anillo_entrada=None, anillo_salida=None):
+    """Bucle principal de un worker: carga el detector y procesa frames.
+
+    Args:
+        worker_id: Índice del worker
+        model_path: Ruta al modelo
+        backend: Nombre del backend de inferencia
+        backend_kwargs: Argumentos extra para el backend (p. ej. npu_core)
+        entrada: Cola de mensajes (tipo, datos) hacia el worker
+        salida: Cola compartida de resultados hacia el proceso principal
+        anillo_entrada: Descriptor del anillo compartido de frames de entrada (None = sin memoria compartida)
+        anillo_salida: Descriptor del anillo de frames anotados de este worker
+    """
+    from .detector import DetectorYOLO
+
+    try:
+        detector = DetectorYOLO(model_path=model_path, backend=backend, **backend_kwargs)
+        if anillo_entrada is not None:
+            anillo_entrada = AnilloFrames.adjuntar(anillo_entrada)
+            anillo_salida = AnilloFrames.adjuntar(anillo_salida)
+    except Exception as exc:
+        salida.put(('error', worker_id, str(exc)))
+        return
+    salida.put(('listo', worker_id, detector.get_class_names()))
+
+    conf_threshold = None
+    selected_classes = None
+    class_colors = None
+    dibujar = True
+
+    while True:
+        tipo, datos = entrada.get()
+        if tipo == _MSG_STOP:
+            break
+        if tipo == _MSG_CONFIG:
+            conf_threshold, selected_classes, class_colors, dibujar = datos
+            continue
+        if tipo == _MSG_TESELADO:
+            detector.teselado.update(datos)
+            continue
+
+        seq, referencia, frame = datos
+        if referencia is not None:
+            frame = anillo_entrada.leer(*referencia)
+            if frame is None:
+                # El slot ya se reutilizó: devolver un resultado vacío para no bloquear el orden
+                salida.put(('resultado', worker_id, (seq, None, None, 0.0, {}, 0.0, None)))
+                continue
+        inicio = time.time()
+        if not dibujar:
+            # Overlay en el cliente: solo viajan las cajas, el frame lo conserva el proceso principal
+            try:
+                cajas = detector.inferir(frame, conf_threshold if conf_threshold is not None else config.CONF_THRESH)
+            except Exception as exc:
+                print(f"[WARN] Inferencia fallida: {exc}")
+                cajas = (np.zeros((0, 4)), np.zeros(0), np.zeros(0, dtype=int))
+            cajas = tuple(np.asarray(c) for c in cajas)
+            elapsed = time.time() - inicio
+            clases_detectadas = detector.resumir(cajas, selected_classes)
+            salida.put(('resultado', worker_id, (seq, None, None, elapsed, clases_detectadas, elapsed, cajas)))
+            continue
+        annotated, elapsed, clases_detectadas = detector.detectar(
+            frame,
+            conf_threshold=conf_threshold,
+            selected_classes=selected_classes,
+            class_colors=class_colors
+        )
+        ocupado = time.time() - inicio
+        referencia_salida = anillo_salida.escribir(annotated) if anillo_salida is not None else None
+        if referencia_salida is not None:
+            annotated = None  # Viaja por memoria compartida
+        salida.put(('resultado', worker_id, (seq, referencia_salida, annotated, elapsed, clases_detectadas, ocupado, None)))
+
+
+class DetectorPool:
+    """Pool de N réplicas de DetectorYOLO en procesos worker."""
+
+    def __init__(self, model_path, backend=None, n_workers=2, timeout_carga=120.0):
+        """Arranca los workers y espera a que carguen el modelo.
+
+        Args:
+            model_path: Ruta al modelo
+            backend: Backend de inferencia (None = config.MODEL_BACKEND)
+            n_workers: Número de réplicas/procesos
+            timeout_carga: Segundos máximos de espera para la carga del modelo
+
+        Raises:
+            RuntimeError: Si algún worker no puede cargar el modelo
+        """
+        # spawn evita heredar hilos y estado de OpenCV/Flask del proceso principal
+        contexto = mp.get_context('spawn')
+        self.n_workers = n_workers
+        self.names = {}
+        self._salida = contexto.Queue()
+        self._entradas = []
+        self._procesos = []
+        self._siguiente_seq = 0  # Próximo número de secuencia a asignar
+        self._siguiente_emitir = 0  # Próximo número de secuencia a devolver
+        self._pendientes = {}  # Reordenamiento: {seq: resultado}
+        self._originales = {}  # {seq: frame} enviados sin dibujar (overlay en el cliente)
+        self._config_enviada = None
+        self._inicio = time.time()
+        self._stats = [{'frames': 0, 'ocupado': 0.0} for _ in range(n_workers)]
+
+        # Anillos de memoria compartida. Entrada: como mucho 3 frames vivos por
+        # worker (2 en su cola y 1 en proceso), así que un slot no se reutiliza
+        # mientras un worker lo lee. Salida: un anillo por worker (un solo escritor)
+        self._anillo_entrada = None
+        self._anillos_salida = []
+        if config.SHM_TRANSPORT:
+            self._anillo_entrada = AnilloFrames(n_workers * 3 + 2, config.SHM_SLOT_BYTES)
+            self._anillos_salida = [AnilloFrames(8, config.SHM_SLOT_BYTES) for _ in range(n_workers)]
+
+        print(f"[INFO] Iniciando pool de {n_workers} detectores ({backend or 'backend por defecto'})…")
+        for worker_id in range(n_workers):
+            backend_kwargs = {}
+            if backend == 'rknn':
+                # Un núcleo de NPU por worker (el RK3588S tiene 3)
+                backend_kwargs['npu_core'] = worker_id % 3
+            entrada = contexto.Queue(maxsize=2)
+            anillos = ()
+            if self._anillo_entrada is not None:
+                anillos = (self._anillo_entrada.descriptor(), self._anillos_salida[worker_id].descriptor())
+            proceso = contexto.Process(
+                target=_trabajador_pool,
+                args=(worker_id, model_path, backend, backend_kwargs, entrada, self._salida, *anillos),
+                daemon=True
+            )
+            proceso.start()
+            self._entradas.append(entrada)
+            self._procesos.append(proceso)
+
+        listos = 0
+        limite = time.time() + timeout_carga
+        while listos < n_workers:
+            try:
+                tipo, worker_id, datos = self._salida.get(timeout=max(0.1, limite - time.time()))
+            except queue.Empty:
+                self.cerrar()
+                raise RuntimeError("Timeout esperando a que los workers carguen el modelo")
+            if tipo == 'error':
+                self.cerrar()
+                raise RuntimeError(f"Worker {worker_id} no pudo cargar el modelo: {datos}")
+            self.names = datos
+            listos += 1
+        self._inicio = time.time()
+        print(f"[OK] Pool de detectores listo ({n_workers} workers).")
+
+    def enviar(self, frame, conf_threshold=None, selected_classes=None, class_colors=None, dibujar=True):
+        """Envía un frame al siguiente worker en round-robin.
+
+        La configuración solo se reenvía a los workers cuando cambian los
+        objetos de configuración, igual que la caché de filtros del detector.
+        Bloquea si el worker destino tiene su cola llena. Con memoria
+        compartida el frame se copia en el anillo de entrada y solo se envía
+        su descriptor; si no cabe en un slot se envía serializado. Con
+        dibujar=False el worker no anota el frame: devuelve solo las cajas y
+        resultados() entrega el frame original (overlay en el cliente).
+
+        Returns:
+            int: Número de secuencia asignado al frame
+        """
+        config_actual = (conf_threshold, selected_classes, class_colors, dibujar)
+        if self._config_enviada is None or any(
+            a is not b for a, b in zip(self._config_enviada, config_actual)
+        ):
+            for entrada in self._entradas:
+                entrada.put((_MSG_CONFIG, config_actual))
+            self._config_enviada = config_actual
+
+        seq = self._siguiente_seq
+        self._siguiente_seq += 1
+        if not dibujar:
+            # Se conserva por referencia: CapturaFFmpeg no reutiliza un buffer
+            # referenciado y CapturaProceso entrega copias propias
+            self._originales[seq] = frame
+        referencia = self._anillo_entrada.escribir(frame) if self._anillo_entrada is not None else None
+        datos = (seq, referencia, None) if referencia is not None else (seq, None, frame)
+        self._entradas[seq % self.n_workers].put((_MSG_FRAME, datos))
+        return seq
+
+    def configurar_teselado(self, teselado):
+        """Reenvía la configuración del modo teselado a todos los workers.
+
+        Los frames que ya estaban en la cola de un worker se procesan con la
+        configuración anterior.
+
+        Args:
+            teselado: Diccionario de configuración (DetectorYOLO.teselado)
+        """
+        for entrada in self._entradas:
+            entrada.put((_MSG_TESELADO, dict(teselado)))
+
+    def en_vuelo(self):
+        """Número de frames enviados cuyo resultado aún no se ha devuelto."""
+        return self._siguiente_seq - self._siguiente_emitir
+
+    def resultados(self, bloquear=False, timeout=1.0):
+        """Devuelve los resultados disponibles en orden de secuencia.
+
+        Args:
+            bloquear: Si es True, espera hasta tener al menos un resultado en orden
+            timeout: Espera máxima en segundos cuando bloquear es True
+
+        Returns:
+            list: Tuplas (seq, frame_anotado, tiempo_inferencia, clases_detectadas, cajas).
+                frame_anotado es siempre un array propio (nunca una vista de un
+                anillo compartido), así que se puede conservar sin límite.
+                cajas es (xyxy, confianzas, class_ids) si el frame se envió sin
+                dibujar (y entonces frame_anotado es el frame original), o None.
+        """
+        limite = time.time() + timeout
+        while True:
+            try:
+                espera = max(0.0, limite - time.time()) if bloquear else 0.0
+                tipo, worker_id, datos = self._salida.get(timeout=espera) if espera else self._salida.get_nowait()
+            except queue.Empty:
+                break
+            if tipo != 'resultado':
+                continue
+            seq, referencia, annotated, elapsed, clases_detectadas, ocupado, cajas = datos
+            self._stats[worker_id]['frames'] += 1
+            self._stats[worker_id]['ocupado'] += ocupado
+            if cajas is not None:
+                annotated = self._originales.get(seq)
+            elif referencia is not None:
+                # Copiar fuera del slot antes de que el worker lo reutilice
+                annotated = self._anillos_salida[worker_id].leer_copia(*referencia)
+            if annotated is None:
+                print(f"[WARN] Frame {seq} sobrescrito en memoria compartida, descartado")
+                self._pendientes[seq] = None
+            else:
+                self._pendientes[seq] = (seq, annotated, elapsed, clases_detectadas, cajas)
+            if self._siguiente_emitir in self._pendientes:
+                bloquear = False
+
+        salida = []
+        while self._siguiente_emitir < self._siguiente_seq:
+            if self._siguiente_emitir in self._pendientes:
+                resultado = self._pendientes.pop(self._siguiente_emitir)
+                if resultado is not None:
+                    salida.append(resultado)
+            elif not self._procesos[self._siguiente_emitir % self.n_workers].is_alive():
+                # El worker de este frame murió: saltarlo para no bloquear el orden
+                print(f"[WARN] Worker {self._siguiente_emitir % self.n_workers} caído, frame {self._siguiente_emitir} descartado")
+            else:
+                break
+            self._originales.pop(self._siguiente_emitir, None)
+            self._siguiente_emitir += 1
+        return salida
+
+    def utilizacion(self):
+        """Estadísticas de uso por worker.
+
+        Returns:
+            list: Un diccionario por worker con frames procesados, tiempo ocupado
+                y porcentaje de utilización desde el arranque del pool
+        """
+        transcurrido = max(time.time() - self._inicio, 1e-9)
+        return [
+            {
+                'worker': worker_id,
+                'vivo': proceso.is_alive(),
+                'frames': stats['frames'],
+                'ocupado_s': round(stats['ocupado'], 2),
+                'utilizacion': round(100.0 * stats['ocupado'] / transcurrido, 1),
+            }
+            for worker_id, (proceso, stats) in enumerate(zip(self._procesos, self._stats))
+        ]
+
+    def cerrar(self):
+        """Detiene todos los workers."""
+        for entrada in self._entradas:
+            try:
+                entrada.put_nowait((_MSG_STOP, None))
+            except queue.Full:
+                pass
+        for proceso in self._procesos:
+            proceso.join(timeout=2.0)
+            if proceso.is_alive():
+                proceso.terminate()
+        self._pendientes.clear()
+        self._originales.clear()
+        for anillo in [self._anillo_entrada, *self._anillos_salida]:
+            if anillo is not None:
+                anillo.cerrar()
+        self._anillo_entrada = None
+        self._anillos_salida = []
+        print("[INFO] Pool de detectores detenido.")
@@ -0,0 +1,250 @@
+"""Procesado offline de videos grabados con el mismo detector del modo en vivo.
+
+Pensado para re-procesar grabaciones de misiones y como benchmark
+reproducible de throughput. Cada video se decodifica en su propio hilo (la
+decodificación de OpenCV libera el GIL), los frames de todos los videos se
+agrupan en lotes para el backend y las detecciones se escriben en JSONL o en
+un archivo columnar .npz. Opcionalmente se genera un MP4 anotado por video.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+from . import config
+from .video import crear_writer
+
+
+class EscritorJSONL:
+    """Una línea JSON por frame: video, índice, instante y detecciones."""
+
+    def __init__(self, ruta, videos, names):
+        self._archivo = open(ruta, 'w', encoding='utf-8')
+        self._videos = videos
+        self._names = names
+
+    def escribir(self, indice_video, indice_frame, t, detecciones):
+        xyxy, confianzas, class_ids = detecciones
+        fila = {
+            'video': self._videos[indice_video],
+            'frame': indice_frame,
+            't': round(t, 3),
+            'detecciones': [
+                {
+                    'clase': self._names.get(int(c), str(int(c))),
+                    'conf': round(float(p), 3),
+                    'xyxy': [round(float(v), 1) for v in box],
+                }
+                for box, p, c in zip(xyxy, confianzas, class_ids)
+            ],
+        }
+        self._archivo.write(json.dumps(fila, ensure_ascii=False) + '\n')
+
+    def cerrar(self):
+        self._archivo.close()
+
+
+class EscritorColumnar:
+    """Formato columnar compacto (.npz): una columna por campo, una fila por detección."""
+
+    def __init__(self, ruta, videos, names):
+        self._ruta = ruta
+        self._videos = videos
+        self._names = names
+        self._bloques = []  # Lista de (video, frame, t, xyxy, conf, clase)
+
+    def escribir(self, indice_video, indice_frame, t, detecciones):
+        xyxy, confianzas, class_ids = detecciones
+        n = len(confianzas)
+        if n == 0:
+            return
+        self._bloques.append((
+            np.full(n, indice_video, dtype=np.int16),
+            np.full(n, indice_frame, dtype=np.int32),
+            np.full(n, t, dtype=np.float32),
+            np.asarray(xyxy, dtype=np.float32).reshape(-1, 4),
+            np.asarray(confianzas, dtype=np.float32),
+            np.asarray(class_ids, dtype=np.int16),
+        ))
+
+    def cerrar(self):
+        columnas = list(zip(*self._bloques)) if self._bloques else None
+        vacio = lambda dtype, forma=(0,): np.zeros(forma, dtype=dtype)
+        np.savez_compressed(
+            self._ruta,
+            video=np.concatenate(columnas[0]) if columnas else vacio(np.int16),
+            frame=np.concatenate(columnas[1]) if columnas else vacio(np.int32),
+            t=np.concatenate(columnas[2]) if columnas else vacio(np.float32),
+            xyxy=np.concatenate(columnas[3]) if columnas else vacio(np.float32, (0, 4)),
+            conf=np.concatenate(columnas[4]) if columnas else vacio(np.float32),
+            clase=np.concatenate(columnas[5]) if columnas else vacio(np.int16),
+            videos=np.array(self._videos),
+            names=np.array(json.dumps({int(k): v for k, v in self._names.items()}, ensure_ascii=False)),
+        )
+
+
+def crear_escritor(ruta, videos, names):
+    """Elige el escritor de detecciones por la extensión del archivo (.jsonl o .npz)."""
+    if ruta.endswith('.npz'):
+        return EscritorColumnar(ruta, videos, names)
+    return EscritorJSONL(ruta, videos, names)
+
+
+def _decodificar(indice_video, ruta, cola, stop_event, tiempo_real):
+    """Hilo decodificador de un video: pone (video, frame_idx, fps, frame) en la cola.
+
+    Al terminar pone (video, None, fps, None) como marca de fin.
+    """
+    cap = cv2.VideoCapture(ruta)
+    fps = cap.get(cv2.CAP_PROP_FPS) or config.OUTPUT_FPS
+    inicio = time.monotonic()
+    n = 0
+    try:
+        while not stop_event.is_set():
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if tiempo_real:
+                # Reproducir a la velocidad de la fuente
+                espera = inicio + n / fps - time.monotonic()
+                if espera > 0:
+                    time.sleep(espera)
+            cola.put((indice_video, n, fps, frame))
+            n += 1
+    finally:
+        cap.release()
+        cola.put((indice_video, None, fps, None))
+
+
+def procesar_videos(rutas, salida, detector, lote=None, decodificadores=2, dir_anotados=None,
+                    tiempo_real=False, conf_threshold=None, selected_classes=None):
+    """Procesa videos grabados y escribe sus detecciones.
+
+    Args:
+        rutas: Lista de rutas de video
+        salida: Archivo de detecciones (.jsonl o .npz)
+        detector: DetectorYOLO ya cargado
+        lote: Frames por llamada al backend (None = config.INFER_BATCH_MAX)
+        decodificadores: Videos que se decodifican en paralelo
+        dir_anotados: Carpeta para los MP4 anotados (None = no generarlos)
+        tiempo_real: Reproducir cada video a su FPS original en vez de a máxima velocidad
+        conf_threshold: Threshold de confianza (None = config.CONF_THRESH)
+        selected_classes: Lista de nombres de clases a conservar (None = todas)
+
+    Returns:
+        dict: Resumen con frames, segundos y FPS totales y por video
+    """
+    lote = max(1, lote or config.INFER_BATCH_MAX)
+    conf = conf_threshold if conf_threshold is not None else config.CONF_THRESH
+    names = detector.get_class_names()
+    videos = [os.path.basename(ruta) for ruta in rutas]
+    escritor = crear_escritor(salida, videos, names)
+    ids_permitidos = None
+    if selected_classes:
+        ids_permitidos = np.array([i for i, nombre in names.items() if nombre in selected_classes], dtype=int)
+    if dir_anotados:
+        os.makedirs(dir_anotados, exist_ok=True)
+
+    # Cola acotada: los decodificadores no se adelantan más de unos lotes a la inferencia
+    cola = queue.Queue(maxsize=lote * max(2, decodificadores) * 2)
+    stop_event = threading.Event()
+    pendientes = list(enumerate(rutas))
+    activos = 0
+    writers = {}
+    stats = {indice: {'video': videos[indice], 'frames': 0, 'detecciones': 0} for indice in range(len(rutas))}
+    tiempo_inferencia = 0.0
+
+    def lanzar_siguiente():
+        nonlocal activos
+        indice, ruta = pendientes.pop(0)
+        stats[indice]['inicio'] = time.monotonic()
+        threading.Thread(
+            target=_decodificar,
+            args=(indice, ruta, cola, stop_event, tiempo_real),
+            daemon=True
+        ).start()
+        activos += 1
+
+    inicio = time.monotonic()
+    print(f"[INFO] Procesando {len(rutas)} videos (lote {lote}, {decodificadores} decodificadores"
+          f"{', tiempo real' if tiempo_real else ''})...")
+    try:
+        while pendientes and activos < decodificadores:
+            lanzar_siguiente()
+
+        while activos:
+            # Bloquear solo por el primer elemento; el resto del lote es lo que ya esté decodificado
+            elementos = [cola.get()]
+            while len(elementos) < lote:
+                try:
+                    elementos.append(cola.get_nowait())
+                except queue.Empty:
+                    break
+
+            frames = [e for e in elementos if e[1] is not None]
+            terminados = [e[0] for e in elementos if e[1] is None]
+
+            if frames:
+                inicio_lote = time.monotonic()
+                resultados = detector.inferir_lote([e[3] for e in frames], conf)
+                tiempo_inferencia += time.monotonic() - inicio_lote
+
+                for (indice, n, fps, frame), detecciones in zip(frames, resultados):
+                    if ids_permitidos is not None:
+                        mascara = np.isin(detecciones[2], ids_permitidos)
+                        detecciones = tuple(np.asarray(d)[mascara] for d in detecciones)
+                    escritor.escribir(indice, n, n / fps, detecciones)
+                    stats[indice]['frames'] += 1
+                    stats[indice]['detecciones'] += len(detecciones[1])
+
+                    if dir_anotados:
+                        if indice not in writers:
+                            nombre = os.path.splitext(videos[indice])[0]
+                            if videos.count(videos[indice]) > 1:
+                                nombre += f'_{indice}'  # Mismo nombre de archivo en carpetas distintas
+                            nombre += '_anotado.mp4'
+                            writers[indice] = crear_writer(
+                                os.path.join(dir_anotados, nombre),
+                                (frame.shape[1], frame.shape[0]),
+                                fps
+                            )
+                        if writers[indice] is not None:
+                            annotated, _ = detector.anotar(frame, detecciones, selected_classes)
+                            writers[indice].write(annotated)
+
+            # Los frames de un video llegan en orden, así que su marca de fin va después del último
+            for indice in terminados:
+                activos -= 1
+                segundos = time.monotonic() - stats[indice]['inicio']
+                stats[indice]['segundos'] = round(segundos, 2)
+                stats[indice]['fps'] = round(stats[indice]['frames'] / segundos, 1) if segundos > 0 else 0.0
+                del stats[indice]['inicio']
+                writer = writers.pop(indice, None)
+                if writer is not None:
+                    writer.release()
+                print(f"[OK] {videos[indice]}: {stats[indice]['frames']} frames, {stats[indice]['fps']} FPS")
+                if pendientes:
+                    lanzar_siguiente()
+    finally:
+        stop_event.set()
+        for writer in writers.values():
+            if writer is not None:
+                writer.release()
+        escritor.cerrar()
+
+    total_segundos = time.monotonic() - inicio
+    total_frames = sum(s['frames'] for s in stats.values())
+    return {
+        'frames': total_frames,
+        'segundos': round(total_segundos, 2),
+        'fps': round(total_frames / total_segundos, 1) if total_segundos > 0 else 0.0,
+        'inferencia_ms_por_frame': round(1000 * tiempo_inferencia / total_frames, 2) if total_frames else 0.0,
+        'lote': lote,
+        'tiempo_real': tiempo_real,
+        'backend': detector.backend.nombre,
+        'videos': list(stats.values()),
+        'salida': salida,
+    }
@@ -0,0 +1,246 @@
+"""Ingesta de varios drones y reparto de la inferencia entre sus streams.
+
+Cada StreamDron corresponde a una ruta de MediaMTX (p. ej. 'live/dron2') y
+tiene su propia captura, hilo lector, monitor de reconexión y buzón de frames.
+GestorStreams reparte el detector (o el pool de detectores) entre los streams
+con una política de round-robin ponderado o de plazo más próximo (EDF). Todos
+los buzones comparten una condición, así el planificador duerme hasta que
+llegue un frame nuevo de cualquier stream.
+"""
+
+import threading
+import time
+from . import config
+from .video import BuzonFrames, crear_captura, lector_frames
+
+
+class StreamDron:
+    """Pipeline de ingesta y métricas de un stream RTMP."""
+
+    def __init__(self, ruta, peso=1.0, condicion=None):
+        """
+        Args:
+            ruta: Ruta en MediaMTX (p. ej. 'live/dron2'); también es la sala de Socket.IO
+            peso: Peso relativo en el reparto de inferencias
+            condicion: threading.Condition compartida entre los buzones de todos los streams
+        """
+        self.ruta = ruta.strip('/')
+        self.url = f"{config.RTMP_BASE.rstrip('/')}/{self.ruta}"
+        self.peso = max(float(peso), 1e-3)
+        self.plazo = config.STREAM_DEADLINE / self.peso
+        self.buzon = BuzonFrames(condicion)
+        self.cap = None
+        self.lector_thread = None
+        self._stop_event = threading.Event()
+        self._monitor = None
+        self.credito = 0.0  # Estado del round-robin ponderado
+
+        # Métricas
+        self.procesados = 0
+        self.fuera_de_plazo = 0
+        self._ultimo_resultado = None
+        self._fps_ema = 0.0
+        self._latencia_ema = None
+        self._inferencia_ema = None
+
+    @property
+    def conectado(self):
+        """Indica si el stream tiene una captura abierta con su lector activo."""
+        return (
+            self.cap is not None and self.cap.isOpened()
+            and self.lector_thread is not None and self.lector_thread.is_alive()
+        )
+
+    def iniciar(self):
+        """Arranca el monitor de conexión del stream en segundo plano."""
+        self._monitor = threading.Thread(target=self._monitorear, daemon=True)
+        self._monitor.start()
+
+    def _monitorear(self):
+        """Conecta el stream y lo reconecta cuando se pierde."""
+        intento = 0
+        while not self._stop_event.is_set():
+            if self.conectado:
+                self._stop_event.wait(2.0)
+                continue
+
+            if self.cap is not None:
+                try:
+                    self.cap.release()
+                except Exception:
+                    pass
+                self.cap = None
+
+            intento += 1
+            cap = crear_captura(self.url)
+            if cap.isOpened():
+                ret, frame = cap.read()
+                if ret and frame is not None:
+                    self.cap = cap
+                    self.lector_thread = threading.Thread(
+                        target=lector_frames,
+                        args=(cap, self.buzon, self._stop_event),
+                        daemon=True
+                    )
+                    self.lector_thread.start()
+                    print(f"[OK] Stream '{self.ruta}' conectado")
+                    intento = 0
+                    continue
+            cap.release()
+            if intento == 1 or intento % 10 == 0:
+                print(f"[INFO] Stream '{self.ruta}' no disponible (intento {intento})")
+            # Igual que el monitor de un solo stream: reintentos rápidos al principio
+            espera = 1.0 if intento <= 5 else (2.0 if intento <= 15 else 3.0)
+            self._stop_event.wait(espera)
+
+    def registrar_resultado(self, t_captura, tiempo_inferencia):
+        """Actualiza las métricas del stream con un resultado emitido.
+
+        Args:
+            t_captura: Instante de captura del frame (time.monotonic())
+            tiempo_inferencia: Segundos de inferencia del frame (o del lote / tamaño)
+
+        Returns:
+            tuple: (fps_actual, fps_promedio) del stream
+        """
+        ahora = time.monotonic()
+        latencia = ahora - t_captura
+        self.procesados += 1
+        if latencia > self.plazo:
+            self.fuera_de_plazo += 1
+
+        fps_actual = 0.0
+        if self._ultimo_resultado is not None and ahora > self._ultimo_resultado:
+            fps_actual = 1.0 / (ahora - self._ultimo_resultado)
+            self._fps_ema = fps_actual if not self._fps_ema else 0.9 * self._fps_ema + 0.1 * fps_actual
+        self._ultimo_resultado = ahora
+        self._latencia_ema = latencia if self._latencia_ema is None else 0.9 * self._latencia_ema + 0.1 * latencia
+        self._inferencia_ema = (
+            tiempo_inferencia if self._inferencia_ema is None
+            else 0.9 * self._inferencia_ema + 0.1 * tiempo_inferencia
+        )
+        return fps_actual, self._fps_ema
+
+    def metricas(self):
+        """Métricas del stream para /api/streams y /api/status."""
+        return {
+            'stream': self.ruta,
+            'url': self.url,
+            'peso': self.peso,
+            'conectado': self.conectado,
+            'procesados': self.procesados,
+            'fps': round(self._fps_ema, 1),
+            'latencia_ms': round((self._latencia_ema or 0.0) * 1000, 1),
+            'inferencia_ms': round((self._inferencia_ema or 0.0) * 1000, 1),
+            'plazo_ms': round(self.plazo * 1000, 1),
+            'fuera_de_plazo': self.fuera_de_plazo,
+            'ingesta': self.buzon.stats(),
+        }
+
+    def cerrar(self):
+        """Detiene el monitor y el lector y libera la captura."""
+        self._stop_event.set()
+        if self.lector_thread is not None:
+            self.lector_thread.join(timeout=2.0)
+        if self.cap is not None:
+            try:
+                self.cap.release()
+            except Exception:
+                pass
+            self.cap = None
+
+
+class GestorStreams:
+    """Conjunto de streams y planificador que decide cuál se infiere a continuación."""
+
+    def __init__(self, streams=None, politica=None):
+        """
+        Args:
+            streams: Diccionario {ruta: peso} (None = config.STREAMS)
+            politica: 'wrr' o 'deadline' (None = config.STREAM_POLICY)
+        """
+        streams = config.STREAMS if streams is None else streams
+        self.politica = politica or config.STREAM_POLICY
+        if self.politica not in ('wrr', 'deadline'):
+            raise ValueError(f"Política de planificación desconocida: {self.politica}")
+        self._condicion = threading.Condition()
+        self.streams = {}
+        for ruta, peso in streams.items():
+            stream = StreamDron(ruta, peso, self._condicion)
+            self.streams[stream.ruta] = stream
+
+    def iniciar(self):
+        """Arranca el monitor de conexión de cada stream."""
+        print(f"[INFO] Iniciando {len(self.streams)} streams (política: {self.politica})...")
+        for stream in self.streams.values():
+            stream.iniciar()
+
+    @property
+    def alguno_conectado(self):
+        """Indica si al menos un stream está conectado."""
+        return any(stream.conectado for stream in self.streams.values())
+
+    def _elegir(self, listos, maximo):
+        """Elige hasta `maximo` streams entre los que tienen frame nuevo según la política.
+
+        Returns:
+            list: Streams elegidos, en el orden en que deben inferirse
+        """
+        if self.politica == 'deadline':
+            # Primero el frame cuyo plazo vence antes (peso mayor = plazo más corto)
+            return sorted(listos, key=lambda s: s.buzon.t_captura_pendiente() + s.plazo)[:maximo]
+
+        if len(listos) <= maximo:
+            # Hay sitio para todos: el reparto no cambia y el crédito no se toca
+            return list(listos)
+
+        # Round-robin ponderado suave: en cada ronda los streams listos ganan su
+        # peso en crédito una sola vez y el total repartido se descuenta a partes
+        # iguales entre los elegidos. Un stream no puede aportar más de un frame
+        # por ronda, así que el crédito se acota a ±total para que un peso que no
+        # cabe en la ronda no acumule deuda o saldo sin límite
+        total = 0.0
+        for stream in listos:
+            stream.credito += stream.peso
+            total += stream.peso
+        elegidos = sorted(listos, key=lambda s: s.credito, reverse=True)[:maximo]
+        for stream in elegidos:
+            stream.credito -= total / maximo
+        for stream in listos:
+            stream.credito = max(-total, min(total, stream.credito))
+        return elegidos
+
+    def siguientes(self, maximo=1, timeout=0.1):
+        """Espera frames nuevos y devuelve hasta `maximo`, en el orden de la política.
+
+        Cada stream aporta como mucho un frame (el más reciente de su buzón).
+
+        Args:
+            maximo: Número máximo de frames a devolver (tamaño de lote)
+            timeout: Espera máxima en segundos hasta que llegue algún frame
+
+        Returns:
+            list: Tuplas (stream, seq, frame, t_captura); vacía si venció el timeout
+        """
+        streams = list(self.streams.values())
+        with self._condicion:
+            if not self._condicion.wait_for(lambda: any(s.buzon.hay_nuevo() for s in streams), timeout):
+                return []
+            listos = [s for s in streams if s.buzon.hay_nuevo()]
+            elegidos = self._elegir(listos, maximo)
+
+        salida = []
+        for stream in elegidos:
+            resultado = stream.buzon.obtener(timeout=0)
+            if resultado is not None:
+                salida.append((stream, *resultado))
+        return salida
+
+    def metricas(self):
+        """Métricas de todos los streams."""
+        return [stream.metricas() for stream in self.streams.values()]
+
+    def cerrar(self):
+        """Detiene todos los streams."""
+        for stream in self.streams.values():
+            stream.cerrar()
@@ -0,0 +1,263 @@
+"""Seguimiento de objetos entre detecciones.
+
+TrackerIoU es un tracker multi-objeto ligero (asociación por IoU y modelo de
+velocidad constante) que propaga los boxes en los frames donde no se ejecuta
+el detector. DeteccionIntercalada combina detector y tracker: la inferencia se
+lanza en un hilo aparte cada N frames (o en cuanto el detector queda libre) y
+el tracker rellena los frames intermedios, de modo que la visualización y los
+conteos van al ritmo de ingesta mientras la NPU trabaja a una fracción.
+"""
+
+import math
+import threading
+import time
+import numpy as np
+from . import config
+
+
+def iou_matriz(a, b):
+    """IoU entre dos conjuntos de boxes xyxy.
+
+    Args:
+        a: np.ndarray (N, 4)
+        b: np.ndarray (M, 4)
+
+    Returns:
+        np.ndarray: Matriz (N, M) de IoU
+    """
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    interseccion = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - interseccion
+    return interseccion / np.maximum(union, 1e-9)
+
+
+class TrackerIoU:
+    """Tracker multi-objeto por IoU con velocidad constante.
+
+    El estado se guarda en arrays de NumPy (un elemento por track) para que
+    propagar cientos de boxes cueste una sola operación vectorizada por frame.
+    """
+
+    def __init__(self, iou_min=None, max_perdidas=None):
+        """
+        Args:
+            iou_min: IoU mínimo para asociar una detección a un track
+            max_perdidas: Detecciones consecutivas sin asociar antes de borrar un track
+        """
+        self.iou_min = config.TRACKER_IOU if iou_min is None else iou_min
+        self.max_perdidas = config.TRACKER_MAX_MISSES if max_perdidas is None else max_perdidas
+        self._siguiente_id = 0
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Elimina todos los tracks."""
+        self.boxes = np.zeros((0, 4), dtype=np.float32)
+        self.velocidades = np.zeros((0, 4), dtype=np.float32)  # Desplazamiento por frame
+        self.confianzas = np.zeros(0, dtype=np.float32)
+        self.class_ids = np.zeros(0, dtype=int)
+        self.track_ids = np.zeros(0, dtype=int)
+        self.perdidas = np.zeros(0, dtype=int)
+
+    def predecir(self, frames=1):
+        """Avanza todos los tracks el número de frames indicado."""
+        self.boxes += self.velocidades * frames
+
+    def actualizar(self, detecciones, retraso=0, frames_desde_ultima=1):
+        """Asocia nuevas detecciones con los tracks existentes.
+
+        Args:
+            detecciones: Tupla (xyxy, confianzas, class_ids)
+            retraso: Frames transcurridos desde el frame sobre el que se hizo
+                la detección (inferencia asíncrona). Los tracks se comparan
+                con su posición retroproyectada a ese frame.
+            frames_desde_ultima: Frames entre esta detección y la anterior,
+                para estimar la velocidad
+        """
+        xyxy, confianzas, class_ids = detecciones
+        xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        confianzas = np.asarray(confianzas, dtype=np.float32)
+        class_ids = np.asarray(class_ids, dtype=int)
+
+        pasado = self.boxes - self.velocidades * retraso
+        iou = iou_matriz(pasado, xyxy)
+        # Solo se asocian boxes de la misma clase
+        iou[self.class_ids[:, None] != class_ids[None, :]] = 0.0
+
+        # Asociación greedy por IoU descendente
+        asignado_track = np.full(len(self.boxes), -1)
+        asignada_det = np.zeros(len(xyxy), dtype=bool)
+        if iou.size:
+            for indice in np.argsort(iou, axis=None)[::-1]:
+                t, d = np.unravel_index(indice, iou.shape)
+                if iou[t, d] < self.iou_min:
+                    break
+                if asignado_track[t] >= 0 or asignada_det[d]:
+                    continue
+                asignado_track[t] = d
+                asignada_det[d] = True
+
+        # Tracks asociados: corregir posición y velocidad
+        emparejados = np.flatnonzero(asignado_track >= 0)
+        if len(emparejados):
+            dets = asignado_track[emparejados]
+            # El residuo respecto a la predicción corrige la velocidad (ganancia 0.5)
+            residuo = (xyxy[dets] - pasado[emparejados]) / max(frames_desde_ultima, 1)
+            self.velocidades[emparejados] += 0.5 * residuo
+            self.boxes[emparejados] = xyxy[dets] + self.velocidades[emparejados] * retraso
+            self.confianzas[emparejados] = confianzas[dets]
+            self.perdidas[emparejados] = 0
+
+        # Tracks no asociados: contar pérdida y borrar los caducados
+        self.perdidas[asignado_track < 0] += 1
+        vivos = self.perdidas <= self.max_perdidas
+
+        # Detecciones nuevas: crear tracks
+        nuevas = np.flatnonzero(~asignada_det)
+        nuevos_ids = np.arange(self._siguiente_id, self._siguiente_id + len(nuevas))
+        self._siguiente_id += len(nuevas)
+
+        self.boxes = np.concatenate([self.boxes[vivos], xyxy[nuevas]])
+        self.velocidades = np.concatenate([self.velocidades[vivos], np.zeros((len(nuevas), 4), dtype=np.float32)])
+        self.confianzas = np.concatenate([self.confianzas[vivos], confianzas[nuevas]])
+        self.class_ids = np.concatenate([self.class_ids[vivos], class_ids[nuevas]])
+        self.track_ids = np.concatenate([self.track_ids[vivos], nuevos_ids])
+        self.perdidas = np.concatenate([self.perdidas[vivos], np.zeros(len(nuevas), dtype=int)])
+
+    def detecciones(self):
+        """Tracks actuales como detecciones (solo los que siguen asociados).
+
+        Returns:
+            tuple: (xyxy, confianzas, class_ids, track_ids)
+        """
+        activos = self.perdidas == 0
+        return (
+            self.boxes[activos].copy(),
+            self.confianzas[activos].copy(),
+            self.class_ids[activos].copy(),
+            self.track_ids[activos].copy(),
+        )
+
+
+class DeteccionIntercalada:
+    """Ejecuta el detector cada N frames y rellena el resto con un tracker.
+
+    La inferencia corre en un hilo propio; mientras tanto cada frame se anota
+    con los boxes propagados por el tracker. N se adapta a la latencia medida
+    de inferencia y al intervalo entre frames.
+    """
+
+    def __init__(self, detector):
+        self.detector = detector
+        self.tracker = TrackerIoU()
+        self.n_actual = config.DETECT_N_MIN
+        self._frame_idx = 0
+        self._ultimo_lanzamiento = -10 ** 9
+        self._ultimo_frame_detectado = None
+        self._ultimo_tiempo_frame = None
+        self._intervalo_ema = None
+        self._latencia_ema = None
+        self._tracker_ema = 0.0
+        self._ultima_latencia = 0.0
+        self._hilo = None
+        self._resultado = None  # (frame_idx, detecciones, latencia)
+        self.cajas = None  # (xyxy, confianzas, class_ids, track_ids) del último frame procesado
+        self._lock = threading.Lock()
+
+    def _inferir_en_hilo(self, frame, frame_idx, conf):
+        """Cuerpo del hilo de inferencia."""
+        inicio = time.time()
+        try:
+            detecciones = self.detector.inferir(frame, conf)
+        except Exception as exc:
+            print(f"[WARN] Inferencia fallida: {exc}")
+            detecciones = None
+        latencia = time.time() - inicio
+        with self._lock:
+            self._resultado = (frame_idx, detecciones, latencia)
+
+    def procesar(self, frame, conf_threshold=None, selected_classes=None, class_colors=None, dibujar=True):
+        """Procesa un frame: integra detecciones terminadas, propaga y dibuja.
+
+        Args:
+            frame: Frame de OpenCV (numpy array)
+            conf_threshold: Threshold de confianza (None = config.CONF_THRESH)
+            selected_classes: Lista de nombres de clases a detectar (None = todas)
+            class_colors: Diccionario {nombre_clase: (B, G, R)} para colores de bboxes
+            dibujar: False = devolver el frame sin anotar (overlay en el cliente);
+                los tracks del frame quedan en self.cajas
+
+        Returns:
+            tuple: (frame_anotado, latencia_inferencia, clases_detectadas, info)
+                - latencia_inferencia: Última latencia de inferencia medida en
+                  segundos, o None si en este frame no terminó ninguna
+                - info: Diccionario con n_actual y el coste del tracker en ms
+        """
+        ahora = time.time()
+        if self._ultimo_tiempo_frame is not None:
+            intervalo = ahora - self._ultimo_tiempo_frame
+            self._intervalo_ema = intervalo if self._intervalo_ema is None else 0.9 * self._intervalo_ema + 0.1 * intervalo
+        self._ultimo_tiempo_frame = ahora
+        self._frame_idx += 1
+
+        inicio_tracker = time.time()
+        self.tracker.predecir()
+
+        # Integrar una detección terminada (hecha sobre un frame anterior)
+        latencia = None
+        with self._lock:
+            resultado, self._resultado = self._resultado, None
+        if resultado is not None:
+            frame_idx, detecciones, latencia = resultado
+            self._ultima_latencia = latencia
+            self._latencia_ema = latencia if self._latencia_ema is None else 0.8 * self._latencia_ema + 0.2 * latencia
+            if detecciones is not None:
+                desde_ultima = frame_idx - self._ultimo_frame_detectado if self._ultimo_frame_detectado else 1
+                self.tracker.actualizar(
+                    detecciones,
+                    retraso=self._frame_idx - frame_idx,
+                    frames_desde_ultima=desde_ultima
+                )
+                self._ultimo_frame_detectado = frame_idx
+        tiempo_tracker = time.time() - inicio_tracker
+        self._tracker_ema = 0.9 * self._tracker_ema + 0.1 * tiempo_tracker
+
+        # Adaptar N a la latencia de inferencia: no lanzar más rápido de lo que el detector responde
+        if self._latencia_ema is not None and self._intervalo_ema:
+            n_ideal = math.ceil(self._latencia_ema / self._intervalo_ema)
+            self.n_actual = max(config.DETECT_N_MIN, min(config.DETECT_N_MAX, n_ideal))
+
+        # Lanzar una nueva inferencia si toca y el detector está libre
+        libre = self._hilo is None or not self._hilo.is_alive()
+        if libre and self._frame_idx - self._ultimo_lanzamiento >= self.n_actual:
+            conf = conf_threshold if conf_threshold is not None else config.CONF_THRESH
+            self._ultimo_lanzamiento = self._frame_idx
+            self._hilo = threading.Thread(
+                target=self._inferir_en_hilo,
+                args=(frame, self._frame_idx, conf),
+                daemon=True
+            )
+            self._hilo.start()
+
+        self.cajas = self.tracker.detecciones()
+        xyxy, confianzas, class_ids, _ = self.cajas
+        if dibujar:
+            annotated, clases_detectadas = self.detector.anotar(
+                frame, (xyxy, confianzas, class_ids), selected_classes, class_colors
+            )
+        else:
+            annotated = frame
+            clases_detectadas = self.detector.resumir((xyxy, confianzas, class_ids), selected_classes)
+
+        info = {
+            'deteccion_cada': self.n_actual,
+            'tracker_ms': round(self._tracker_ema * 1000, 2),
+            'tracks': len(self.tracker.boxes),
+        }
+        return annotated, latencia, clases_detectadas, info
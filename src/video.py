@@ -1,20 +1,539 @@
 """Módulo para gestión de video y streaming RTMP."""
 
+import csv
+import pathlib
+import sys
 import time
-import queue
+import subprocess
+import threading
 import cv2
+import numpy as np
 from . import config
 
 
+class CapturaFFmpeg:
+    """Motor de ingesta alternativo basado en un subproceso ffmpeg.
+    
+    ffmpeg decodifica la URL (RTMP o archivo local) y escribe frames BGR crudos
+    por stdout; cada frame se lee con readinto directamente sobre un anillo de
+    buffers NumPy preasignados, sin reservar memoria por frame. Expone la misma
+    interfaz que cv2.VideoCapture (isOpened, read, set, get, release), así que
+    lector_frames y el monitor de reconexión funcionan sin cambios.
+    
+    Un buffer solo se reutiliza cuando nadie más lo referencia: el buzón, la
+    inferencia, el tracker, los micro-lotes y la caché JPEG lo retienen el
+    tiempo que necesiten (las vistas de NumPy también cuentan, por su .base). Si
+    todos los buffers están en uso el anillo crece hasta config.FFMPEG_RING_MAX.
+    """
+    
+    def __init__(self, url, size=None, n_buffers=None):
+        """
+        Args:
+            url: URL RTMP o ruta de un archivo de video
+            size: (ancho, alto) de salida. None = config.INGEST_SIZE o, si
+                tampoco está definido, la resolución nativa (vía ffprobe)
+            n_buffers: Tamaño inicial del anillo (None = config.FFMPEG_RING)
+        """
+        self.url = url
+        self._proceso = None
+        self._buffers = []
+        self._indice = 0
+        self.fps = 0.0
+        self.buffers_extra = 0  # Frames leídos en un buffer fuera del anillo (anillo lleno)
+        
+        size = size if size is not None else config.INGEST_SIZE
+        if size is None:
+            size = self._sondear(url)
+            if size is None:
+                return
+        self.ancho, self.alto = int(size[0]), int(size[1])
+        self._bytes_frame = self.ancho * self.alto * 3
+        n_buffers = config.FFMPEG_RING if n_buffers is None else n_buffers
+        self._buffers = [np.empty((self.alto, self.ancho, 3), dtype=np.uint8) for _ in range(max(2, n_buffers))]
+        
+        comando = [config.FFMPEG_BIN, '-hide_banner', '-loglevel', 'error', '-nostdin']
+        if config.FFMPEG_REALTIME:
+            comando += ['-re']
+        comando += [
+            '-fflags', 'nobuffer',
+            '-flags', 'low_delay',
+            '-rw_timeout', str(int(config.FFMPEG_TIMEOUT * 1_000_000)),
+            '-threads', str(config.FFMPEG_THREADS),
+            '-i', url,
+            '-an', '-sn',
+            '-vf', f'scale={self.ancho}:{self.alto}',
+            '-pix_fmt', 'bgr24',
+            '-f', 'rawvideo',
+            'pipe:1',
+        ]
+        try:
+            # bufsize=0: readinto escribe directamente en el buffer NumPy, sin copia intermedia
+            self._proceso = subprocess.Popen(
+                comando,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                bufsize=0
+            )
+        except OSError as exc:
+            print(f"[WARN] No se pudo lanzar ffmpeg: {exc}")
+            self._proceso = None
+            return
+        threading.Thread(target=self._leer_errores, daemon=True).start()
+    
+    def _sondear(self, url):
+        """Obtiene (ancho, alto) y FPS del stream con ffprobe.
+        
+        Returns:
+            tuple: (ancho, alto) o None si no se pudo sondear
+        """
+        comando = [
+            config.FFPROBE_BIN, '-v', 'error',
+            '-rw_timeout', str(int(config.FFMPEG_TIMEOUT * 1_000_000)),
+            '-select_streams', 'v:0',
+            '-show_entries', 'stream=width,height,avg_frame_rate',
+            '-of', 'csv=p=0',
+            url,
+        ]
+        try:
+            resultado = subprocess.run(comando, capture_output=True, text=True, timeout=config.FFMPEG_TIMEOUT * 2)
+            ancho, alto, fps = resultado.stdout.strip().splitlines()[0].split(',')[:3]
+            numerador, _, denominador = fps.partition('/')
+            self.fps = float(numerador) / float(denominador or 1) if float(denominador or 1) else 0.0
+            return int(ancho), int(alto)
+        except (OSError, subprocess.TimeoutExpired, ValueError, IndexError) as exc:
+            print(f"[WARN] No se pudo sondear el stream con ffprobe: {exc}")
+            return None
+    
+    def _leer_errores(self):
+        """Reenvía a consola los mensajes de error de ffmpeg."""
+        proceso = self._proceso
+        for linea in iter(proceso.stderr.readline, b''):
+            print(f"[FFMPEG] {linea.decode(errors='replace').rstrip()}")
+    
+    def isOpened(self):
+        """Indica si el subproceso ffmpeg sigue activo."""
+        return self._proceso is not None and self._proceso.poll() is None
+    
+    def _buffer_libre(self):
+        """Siguiente buffer del anillo que ya nadie referencia.
+        
+        Si todos siguen en uso, el anillo crece hasta config.FFMPEG_RING_MAX;
+        por encima se reserva un buffer suelto para no sobrescribir ninguno.
+        """
+        for _ in range(len(self._buffers)):
+            buffer = self._buffers[self._indice]
+            self._indice = (self._indice + 1) % len(self._buffers)
+            # Referencias: la lista, la variable local y el argumento de getrefcount
+            if sys.getrefcount(buffer) <= 3:
+                return buffer
+        buffer = np.empty((self.alto, self.ancho, 3), dtype=np.uint8)
+        if len(self._buffers) < config.FFMPEG_RING_MAX:
+            self._buffers.insert(self._indice, buffer)
+            self._indice = (self._indice + 1) % len(self._buffers)
+        else:
+            if self.buffers_extra == 0:
+                print(f"[WARN] Los {len(self._buffers)} buffers de ingesta siguen en uso: se reservan buffers sueltos")
+            self.buffers_extra += 1
+        return buffer
+    
+    def read(self):
+        """Lee el siguiente frame sobre un buffer libre del anillo.
+        
+        Returns:
+            tuple: (ret, frame). El frame es un buffer del anillo: no se
+                sobrescribe mientras quede alguna referencia a él o a una vista suya.
+        """
+        if self._proceso is None:
+            return False, None
+        buffer = self._buffer_libre()
+        with memoryview(buffer) as original, original.cast('B') as vista:
+            leidos = 0
+            while leidos < self._bytes_frame:
+                with vista[leidos:] as resto:
+                    n = self._proceso.stdout.readinto(resto)
+                if not n:
+                    # EOF: ffmpeg terminó (fin de archivo, timeout o conexión perdida)
+                    return False, None
+                leidos += n
+        return True, buffer
+    
+    def set(self, propiedad, valor):
+        """Compatibilidad con cv2.VideoCapture (ffmpeg no usa buffer interno)."""
+        return propiedad == cv2.CAP_PROP_BUFFERSIZE
+    
+    def get(self, propiedad):
+        """Compatibilidad con cv2.VideoCapture para ancho, alto y FPS."""
+        if not self._buffers:
+            return 0.0
+        if propiedad == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.ancho)
+        if propiedad == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.alto)
+        if propiedad == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        return 0.0
+    
+    def release(self):
+        """Termina el subproceso ffmpeg."""
+        proceso, self._proceso = self._proceso, None
+        if proceso is None:
+            return
+        try:
+            proceso.terminate()
+            proceso.wait(timeout=2.0)
+        except subprocess.TimeoutExpired:
+            proceso.kill()
+        except OSError:
+            pass
+        if proceso.stdout is not None:
+            proceso.stdout.close()
+
+
+class SalidaFFmpeg:
+    """Salida de video por el stdin de un subproceso ffmpeg que codifica en H.264.
+
+    escribir() nunca bloquea al llamador: copia el frame en un hueco único y un
+    hilo escritor lo pasa a ffmpeg. Si el codificador no da abasto (el hilo
+    sigue escribiendo el frame anterior), el frame pendiente se reemplaza por
+    el nuevo y se cuenta como descartado, igual que BuzonFrames en la ingesta.
+    Los frames llevan como marca de tiempo el reloj de pared, así un ritmo de
+    inferencia variable no desincroniza el video.
+    """
+
+    def __init__(self, salida, size, nombre="ffmpeg"):
+        """
+        Args:
+            salida: Argumentos de salida de ffmpeg (formato y destino), p. ej.
+                ['-f', 'flv', 'rtmp://...']
+            size: (ancho, alto) del video codificado; los frames de otro tamaño se redimensionan
+            nombre: Etiqueta para los mensajes de consola
+        """
+        self.ancho, self.alto = int(size[0]), int(size[1])
+        self.nombre = nombre
+        self._buffers = [np.empty((self.alto, self.ancho, 3), dtype=np.uint8) for _ in range(2)]
+        self._pendiente = None  # Índice del buffer con un frame listo para ffmpeg
+        self._escribiendo = None  # Índice del buffer que está usando el hilo escritor
+        self._condicion = threading.Condition()
+        self._cerrado = False
+        self.escritos = 0
+        self.descartados = 0
+        self.error = None
+
+        comando = [
+            config.FFMPEG_BIN, '-hide_banner', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{self.ancho}x{self.alto}',
+            '-use_wallclock_as_timestamps', '1',
+            '-i', 'pipe:0',
+            '-an',
+            '-c:v', config.ENCODER_H264, *config.ENCODER_H264_ARGS,
+            '-b:v', config.ENCODER_BITRATE,
+            '-g', str(config.ENCODER_GOP),
+            '-pix_fmt', 'yuv420p',
+            *salida,
+        ]
+        try:
+            self._proceso = subprocess.Popen(
+                comando,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                bufsize=0
+            )
+        except OSError as exc:
+            print(f"[WARN] No se pudo lanzar ffmpeg ({nombre}): {exc}")
+            self._proceso = None
+            self.error = str(exc)
+            return
+        threading.Thread(target=self._leer_errores, daemon=True).start()
+        self._hilo = threading.Thread(target=self._escritor, daemon=True)
+        self._hilo.start()
+
+    def _leer_errores(self):
+        """Reenvía a consola los mensajes de error de ffmpeg."""
+        for linea in iter(self._proceso.stderr.readline, b''):
+            print(f"[FFMPEG] ({self.nombre}) {linea.decode(errors='replace').rstrip()}")
+
+    def _escritor(self):
+        """Hilo que entrega a ffmpeg el frame pendiente más reciente."""
+        while True:
+            with self._condicion:
+                self._condicion.wait_for(lambda: self._pendiente is not None or self._cerrado)
+                if self._pendiente is None:
+                    break
+                self._escribiendo, self._pendiente = self._pendiente, None
+            try:
+                # Puede bloquear si ffmpeg va atrasado: solo bloquea a este hilo
+                vista = memoryview(self._buffers[self._escribiendo]).cast('B')
+                while vista:
+                    vista = vista[self._proceso.stdin.write(vista):]
+                self.escritos += 1
+            except (BrokenPipeError, OSError, ValueError) as exc:
+                if not self._cerrado:
+                    print(f"[WARN] ffmpeg ({self.nombre}) dejó de aceptar frames: {exc}")
+                    self.error = str(exc)
+                with self._condicion:
+                    self._cerrado = True
+                    self._escribiendo = None
+                break
+            with self._condicion:
+                self._escribiendo = None
+
+    @property
+    def activa(self):
+        """Indica si ffmpeg sigue aceptando frames."""
+        return self._proceso is not None and not self._cerrado and self._proceso.poll() is None
+
+    def escribir(self, frame):
+        """Entrega un frame al codificador sin esperar a ffmpeg.
+
+        Returns:
+            bool: False si la salida ya no está activa
+        """
+        if not self.activa:
+            return False
+        with self._condicion:
+            if self._pendiente is not None:
+                self.descartados += 1  # El codificador no recogió el anterior: se reemplaza
+                indice = self._pendiente
+            else:
+                indice = 1 if self._escribiendo == 0 else 0
+            destino = self._buffers[indice]
+            if frame.shape == destino.shape:
+                np.copyto(destino, frame)
+            else:
+                destino[:] = cv2.resize(frame, (self.ancho, self.alto), interpolation=cv2.INTER_AREA)
+            self._pendiente = indice
+            self._condicion.notify()
+        return True
+
+    def stats(self):
+        """Frames codificados y descartados."""
+        return {
+            'activa': self.activa,
+            'resolucion': f"{self.ancho}x{self.alto}",
+            'escritos': self.escritos,
+            'descartados': self.descartados,
+            'error': self.error,
+        }
+
+    def cerrar(self, timeout=5.0):
+        """Vacía el frame pendiente, cierra el stdin de ffmpeg y espera a que termine."""
+        if self._proceso is None:
+            return
+        with self._condicion:
+            self._cerrado = True
+            self._condicion.notify()
+        self._hilo.join(timeout=timeout)
+        try:
+            self._proceso.stdin.close()
+        except OSError:
+            pass
+        try:
+            self._proceso.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self._proceso.kill()
+            print(f"[WARN] ffmpeg ({self.nombre}) forzado con kill().")
+
+
+class GrabadorSegmentado(SalidaFFmpeg):
+    """Grabación en segmentos MP4 fragmentados desde un hilo codificador.
+
+    ffmpeg corta un segmento nuevo cada segmento_s segundos (en un keyframe
+    forzado) y anota cada segmento terminado en segmentos.csv: esos archivos se
+    pueden descargar mientras la grabación sigue. Los segmentos son MP4
+    fragmentados, así que incluso el que está en curso es reproducible si el
+    proceso muere. Expone write/isOpened/release como cv2.VideoWriter.
+    """
+
+    def __init__(self, directorio, frame_size, segmento_s=None):
+        """
+        Args:
+            directorio: Carpeta de la grabación (se crea si no existe)
+            frame_size: Tamaño de los frames (ancho, alto)
+            segmento_s: Duración de cada segmento (None = config.RECORD_SEGMENT)
+        """
+        self.directorio = pathlib.Path(directorio)
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self._lista = self.directorio / 'segmentos.csv'
+        segmento_s = segmento_s or config.RECORD_SEGMENT
+        salida = [
+            '-force_key_frames', f'expr:gte(t,n_forced*{segmento_s})',
+            '-f', 'segment',
+            '-segment_time', str(segmento_s),
+            '-segment_format', 'mp4',
+            '-segment_format_options', 'movflags=+frag_keyframe+empty_moov+default_base_moof',
+            '-reset_timestamps', '1',
+            '-segment_list', str(self._lista),
+            '-segment_list_type', 'csv',
+            str(self.directorio / 'segmento_%03d.mp4'),
+        ]
+        super().__init__(salida, frame_size, nombre=f"grabación {self.directorio.name}")
+
+    def segmentos(self):
+        """Segmentos terminados, en orden.
+
+        Returns:
+            list: Diccionarios {'archivo', 'inicio', 'fin'} (segundos desde el inicio del segmento)
+        """
+        return leer_segmentos(self.directorio)
+
+    def write(self, frame):
+        """Compatibilidad con cv2.VideoWriter (no bloquea: puede descartar el frame)."""
+        self.escribir(frame)
+
+    def isOpened(self):
+        """Compatibilidad con cv2.VideoWriter."""
+        return self.activa
+
+    def release(self):
+        """Cierra el último segmento y espera a que ffmpeg termine."""
+        self.cerrar()
+
+
+def leer_segmentos(directorio):
+    """Lee la lista de segmentos terminados de una grabación (segmentos.csv).
+
+    Returns:
+        list: Diccionarios {'archivo', 'inicio', 'fin'}; vacía si aún no terminó ninguno
+    """
+    lista = pathlib.Path(directorio) / 'segmentos.csv'
+    try:
+        with open(lista, newline='') as f:
+            return [
+                {'archivo': fila[0], 'inicio': float(fila[1]), 'fin': float(fila[2])}
+                for fila in csv.reader(f) if len(fila) >= 3
+            ]
+    except (OSError, ValueError):
+        return []
+
+
+class BuzonFrames:
+    """Buzón de un solo hueco que guarda siempre el frame más reciente.
+    
+    El productor sobrescribe el hueco en O(1) con un único lock; el consumidor
+    se bloquea hasta que llega un número de secuencia nuevo. Cada frame lleva
+    su instante de captura para medir cuánto envejeció al ser consumido.
+    Pensado para un solo productor y un solo consumidor.
+    """
+    
+    def __init__(self, condicion=None):
+        """
+        Args:
+            condicion: threading.Condition compartida (opcional). Varios buzones
+                con la misma condición permiten esperar a cualquiera de ellos.
+        """
+        self._condicion = condicion if condicion is not None else threading.Condition()
+        self._frame = None
+        self._seq = 0  # Secuencia del último frame publicado
+        self._seq_leida = 0  # Secuencia del último frame consumido
+        self._t_captura = 0.0
+        self.publicados = 0
+        self.consumidos = 0
+        self.descartados = 0  # Frames sobrescritos antes de ser consumidos
+        self.descartados_ingesta = 0  # Frames perdidos antes de llegar al buzón (CapturaProceso)
+        self.ultima_edad = 0.0
+        self._edad_ema = None
+        self._edad_max = 0.0
+    
+    def publicar(self, frame, t_captura=None):
+        """Deja un frame en el buzón, sustituyendo al anterior si no se consumió.
+        
+        Args:
+            frame: Frame de OpenCV
+            t_captura: Instante de captura (time.monotonic()); None = ahora
+            
+        Returns:
+            int: Número de secuencia asignado
+        """
+        with self._condicion:
+            if self._seq > self._seq_leida:
+                self.descartados += 1
+            self._frame = frame
+            self._seq += 1
+            self._t_captura = time.monotonic() if t_captura is None else t_captura
+            self.publicados += 1
+            self._condicion.notify_all()
+            return self._seq
+    
+    def obtener(self, timeout=None):
+        """Espera un frame nuevo (posterior al último consumido).
+        
+        Args:
+            timeout: Espera máxima en segundos (None = indefinida)
+            
+        Returns:
+            tuple: (seq, frame, t_captura) o None si venció el timeout
+        """
+        with self._condicion:
+            if not self._condicion.wait_for(lambda: self._seq > self._seq_leida, timeout):
+                return None
+            self._seq_leida = self._seq
+            frame, self._frame = self._frame, None
+            seq, t_captura = self._seq, self._t_captura
+            self.consumidos += 1
+        
+        edad = time.monotonic() - t_captura
+        self.ultima_edad = edad
+        self._edad_ema = edad if self._edad_ema is None else 0.9 * self._edad_ema + 0.1 * edad
+        self._edad_max = max(self._edad_max, edad)
+        return seq, frame, t_captura
+    
+    def hay_nuevo(self):
+        """Indica si hay un frame publicado que aún no se consumió."""
+        return self._seq > self._seq_leida
+    
+    def t_captura_pendiente(self):
+        """Instante de captura del frame pendiente, o None si no hay ninguno."""
+        return self._t_captura if self._seq > self._seq_leida else None
+    
+    def stats(self):
+        """Contadores del buzón y edad de los frames al ser consumidos.
+        
+        Returns:
+            dict: publicados, consumidos, descartados, ratio de descarte, descartados
+                en la ingesta (antes del buzón) y
+                edad última/media/máxima en milisegundos
+        """
+        return {
+            'publicados': self.publicados,
+            'consumidos': self.consumidos,
+            'descartados': self.descartados,
+            'ratio_descarte': round(self.descartados / self.publicados, 3) if self.publicados else 0.0,
+            'descartados_ingesta': self.descartados_ingesta,
+            'edad_ms': round(self.ultima_edad * 1000, 1),
+            'edad_media_ms': round((self._edad_ema or 0.0) * 1000, 1),
+            'edad_max_ms': round(self._edad_max * 1000, 1),
+        }
+
+
+def crear_captura(url=None):
+    """Abre la fuente de video con el motor de ingesta configurado.
+    
+    Args:
+        url: URL RTMP o ruta de archivo (None = config.RTMP_URL)
+        
+    Returns:
+        cv2.VideoCapture o CapturaFFmpeg según config.INGEST_ENGINE
+        (CapturaProceso si config.INGEST_PROCESS)
+    """
+    url = url if url is not None else config.RTMP_URL
+    if config.INGEST_PROCESS:
+        from .memoria_compartida import CapturaProceso
+        return CapturaProceso(url)
+    if config.INGEST_ENGINE == "ffmpeg":
+        return CapturaFFmpeg(url)
+    return cv2.VideoCapture(url)
+
+
 def abrir_stream():
     """Abre una conexión al stream RTMP con reintentos automáticos.
     
     Returns:
-        cv2.VideoCapture: Objeto de captura de video
+        cv2.VideoCapture o CapturaFFmpeg: Objeto de captura de video
     """
     intentos = 0
     while True:
-        cap = cv2.VideoCapture(config.RTMP_URL)
+        cap = crear_captura()
         if cap.isOpened():
             cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
             print("[OK] Conexión RTMP abierta.")
@@ -26,8 +545,8 @@ def abrir_stream():
         time.sleep(config.RETRY_DELAY)
 
 
-def lector_frames(cap, cola, stop_event):
-    """Hilo que lee frames continuamente y los pone en la cola.
+def lector_frames(cap, buzon, stop_event):
+    """Hilo que lee frames continuamente y los publica en el buzón.
     
     Este hilo mantiene la conexión RTMP viva leyendo frames continuamente,
     incluso si la inferencia es lenta. Los frames intermedios se descartan
@@ -38,14 +557,14 @@ def lector_frames(cap, cola, stop_event):
     de conexión pueda reconectar.
     
     Args:
-        cap: Objeto cv2.VideoCapture
-        cola: queue.Queue para almacenar frames
+        cap: Objeto cv2.VideoCapture o CapturaFFmpeg
+        buzon: BuzonFrames donde se publica el frame más reciente
         stop_event: threading.Event para detener el hilo
     """
     print("[INFO] Hilo lector iniciado.")
     frames_leidos = 0
-    frames_descartados = 0
     errores_consecutivos = 0
+    descartados_previos = buzon.descartados_ingesta  # Acumulado de conexiones anteriores
     max_errores_consecutivos = 30  # Si falla 30 veces seguidas, considerar desconectado
     
     while not stop_event.is_set():
@@ -56,6 +575,8 @@ def lector_frames(cap, cola, stop_event):
                 break
             
             ret, frame = cap.read()
+            # CapturaProceso trae el instante de captura medido en el proceso de ingesta
+            t_captura = getattr(cap, 'ultimo_t_captura', None) or time.monotonic()
             if not ret:
                 errores_consecutivos += 1
                 if errores_consecutivos >= max_errores_consecutivos:
@@ -68,23 +589,18 @@ def lector_frames(cap, cola, stop_event):
             errores_consecutivos = 0
             frames_leidos += 1
             
-            try:
-                frame = cv2.resize(frame, config.FRAME_SIZE)
-            except Exception as exc:
-                print(f"[WARN] Fallo al redimensionar frame: {exc}")
-                continue
-
-            try:
-                cola.put_nowait(frame)
-            except queue.Full:
-                # Si la cola está llena, descarta el frame antiguo y pone el nuevo
-                # Esto asegura que siempre procesemos el frame más reciente
+            # Por defecto el frame se encola a resolución nativa: el letterbox del
+            # modelo hace un único resize y la visualización reduce su propia copia
+            if config.INGEST_SIZE is not None and (frame.shape[1], frame.shape[0]) != tuple(config.INGEST_SIZE):
                 try:
-                    cola.get_nowait()
-                    cola.put_nowait(frame)
-                    frames_descartados += 1
-                except queue.Empty:
-                    pass
+                    frame = cv2.resize(frame, config.INGEST_SIZE)
+                except Exception as exc:
+                    print(f"[WARN] Fallo al redimensionar frame: {exc}")
+                    continue
+
+            # Sobrescribe el frame anterior si no se consumió: siempre se procesa el más reciente
+            buzon.publicar(frame, t_captura)
+            buzon.descartados_ingesta = descartados_previos + getattr(cap, 'descartados', 0)
                 
         except Exception as exc:
             errores_consecutivos += 1
@@ -102,22 +618,51 @@ def lector_frames(cap, cola, stop_event):
     except Exception:
         pass
     
-    print(f"[INFO] Hilo lector detenido. Frames leídos: {frames_leidos}, descartados: {frames_descartados}")
+    print(f"[INFO] Hilo lector detenido. Frames leídos: {frames_leidos}, descartados: {buzon.descartados}")
 
 
-def crear_writer(ruta, frame_size, fps):
+def redimensionar_para_mostrar(frame, size=None):
+    """Devuelve una copia reducida del frame para visualización o codificación.
+    
+    Args:
+        frame: Frame de OpenCV a cualquier resolución
+        size: Tamaño destino (ancho, alto). None = config.FRAME_SIZE
+        
+    Returns:
+        numpy.ndarray: El mismo frame si ya tiene ese tamaño, o una copia redimensionada
+    """
+    ancho, alto = size if size is not None else config.FRAME_SIZE
+    if frame.shape[1] == ancho and frame.shape[0] == alto:
+        return frame
+    # INTER_AREA evita aliasing al reducir desde resolución nativa
+    return cv2.resize(frame, (ancho, alto), interpolation=cv2.INTER_AREA)
+
+
+def crear_writer(ruta, frame_size, fps, segmento_s=None):
     """Crea un VideoWriter para guardar video en archivo.
     
+    Con segmento_s la grabación se hace con ffmpeg en un hilo aparte
+    (GrabadorSegmentado): ruta es la carpeta de los segmentos MP4 y las marcas
+    de tiempo salen del reloj, así que fps no se usa.
+    
     Args:
         ruta: Ruta del archivo de salida (None para no grabar)
         frame_size: Tamaño de los frames (ancho, alto)
         fps: Frames por segundo
+        segmento_s: Duración de cada segmento en segundos (None = un solo archivo con OpenCV)
         
     Returns:
-        cv2.VideoWriter o None si ruta es None
+        cv2.VideoWriter, GrabadorSegmentado o None si ruta es None
     """
     if ruta is None:
         return None
+    if segmento_s:
+        writer = GrabadorSegmentado(ruta, frame_size, segmento_s)
+        if not writer.isOpened():
+            print(f"[WARN] No se pudo iniciar la grabación en {ruta}.")
+            return None
+        print(f"[OK] Grabando en segmentos de {segmento_s} s en {ruta}")
+        return writer
     fourcc = cv2.VideoWriter_fourcc(*'mp4v')
     writer = cv2.VideoWriter(ruta, fourcc, fps, frame_size)
     if not writer.isOpened():
@@ -1,23 +1,31 @@
 """Servidor Flask para PWA de detección UAV."""
 
 import threading
-import queue
 import time
 import cv2
+import numpy as np
 import base64
+import json
 import os
+import struct
 import tempfile
-import subprocess
-from flask import Flask, jsonify, request, send_from_directory, send_file
+from flask import Flask, Response, jsonify, request, send_from_directory, send_file
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room, leave_room
 import sys
 
 from src import config
 from src.hotspot import levantar_hotspot, bajar_hotspot, conexion_hotspot_activa, obtener_ip_hotspot
-from src.mediamtx import iniciar_mediamtx, detener_mediamtx
-from src.video import abrir_stream, lector_frames
-from src.detector import DetectorYOLO
+from src.mediamtx import iniciar_mediamtx, detener_mediamtx, PublicadorMediaMTX
+from src.video import BuzonFrames, abrir_stream, crear_captura, crear_writer, leer_segmentos, lector_frames
+from src.cache_modelos import CacheModelos
+from src.pool import DetectorPool
+from src.tracker import DeteccionIntercalada
+from src.movimiento import CompuertaMovimiento
+from src.streams import GestorStreams
+from src.latencia import TrazadorLatencia
+from src.difusion import CacheJPEG, GestorVisores
+from src.conversion import ColaConversiones
 
 # Obtener ruta absoluta del directorio web
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -29,12 +37,28 @@ socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
 
 # Estado global
 detector = None
+pool = None  # DetectorPool si config.POOL_WORKERS > 0
+intercalada = None  # DeteccionIntercalada si config.TRACKER_MODE
+tracker_info = {}  # Última info del tracker (N actual, coste en ms)
+compuerta = CompuertaMovimiento()  # Salta la inferencia en escenas estáticas
+cache_modelos = CacheModelos()  # Detectores cargados (LRU) para cambios de modelo instantáneos
+modelo_activo = None  # Nombre del modelo que está sirviendo
+cambio_pendiente = None  # (nombre, detector, pool, desde_cache) listo para activarse entre dos frames
+cambio_lock = threading.Lock()
+hilo_cambio_modelo = None  # Hilo que prepara el próximo modelo
+ultimas_detecciones = None  # (detector, conf, detecciones) de la última inferencia
 cap = None
 writer = None
 lector_thread = None
 mediamtx_proc = None
 stop_event = threading.Event()
-frame_queue = queue.Queue(maxsize=1)
+buzon_frames = BuzonFrames()  # Último frame recibido (el lector sobrescribe, el pipeline espera)
+gestor_streams = GestorStreams() if config.STREAMS else None  # Modo multi-dron (config.STREAMS)
+trazador = TrazadorLatencia()  # Latencias por etapa, de la captura a la pantalla del navegador
+publicadores = {}  # {sala: PublicadorMediaMTX} del video anotado (config.PUBLISH_ANNOTATED)
+grabaciones = {}  # {sala: (id, GrabadorSegmentado)} en curso (/api/recording)
+grabaciones_lock = threading.Lock()
+transporte_stats = {'frames': 0, 'bytes': 0, 'empaquetado_s': 0.0, 'inicio': time.time()}  # Frames emitidos por Socket.IO
 inferir = False
 fps_hist = []
 frame_count = 0
@@ -42,17 +66,18 @@ selected_classes = None  # Lista de clases seleccionadas para detectar
 conf_threshold = None  # Threshold de confianza personalizado
 class_colors = {}  # Diccionario {nombre_clase: (B, G, R)} para colores de bboxes
 
-# Diccionario de modelos disponibles
+# Diccionario de modelos disponibles: {'path': ruta, 'backend': backend de inferencia}
+# Backends: 'ultralytics', 'onnxruntime' (CPU) o 'rknn' (NPU directo con rknn-toolkit-lite2)
 MODELOS_DISPONIBLES = {
-    'uav': 'Visdrone_yolo11n_rknn_model',  # Modelo por defecto (UAV)
-    'fuego': 'incendio_yolo11s_rknn_model',  # Por ahora None, luego agregarás la ruta
+    'uav': {'path': 'Visdrone_yolo11n_rknn_model', 'backend': 'ultralytics'},  # Modelo por defecto (UAV)
+    'fuego': {'path': 'incendio_yolo11s_rknn_model', 'backend': 'ultralytics'},
     'personas-agua': None  # Por ahora None, luego agregarás la ruta
 }
 
 
 def inicializar_sistema():
     """Inicializa el sistema: hotspot, MediaMTX y modelo (sin RTMP)."""
-    global detector, mediamtx_proc
+    global detector, mediamtx_proc, modelo_activo
     
     try:
         print("[INFO] Inicializando sistema...")
@@ -90,14 +115,18 @@ def inicializar_sistema():
         # Cargar modelo (solo si existe, en Windows puede no estar)
         print("[INFO] Cargando modelo YOLO...")
         try:
-            model_path = MODELOS_DISPONIBLES.get('uav')  # Modelo por defecto
-            if model_path:
-                detector = DetectorYOLO(model_path=model_path)
+            modelo = MODELOS_DISPONIBLES.get('uav')  # Modelo por defecto
+            if modelo:
+                detector, _ = cache_modelos.obtener('uav', modelo)
+                detector.calentar()
+                modelo_activo = 'uav'
+                cache_modelos.activar('uav')
                 print("[OK] Modelo cargado")
                 # Mostrar clases disponibles
                 class_names = detector.get_class_names()
                 if class_names:
                     print(f"[INFO] Clases disponibles: {list(class_names.values())}")
+                iniciar_pool(modelo)
             else:
                 print("[WARN] Modelo por defecto no configurado")
                 detector = None
@@ -110,6 +139,11 @@ def inicializar_sistema():
             print("[INFO] El servidor funcionará en modo demo (sin inferencia)")
             detector = None  # Continuar sin modelo
         
+        # Precargar el resto de modelos en segundo plano para cambios instantáneos
+        if config.MODEL_PRELOAD:
+            print("[INFO] Precargando modelos disponibles en segundo plano...")
+            cache_modelos.precargar(MODELOS_DISPONIBLES)
+        
         print("[OK] Sistema inicializado (servicios básicos listos)")
         print("[INFO] La conexión RTMP se intentará en segundo plano...")
         
@@ -120,6 +154,121 @@ def inicializar_sistema():
         raise
 
 
+def iniciar_pool(modelo):
+    """Inicia el pool de detectores para el modelo dado si está habilitado.
+    
+    Args:
+        modelo: Entrada de MODELOS_DISPONIBLES ({'path': ..., 'backend': ...})
+    """
+    global pool
+    
+    pool = crear_pool(modelo)
+
+
+def crear_pool(modelo):
+    """Crea un pool de detectores para el modelo dado sin tocar el pool activo.
+    
+    Returns:
+        DetectorPool o None si el pool está deshabilitado o no pudo iniciarse
+    """
+    if config.POOL_WORKERS <= 0:
+        return None
+    try:
+        return DetectorPool(modelo['path'], backend=modelo.get('backend'), n_workers=config.POOL_WORKERS)
+    except Exception as exc:
+        print(f"[WARN] No se pudo iniciar el pool de detectores: {exc}")
+        print("[INFO] Se usará un solo detector en el proceso principal")
+        return None
+
+
+def emitir_estado_modelo(nombre, etapa, progreso, **extra):
+    """Informa a los clientes del progreso de un cambio de modelo (evento 'model_status').
+    
+    Args:
+        nombre: Modelo que se está preparando
+        etapa: 'cargando', 'calentando', 'iniciando_pool', 'cambiando', 'listo' o 'error'
+        progreso: Porcentaje aproximado (0-100)
+        **extra: Campos adicionales (clases, mensaje de error, etc.)
+    """
+    socketio.emit('model_status', {'model': nombre, 'stage': etapa, 'progress': progreso, **extra})
+
+
+def preparar_modelo(nombre, modelo):
+    """Carga y calienta un modelo en segundo plano mientras el actual sigue sirviendo.
+    
+    No toca el detector activo: deja el nuevo en cambio_pendiente y
+    process_and_stream lo activa entre dos frames (doble buffer).
+    
+    Args:
+        nombre: Clave del modelo en MODELOS_DISPONIBLES
+        modelo: Diccionario {'path': ..., 'backend': ...}
+    """
+    global cambio_pendiente
+    
+    print(f"[INFO] Preparando modelo '{nombre}' ({modelo['path']}, backend: {modelo.get('backend')})")
+    try:
+        emitir_estado_modelo(nombre, 'cargando', 10)
+        nuevo_detector, desde_cache = cache_modelos.obtener(nombre, modelo)
+        if not desde_cache:
+            emitir_estado_modelo(nombre, 'calentando', 50)
+            tiempo = nuevo_detector.calentar()
+            print(f"[INFO] Modelo '{nombre}' calentado en {tiempo:.2f}s")
+        nuevo_pool = None
+        if config.POOL_WORKERS > 0:
+            emitir_estado_modelo(nombre, 'iniciando_pool', 70)
+            nuevo_pool = crear_pool(modelo)
+    except Exception as exc:
+        print(f"[ERROR] Error al cargar modelo '{nombre}': {exc}")
+        import traceback
+        traceback.print_exc()
+        emitir_estado_modelo(nombre, 'error', 0, error=f"Error al cargar modelo: {exc}")
+        return
+    
+    with cambio_lock:
+        cambio_pendiente = (nombre, nuevo_detector, nuevo_pool, desde_cache)
+    emitir_estado_modelo(nombre, 'cambiando', 90)
+
+
+def aplicar_cambio_pendiente():
+    """Activa el modelo preparado en segundo plano, si lo hay.
+    
+    Se llama desde process_and_stream entre dos frames, así ningún frame se
+    procesa a medias con dos detectores distintos.
+    """
+    global detector, pool, modelo_activo, cambio_pendiente
+    
+    with cambio_lock:
+        pendiente, cambio_pendiente = cambio_pendiente, None
+    if pendiente is None:
+        return
+    
+    nombre, nuevo_detector, nuevo_pool, desde_cache = pendiente
+    if detector is not None and nuevo_detector is not detector:
+        # Conservar la configuración de teselado elegida por el usuario
+        nuevo_detector.teselado.update(detector.teselado)
+    detector = nuevo_detector
+    
+    anterior_pool = pool
+    pool = nuevo_pool
+    if pool is not None:
+        pool.configurar_teselado(detector.teselado)
+    trazas_pool.clear()  # Las secuencias del pool nuevo empiezan de cero
+    if anterior_pool is not None:
+        # Los frames en vuelo del pool anterior se descartan; cerrarlo sin frenar el bucle
+        threading.Thread(target=anterior_pool.cerrar, daemon=True).start()
+    
+    modelo_activo = nombre
+    cache_modelos.activar(nombre)
+    print(f"[OK] Modelo '{nombre}' {'activado desde caché' if desde_cache else 'cargado y activado'}")
+    
+    class_names = {}
+    try:
+        class_names = detector.get_class_names()
+    except Exception:
+        pass
+    emitir_estado_modelo(nombre, 'listo', 100, classes=class_names, from_cache=desde_cache)
+
+
 def conectar_rtmp_en_background():
     """Monitorea y mantiene la conexión RTMP activa, reconectando automáticamente si se pierde.
     
@@ -132,6 +281,11 @@ def conectar_rtmp_en_background():
     """
     global cap, lector_thread
     
+    if gestor_streams is not None:
+        # Modo multi-dron: cada stream tiene su propio monitor de reconexión
+        gestor_streams.iniciar()
+        return
+    
     print("[INFO] Iniciando monitor de conexión RTMP en segundo plano...")
     print("[INFO] El sistema intentará reconectar indefinidamente hasta que se establezca una conexión.")
     intento = 0
@@ -166,7 +320,7 @@ def conectar_rtmp_en_background():
                     print(f"[INFO] Intentando conectar RTMP (intento {intento})...")
                 
                 # Intentar conectar
-                temp_cap = cv2.VideoCapture(config.RTMP_URL)
+                temp_cap = crear_captura()  # Motor según config.INGEST_ENGINE
                 if temp_cap.isOpened():
                     # Verificar que realmente esté recibiendo frames
                     temp_cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
@@ -180,12 +334,11 @@ def conectar_rtmp_en_background():
                         # Iniciar hilo lector
                         lector_thread = threading.Thread(
                             target=lector_frames,
-                            args=(cap, frame_queue, stop_event),
+                            args=(cap, buzon_frames, stop_event),
                             daemon=True
                         )
                         lector_thread.start()
                         print("[OK] Lector de frames iniciado")
-                        print(f"[DEBUG] Frame queue size: {frame_queue.qsize()}")
                         
                         ultima_conexion_exitosa = True
                         intento = 0  # Resetear contador de intentos
@@ -239,12 +392,514 @@ def conectar_rtmp_en_background():
     print("[INFO] Monitor de conexión RTMP detenido")
 
 
+def recolectar_lote(primero, atrasado):
+    """Agrupa un micro-lote de frames si el pipeline va atrasado.
+    
+    Si al volver al buzón ya había un frame esperando, la inferencia no da
+    abasto; en ese caso se recogen hasta config.INFER_BATCH_MAX frames,
+    esperando como máximo config.INFER_BATCH_WAIT segundos por cada uno.
+    Si el pipeline va al día se devuelve solo el frame recibido, sin añadir latencia.
+    
+    Args:
+        primero: Tupla (seq, frame, t_captura) ya extraída de buzon_frames
+        atrasado: True si ya había un frame nuevo esperando antes de extraer el primero
+        
+    Returns:
+        list: Tuplas (seq, frame, t_captura) a procesar (al menos una)
+    """
+    lote = [primero]
+    if config.INFER_BATCH_MAX <= 1 or not atrasado:
+        return lote
+    
+    limite = time.time() + config.INFER_BATCH_WAIT * (config.INFER_BATCH_MAX - 1)
+    while len(lote) < config.INFER_BATCH_MAX:
+        restante = limite - time.time()
+        if restante <= 0:
+            break
+        resultado = buzon_frames.obtener(timeout=restante)
+        if resultado is None:
+            break
+        lote.append(resultado)
+    return lote
+
+
+def iniciar_traza(seq, t_captura):
+    """Crea la traza de latencia de un frame recién sacado de su buzón.
+    
+    Args:
+        seq: Número de secuencia del frame en el buzón
+        t_captura: Instante de captura (time.monotonic())
+        
+    Returns:
+        dict: {'seq', 't_captura', 'etapas'} con la espera en el buzón ya medida
+    """
+    return {'seq': seq, 't_captura': t_captura, 'etapas': {'cola': time.monotonic() - t_captura}}
+
+
+def registrar_fps(elapsed):
+    """Registra el tiempo de inferencia de un frame en el historial de FPS.
+    
+    Args:
+        elapsed: Tiempo de inferencia del frame en segundos
+        
+    Returns:
+        tuple: (fps_actual, fps_promedio)
+    """
+    fps_actual = 1.0 / elapsed if elapsed > 0 else 0.0
+    fps_hist.append(fps_actual)
+    if len(fps_hist) > 30:
+        fps_hist.pop(0)
+    fps_prom = sum(fps_hist) / len(fps_hist) if fps_hist else 0.0
+    return fps_actual, fps_prom
+
+
+def empaquetar_cajas(cajas):
+    """Convierte detecciones en un array float32 (N, 7) para el overlay del cliente.
+    
+    Args:
+        cajas: Tupla (xyxy, confianzas, class_ids) o (xyxy, confianzas, class_ids, track_ids)
+    
+    Returns:
+        np.ndarray: Filas (x1, y1, x2, y2, confianza, clase, track); track = -1 sin tracker
+    """
+    xyxy, confianzas, class_ids = cajas[:3]
+    n = len(confianzas)
+    track_ids = cajas[3] if len(cajas) > 3 else np.full(n, -1)
+    if n == 0:
+        return np.zeros((0, 7), dtype='<f4')
+    return np.column_stack((
+        np.asarray(xyxy, dtype=np.float32).reshape(-1, 4),
+        np.asarray(confianzas, dtype=np.float32),
+        np.asarray(class_ids, dtype=np.float32),
+        np.asarray(track_ids, dtype=np.float32),
+    )).astype('<f4')
+
+
+def empaquetar_frame(meta, jpeg, cajas=None):
+    """Empaqueta un frame para enviarlo como adjunto binario de Socket.IO.
+    
+    Formato: longitud de la cabecera (uint32 big-endian), cabecera JSON UTF-8
+    con los metadatos, las cajas del overlay si las hay (float32 little-endian,
+    7 por caja, alineadas a 4 bytes) y a continuación los bytes del JPEG sin modificar.
+    
+    Args:
+        meta: Diccionario de metadatos (detecciones, FPS, secuencia, traza...)
+        jpeg: Bytes del JPEG codificado (CacheJPEG.jpeg)
+        cajas: Array de empaquetar_cajas() (None = frame ya anotado)
+    
+    Returns:
+        bytes: Mensaje binario listo para socketio.emit
+    """
+    cabecera = json.dumps(meta, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    # Rellenar con espacios para que las cajas empiecen en un múltiplo de 4 (Float32Array)
+    cabecera += b' ' * (-(4 + len(cabecera)) % 4)
+    partes = [struct.pack('>I', len(cabecera)), cabecera]
+    if cajas is not None:
+        partes.append(cajas.tobytes())
+    partes.append(jpeg)
+    return b''.join(partes)
+
+
+def stats_transporte():
+    """Bytes enviados y coste de empaquetado de los frames (para /api/status).
+    
+    'frames' cuenta mensajes empaquetados (uno por nivel en uso); los bytes son los
+    enviados a todos los visores (en base64, solo el campo del JPEG).
+    """
+    frames = transporte_stats['frames']
+    transcurrido = max(time.time() - transporte_stats['inicio'], 1e-9)
+    return {
+        'binario': config.WS_BINARY,
+        'frames': frames,
+        'kbps': round(transporte_stats['bytes'] * 8 / 1000 / transcurrido, 1),
+        'empaquetado_ms': round(1000 * transporte_stats['empaquetado_s'] / frames, 3) if frames else 0.0,
+        'visores': visores.stats(),
+        'cache_jpeg': {str(sala): cache.stats() for sala, cache in caches_jpeg.items()},
+        'mjpeg': {str(sala): n for sala, n in clientes_mjpeg.items()},
+        'publicacion': [publicador.stats() for publicador in publicadores.values()],
+    }
+
+
+def enviar_a_visor(sid, mensaje):
+    """Entrega un frame ya codificado a un cliente (callback de GestorVisores)."""
+    transporte_stats['bytes'] += len(mensaje) if isinstance(mensaje, bytes) else len(mensaje['frame'])
+    socketio.emit('frame', mensaje, to=sid)
+
+
+visores = GestorVisores(enviar_a_visor)  # Clientes conectados, con su ventana y nivel de calidad
+caches_jpeg = {}  # {sala: CacheJPEG} último frame de visualización por stream (None = modo de un stream)
+clientes_mjpeg = {}  # {sala: conexiones abiertas a /stream.mjpg}
+clientes_mjpeg_lock = threading.Lock()
+
+
+def notificar_conversion(trabajo):
+    """Envía el estado de una conversión al cliente que la pidió."""
+    if trabajo.sid:
+        socketio.emit('convert_progress', trabajo.a_dict(), to=trabajo.sid)
+
+
+conversiones = ColaConversiones(os.path.join(BASE_DIR, 'temp_videos'), notificar_conversion)
+
+
+def alimentar_salidas(frame, sala=None, cajas=None):
+    """Entrega un frame a las salidas codificadas con ffmpeg de su stream (no bloquea).
+    
+    Salidas: publicación en MediaMTX (config.PUBLISH_ANNOTATED) y grabación en
+    el servidor (/api/recording). Con overlay en el cliente el frame llega sin
+    anotar: las cajas se dibujan aquí una sola vez para todas las salidas.
+    """
+    grabacion = grabaciones.get(sala)
+    if not config.PUBLISH_ANNOTATED and grabacion is None:
+        return
+    if cajas is not None and detector is not None:
+        frame, _ = detector.anotar(frame, cajas[:3], selected_classes, class_colors)
+    if config.PUBLISH_ANNOTATED:
+        publicador = publicadores.get(sala)
+        if publicador is None:
+            ruta = config.PUBLISH_PATH if sala is None else f"{sala}_annotated"
+            publicador = publicadores[sala] = PublicadorMediaMTX(ruta)
+        publicador.publicar(frame)
+    if grabacion is not None:
+        grabacion[1].write(frame)
+
+
+def emitir_frame(annotated, clases_detectadas, fps_actual, fps_prom, extra=None, sala=None, traza=None, cajas=None):
+    """Codifica un frame a JPEG y lo envía a los clientes vía WebSocket.
+    
+    El frame se codifica una vez por cada nivel de calidad en uso entre los
+    visores de la sala, y cada visor lo recibe según su ventana de control de
+    flujo (src/difusion.py). Con config.WS_BINARY el evento 'frame' lleva un
+    único mensaje binario (empaquetar_frame); si no, un JSON con el JPEG en base64.
+    
+    Args:
+        extra: Diccionario opcional con campos adicionales para el evento 'frame'
+        sala: Sala de Socket.IO destino (ruta del stream en modo multi-dron; None = todos)
+        traza: Traza de latencia del frame (iniciar_traza); se completa con la
+            codificación y la emisión y el navegador la confirma con 'frame_ack'
+        cajas: Detecciones sin dibujar para el overlay del cliente
+            (config.CLIENT_OVERLAY); None si el frame ya va anotado
+    """
+    global frame_count
+    
+    frame_count += 1
+    cache = caches_jpeg.setdefault(sala, CacheJPEG())
+    cache.publicar(annotated)
+    alimentar_salidas(annotated, sala, cajas)
+    visores_sala = visores.visores(sala)
+    if not visores_sala:
+        # Nadie mirando: no se redimensiona ni se codifica (inferencia y grabación siguen)
+        return
+    inicio_codificacion = time.monotonic()
+    
+    payload = {
+        'detecciones': clases_detectadas,
+        'fps': round(fps_actual, 1),
+        'fps_prom': round(fps_prom, 1),
+        'frames': frame_count
+    }
+    if extra:
+        payload.update(extra)
+    if traza is not None:
+        payload['seq'] = traza['seq']
+    # Todos los frames llevan traza: su ack libera la ventana del visor
+    payload['trace'] = trazador.nueva_traza()
+    if cajas is not None:
+        cajas = empaquetar_cajas(cajas)
+        payload['cajas'] = len(cajas)
+        payload['tamano'] = [annotated.shape[1], annotated.shape[0]]  # Coordenadas de las cajas
+    
+    # Una codificación por nivel en uso, compartida por los visores de ese nivel
+    # y por las demás salidas que lean la caché
+    mensajes = {}
+    for nivel in sorted({visor.nivel for visor in visores_sala}):
+        _, jpeg = cache.jpeg(nivel)
+        inicio_empaquetado = time.monotonic()
+        if config.WS_BINARY:
+            mensajes[nivel] = empaquetar_frame(payload, jpeg, cajas)
+        else:
+            mensajes[nivel] = {**payload, 'frame': base64.b64encode(jpeg).decode('utf-8')}
+            if cajas is not None:
+                mensajes[nivel]['cajas'] = cajas.round(2).tolist()
+        transporte_stats['empaquetado_s'] += time.monotonic() - inicio_empaquetado
+        transporte_stats['frames'] += 1
+    if traza is not None:
+        traza['etapas']['codificacion'] = time.monotonic() - inicio_codificacion
+    
+    inicio_emision = time.monotonic()
+    visores.repartir(visores_sala, mensajes, payload['trace'])
+    if traza is not None:
+        traza['etapas']['emision'] = time.monotonic() - inicio_emision
+        trazador.emitido(payload['trace'], traza['t_captura'], traza['etapas'])
+    
+    # Debug: mostrar cada 30 frames que se están enviando
+    if frame_count % 30 == 0:
+        print(f"[DEBUG] Enviando frame #{frame_count} - FPS: {round(fps_actual, 1)}, Edad frame: {buzon_frames.stats()['edad_media_ms']} ms")
+
+
+ultimo_resultado_pool = None  # Instante del último resultado emitido por el pool
+trazas_pool = {}  # {seq del pool: traza} de los frames en vuelo
+
+
+def procesar_con_pool(frame, traza=None):
+    """Envía un frame al pool de detectores y emite los resultados ya ordenados.
+    
+    Se mantiene como máximo un frame en vuelo por worker; al alcanzar ese
+    límite se espera al siguiente resultado en orden. Los FPS reflejan el
+    throughput del pool (intervalo entre resultados) y no la latencia de un worker.
+    """
+    global ultimo_resultado_pool
+    
+    seq_pool = pool.enviar(frame, conf_threshold, selected_classes, class_colors, dibujar=not config.CLIENT_OVERLAY)
+    if traza is not None:
+        trazas_pool[seq_pool] = traza
+    bloquear = pool.en_vuelo() >= pool.n_workers
+    for seq_pool, annotated, elapsed, clases_detectadas, cajas in pool.resultados(bloquear=bloquear):
+        # Olvidar trazas de frames descartados (worker caído) o de un pool anterior
+        for seq_viejo in [s for s in trazas_pool if s < seq_pool]:
+            del trazas_pool[seq_viejo]
+        traza_resultado = trazas_pool.pop(seq_pool, None)
+        if traza_resultado is not None:
+            traza_resultado['etapas']['inferencia'] = elapsed
+        ahora = time.time()
+        # Tras una pausa (p. ej. inferencia detenida) usar el tiempo del worker
+        if ultimo_resultado_pool and ahora - ultimo_resultado_pool < 1.0:
+            intervalo = ahora - ultimo_resultado_pool
+        else:
+            intervalo = elapsed
+        ultimo_resultado_pool = ahora
+        fps_actual, fps_prom = registrar_fps(intervalo)
+        emitir_frame(annotated, clases_detectadas, fps_actual, fps_prom, traza=traza_resultado, cajas=cajas)
+
+
+def procesar_con_tracker(frame, traza=None):
+    """Procesa un frame en modo detección intercalada (detector cada N frames + tracker).
+    
+    Los FPS de inferencia solo se registran cuando termina una detección; el
+    coste del tracker y el N actual se envían aparte.
+    """
+    global intercalada, tracker_info
+    
+    if intercalada is None or intercalada.detector is not detector:
+        intercalada = DeteccionIntercalada(detector)
+    
+    annotated, latencia, clases_detectadas, tracker_info = intercalada.procesar(
+        frame,
+        conf_threshold=conf_threshold,
+        selected_classes=selected_classes,
+        class_colors=class_colors,
+        dibujar=not config.CLIENT_OVERLAY
+    )
+    if latencia is not None:
+        fps_actual, fps_prom = registrar_fps(latencia)
+    else:
+        fps_actual = fps_hist[-1] if fps_hist else 0.0
+        fps_prom = sum(fps_hist) / len(fps_hist) if fps_hist else 0.0
+    emitir_frame(annotated, clases_detectadas, fps_actual, fps_prom, extra={'tracker': tracker_info}, traza=traza,
+                 cajas=intercalada.cajas if config.CLIENT_OVERLAY else None)
+
+
+def procesar_con_compuerta(frame, traza=None):
+    """Procesa un frame saltando la inferencia si la escena no cambió.
+    
+    Las detecciones reutilizadas se vuelven a dibujar sobre el frame nuevo.
+    Solo se registran FPS cuando se ejecuta la inferencia.
+    """
+    global ultimas_detecciones
+    
+    # Un cambio de modelo o de threshold invalida las detecciones guardadas
+    vigentes = (
+        ultimas_detecciones is not None
+        and ultimas_detecciones[0] is detector
+        and ultimas_detecciones[1] == conf_threshold
+    )
+    if not vigentes:
+        compuerta.reiniciar()
+    
+    if compuerta.hay_cambio(frame):
+        conf = conf_threshold if conf_threshold is not None else config.CONF_THRESH
+        inicio = time.time()
+        try:
+            detecciones = detector.inferir(frame, conf)
+        except Exception as exc:
+            print(f"[WARN] Inferencia fallida: {exc}")
+            compuerta.reiniciar()
+            emitir_frame(frame, {}, 0.0, 0.0, traza=traza)
+            return
+        ultimas_detecciones = (detector, conf_threshold, detecciones)
+        elapsed = time.time() - inicio
+        if traza is not None:
+            traza['etapas']['inferencia'] = elapsed
+        fps_actual, fps_prom = registrar_fps(elapsed)
+    else:
+        fps_actual = fps_hist[-1] if fps_hist else 0.0
+        fps_prom = sum(fps_hist) / len(fps_hist) if fps_hist else 0.0
+    
+    if config.CLIENT_OVERLAY:
+        clases_detectadas = detector.resumir(ultimas_detecciones[2], selected_classes)
+        emitir_frame(frame, clases_detectadas, fps_actual, fps_prom, traza=traza, cajas=ultimas_detecciones[2])
+        return
+    annotated, clases_detectadas = detector.anotar(
+        frame, ultimas_detecciones[2], selected_classes, class_colors
+    )
+    emitir_frame(annotated, clases_detectadas, fps_actual, fps_prom, traza=traza)
+
+
+def procesar_streams_con_pool(en_vuelo):
+    """Reparte frames de varios streams entre los workers del pool y emite los resultados.
+    
+    Se piden al planificador tantos frames como workers libres, de modo que
+    el throughput crece con el número de streams hasta saturar el pool.
+    
+    Args:
+        en_vuelo: Diccionario {seq del pool: (stream, traza)} de frames enviados
+    """
+    libres = pool.n_workers - pool.en_vuelo()
+    if libres > 0:
+        for stream, seq, frame, t_captura in gestor_streams.siguientes(maximo=libres, timeout=0.05):
+            traza = iniciar_traza(seq, t_captura)
+            seq_pool = pool.enviar(frame, conf_threshold, selected_classes, class_colors,
+                                   dibujar=not config.CLIENT_OVERLAY)
+            en_vuelo[seq_pool] = (stream, traza)
+    
+    bloquear = pool.en_vuelo() >= pool.n_workers
+    for seq_pool, annotated, elapsed, clases_detectadas, cajas in pool.resultados(bloquear=bloquear):
+        # Los frames saltados por un worker caído no vuelven: olvidarlos
+        for seq_viejo in [s for s in en_vuelo if s < seq_pool]:
+            del en_vuelo[seq_viejo]
+        stream, traza = en_vuelo.pop(seq_pool, (None, None))
+        if stream is None:
+            continue
+        traza['etapas']['inferencia'] = elapsed
+        fps_actual, fps_prom = stream.registrar_resultado(traza['t_captura'], elapsed)
+        emitir_frame(annotated, clases_detectadas, fps_actual, fps_prom,
+                     extra={'stream': stream.ruta}, sala=stream.ruta, traza=traza, cajas=cajas)
+
+
+def inferir_frames(frames):
+    """Detecta sobre un frame o un micro-lote con la configuración actual.
+    
+    Con config.CLIENT_OVERLAY no se dibuja: se devuelve el frame original
+    junto con sus cajas para que el navegador las pinte.
+    
+    Args:
+        frames: Lista de frames de OpenCV
+    
+    Returns:
+        list: Tuplas (frame, tiempo_inferencia, clases_detectadas, cajas) por
+            frame; cajas es None si el frame ya va anotado
+    """
+    if not config.CLIENT_OVERLAY:
+        if len(frames) == 1:
+            resultados = [detector.detectar(
+                frames[0],
+                conf_threshold=conf_threshold,
+                selected_classes=selected_classes,
+                class_colors=class_colors
+            )]
+        else:
+            resultados = detector.detectar_lote(
+                frames,
+                conf_threshold=conf_threshold,
+                selected_classes=selected_classes,
+                class_colors=class_colors
+            )
+        return [(*resultado, None) for resultado in resultados]
+    
+    conf = conf_threshold if conf_threshold is not None else config.CONF_THRESH
+    inicio = time.time()
+    try:
+        detecciones = detector.inferir_lote(frames, conf)
+    except Exception as exc:
+        print(f"[WARN] Inferencia fallida: {exc}")
+        detecciones = [None] * len(frames)
+    elapsed = (time.time() - inicio) / len(frames)
+    return [
+        (frame, elapsed, detector.resumir(cajas, selected_classes) if cajas is not None else {}, cajas)
+        for frame, cajas in zip(frames, detecciones)
+    ]
+
+
+def procesar_multistream():
+    """Hilo que reparte la inferencia entre los streams de varios drones.
+    
+    El planificador (round-robin ponderado o por plazo) elige qué streams
+    se infieren; sin pool, los frames elegidos de distintos streams se
+    procesan como un micro-lote. Cada stream se emite en su propia sala.
+    Los modos tracker y compuerta de movimiento guardan estado de un solo
+    stream y no se aplican aquí.
+    """
+    en_vuelo = {}
+    pool_actual = None
+    ultimo_aviso = 0.0
+    
+    while not stop_event.is_set():
+        try:
+            aplicar_cambio_pendiente()
+            
+            # Avisar (como mucho una vez por segundo) a las salas de streams caídos
+            if time.time() - ultimo_aviso >= 1.0:
+                ultimo_aviso = time.time()
+                for stream in gestor_streams.streams.values():
+                    if not stream.conectado:
+                        socketio.emit('frame', {
+                            'frame': None,
+                            'detecciones': {},
+                            'fps': 0,
+                            'fps_prom': 0,
+                            'frames': stream.procesados,
+                            'stream': stream.ruta,
+                            'error': f"Stream '{stream.ruta}' no disponible"
+                        }, to=stream.ruta)
+            
+            if inferir and pool is not None:
+                if pool is not pool_actual:
+                    # Pool nuevo (cambio de modelo): los frames en vuelo del anterior se perdieron
+                    en_vuelo.clear()
+                    pool_actual = pool
+                procesar_streams_con_pool(en_vuelo)
+                continue
+            
+            activo = inferir and detector is not None
+            maximo = config.INFER_BATCH_MAX if activo else len(gestor_streams.streams)
+            entradas = gestor_streams.siguientes(maximo=max(1, maximo), timeout=0.1)
+            if not entradas:
+                continue
+            
+            trazas = [iniciar_traza(seq, t_captura) for _, seq, _, t_captura in entradas]
+            frames = [frame for _, _, frame, _ in entradas]
+            if not activo:
+                resultados = [(frame, 0.0, {}, None) for frame in frames]
+            else:
+                resultados = inferir_frames(frames)
+            
+            for (stream, _, _, t_captura), traza, (annotated, elapsed, clases_detectadas, cajas) in zip(entradas, trazas, resultados):
+                fps_actual, fps_prom = stream.registrar_resultado(t_captura, elapsed)
+                if activo:
+                    registrar_fps(elapsed)
+                    traza['etapas']['inferencia'] = elapsed
+                emitir_frame(annotated, clases_detectadas, fps_actual, fps_prom,
+                             extra={'stream': stream.ruta}, sala=stream.ruta, traza=traza, cajas=cajas)
+        
+        except Exception as exc:
+            print(f"[WARN] Error en procesamiento multi-stream: {exc}")
+            import traceback
+            traceback.print_exc()
+            time.sleep(0.1)
+
+
 def process_and_stream():
     """Hilo que procesa frames y los envía a los clientes vía WebSocket."""
     global inferir, detector, frame_count, fps_hist, cap
     
+    if gestor_streams is not None:
+        procesar_multistream()
+        return
+    
     while not stop_event.is_set():
         try:
+            # Cambiar de modelo solo entre dos frames
+            aplicar_cambio_pendiente()
+            
             # Si no hay stream, esperar un poco y continuar
             if cap is None:
                 time.sleep(1.0)
@@ -259,54 +914,31 @@ def process_and_stream():
                 })
                 continue
             
-            try:
-                frame = frame_queue.get(timeout=0.1)
-            except queue.Empty:
-                # No hay frames disponibles, continuar
+            # Si ya hay un frame esperando, el pipeline va atrasado respecto al lector
+            atrasado = buzon_frames.hay_nuevo()
+            resultado = buzon_frames.obtener(timeout=0.1)
+            if resultado is None:
+                # No hay frames nuevos, continuar
                 continue
+            seq, frame, t_captura = resultado
             
-            if inferir and detector is not None:
-                annotated, elapsed, clases_detectadas = detector.detectar(
-                    frame,
-                    conf_threshold=conf_threshold,
-                    selected_classes=selected_classes,
-                    class_colors=class_colors
-                )
-                fps_actual = 1.0 / elapsed if elapsed > 0 else 0.0
-                fps_hist.append(fps_actual)
-                if len(fps_hist) > 30:
-                    fps_hist.pop(0)
-                fps_prom = sum(fps_hist) / len(fps_hist) if fps_hist else 0.0
+            if inferir and pool is not None:
+                procesar_con_pool(frame, iniciar_traza(seq, t_captura))
+            elif inferir and detector is not None and config.TRACKER_MODE:
+                procesar_con_tracker(frame, iniciar_traza(seq, t_captura))
+            elif inferir and detector is not None and compuerta.activa:
+                procesar_con_compuerta(frame, iniciar_traza(seq, t_captura))
+            elif inferir and detector is not None:
+                lote = recolectar_lote(resultado, atrasado)
+                # La espera para completar el lote cuenta como tiempo en cola
+                trazas = [iniciar_traza(seq_lote, t_lote) for seq_lote, _, t_lote in lote]
+                resultados = inferir_frames([frame_lote for _, frame_lote, _ in lote])
+                for traza, (annotated, elapsed, clases_detectadas, cajas) in zip(trazas, resultados):
+                    traza['etapas']['inferencia'] = elapsed
+                    fps_actual, fps_prom = registrar_fps(elapsed)
+                    emitir_frame(annotated, clases_detectadas, fps_actual, fps_prom, traza=traza, cajas=cajas)
             else:
-                annotated = frame
-                clases_detectadas = {}
-                fps_actual = 0.0
-                fps_prom = 0.0
-            
-            frame_count += 1
-            
-            # Redimensionar para reducir tamaño de transmisión
-            display_size = (640, 480)
-            if annotated.shape[:2] != display_size:
-                annotated = cv2.resize(annotated, display_size)
-            
-            # Codificar frame a JPEG
-            encode_params = [cv2.IMWRITE_JPEG_QUALITY, 75]  # 75% calidad
-            _, buffer = cv2.imencode('.jpg', annotated, encode_params)
-            frame_base64 = base64.b64encode(buffer).decode('utf-8')
-            
-            # Enviar a todos los clientes conectados
-            socketio.emit('frame', {
-                'frame': frame_base64,
-                'detecciones': clases_detectadas,
-                'fps': round(fps_actual, 1),
-                'fps_prom': round(fps_prom, 1),
-                'frames': frame_count
-            })
-            
-            # Debug: mostrar cada 30 frames que se están enviando
-            if frame_count % 30 == 0:
-                print(f"[DEBUG] Enviando frame #{frame_count} - FPS: {round(fps_actual, 1)}, Queue size: {frame_queue.qsize()}")
+                emitir_frame(frame, {}, 0.0, 0.0, traza=iniciar_traza(seq, t_captura))
             
         except Exception as exc:
             print(f"[WARN] Error en procesamiento de frame: {exc}")
@@ -370,7 +1002,9 @@ def get_status():
     return jsonify({
         "inference": inferir,
         "model_loaded": detector is not None,
-        "stream_connected": cap is not None and cap.isOpened() if cap else False,
+        "model": modelo_activo,
+        "model_loading": hilo_cambio_modelo is not None and hilo_cambio_modelo.is_alive(),
+        "stream_connected": gestor_streams.alguno_conectado if gestor_streams is not None else (cap is not None and cap.isOpened() if cap else False),
         "hotspot_active": hotspot_activo,
         "hotspot_ip": ip_hotspot,
         "hotspot_name": config.HOTSPOT_NAME if hotspot_activo else None,
@@ -379,7 +1013,218 @@ def get_status():
         "rtmp_url_local": f"rtmp://{ip_local}:1935/live/dron" if ip_local and ip_local != ip_hotspot else None,
         "fps_actual": round(fps_hist[-1], 1) if fps_hist else 0,
         "fps_promedio": round(sum(fps_hist) / len(fps_hist), 1) if fps_hist else 0,
-        "frames": frame_count
+        "frames": frame_count,
+        "ingesta": buzon_frames.stats(),
+        "latencia": trazador.percentiles(),
+        "transporte": stats_transporte(),
+        "streams": gestor_streams.metricas() if gestor_streams is not None else None,
+        "pool": pool.utilizacion() if pool is not None else None,
+        "tracker": tracker_info if config.TRACKER_MODE else None,
+        "movimiento": compuerta.stats(),
+        "conversiones": conversiones.stats(),
+        "grabacion": {
+            "servidor": config.RECORD_SERVER,
+            "activas": {str(sala): {"id": id_grabacion, **grabador.stats()}
+                        for sala, (id_grabacion, grabador) in list(grabaciones.items())},
+        },
+        "teselado": {
+            **detector.teselado,
+            "stats": detector.stats_teselado
+        } if detector is not None else None
+    })
+
+
+@app.route('/api/latency', methods=['GET'])
+def get_latency():
+    """Obtiene los percentiles de latencia por etapa y extremo a extremo (ms)."""
+    return jsonify({
+        "success": True,
+        "acks": trazador.acks,
+        "etapas": trazador.percentiles()
+    })
+
+
+def cache_de_peticion():
+    """Caché JPEG del stream pedido con ?stream=... (modo multi-dron; por defecto el primero).
+    
+    Returns:
+        tuple: (sala, CacheJPEG, nivel) o None si el stream no existe
+    """
+    sala = None
+    if gestor_streams is not None:
+        sala = request.args.get('stream', next(iter(gestor_streams.streams), '')).strip('/')
+        if sala not in gestor_streams.streams:
+            return None
+    nivel = min(max(request.args.get('nivel', 0, type=int), 0), len(config.VIEWER_TIERS) - 1)
+    return sala, caches_jpeg.setdefault(sala, CacheJPEG()), nivel
+
+
+@app.route('/snapshot.jpg', methods=['GET'])
+def snapshot():
+    """Último frame de visualización en JPEG (?stream=ruta&nivel=N).
+    
+    Se sirve desde la misma caché que el WebSocket: si el frame ya se
+    codificó en ese nivel no se vuelve a codificar.
+    """
+    peticion = cache_de_peticion()
+    if peticion is None:
+        return jsonify({"success": False, "error": "Stream no válido"}), 404
+    _, cache, nivel = peticion
+    resultado = cache.jpeg(nivel)
+    if resultado is None:
+        return jsonify({"success": False, "error": "Aún no hay frames"}), 503
+    seq, jpeg = resultado
+    return Response(jpeg, mimetype='image/jpeg', headers={
+        'Cache-Control': 'no-store',
+        'X-Frame-Seq': str(seq),
+    })
+
+
+@app.route('/stream.mjpg', methods=['GET'])
+def stream_mjpeg():
+    """Video MJPEG sobre HTTP (multipart/x-mixed-replace) para VLC, grabadores o paneles.
+    
+    Cada conexión espera el siguiente frame de la caché y lo envía tal cual;
+    un cliente lento salta directamente al frame más reciente. Con
+    config.CLIENT_OVERLAY los frames van sin anotar.
+    """
+    peticion = cache_de_peticion()
+    if peticion is None:
+        return jsonify({"success": False, "error": "Stream no válido"}), 404
+    sala, cache, nivel = peticion
+    
+    def generar():
+        with clientes_mjpeg_lock:
+            clientes_mjpeg[sala] = clientes_mjpeg.get(sala, 0) + 1
+        try:
+            seq_visto = 0
+            while not stop_event.is_set():
+                if not cache.esperar(seq_visto, timeout=1.0):
+                    continue
+                seq_visto, jpeg = cache.jpeg(nivel)
+                # Cabecera, JPEG y cierre por separado: los bytes de la caché no se copian
+                yield (
+                    b'--frame\r\nContent-Type: image/jpeg\r\n'
+                    b'Content-Length: %d\r\nX-Frame-Seq: %d\r\n\r\n' % (len(jpeg), seq_visto)
+                )
+                yield jpeg
+                yield b'\r\n'
+        finally:
+            with clientes_mjpeg_lock:
+                clientes_mjpeg[sala] -= 1
+    
+    return Response(generar(), mimetype='multipart/x-mixed-replace; boundary=frame',
+                    headers={'Cache-Control': 'no-store'})
+
+
+def sala_de_peticion(data):
+    """Sala del stream indicado en una petición JSON (None en modo de un solo stream).
+    
+    Returns:
+        tuple: (valida, sala)
+    """
+    sala = data.get('stream')
+    if gestor_streams is None:
+        return True, None
+    if sala is None:
+        sala = next(iter(config.STREAMS))
+    return sala in config.STREAMS, sala
+
+
+def descripcion_grabacion(id_grabacion):
+    """Segmentos terminados de una grabación con su URL de descarga."""
+    segmentos = []
+    for segmento in leer_segmentos(config.RECORD_DIR / id_grabacion):
+        ruta = config.RECORD_DIR / id_grabacion / segmento['archivo']
+        segmentos.append({
+            'archivo': segmento['archivo'],
+            'duracion': round(segmento['fin'] - segmento['inicio'], 1),
+            'bytes': ruta.stat().st_size if ruta.exists() else 0,
+            'url': f"/api/recordings/{id_grabacion}/{segmento['archivo']}",
+        })
+    return {'id': id_grabacion, 'segmentos': segmentos}
+
+
+@app.route('/api/recording/start', methods=['POST'])
+def start_recording():
+    """Inicia la grabación del video anotado en el servidor (segmentos MP4).
+    
+    Body JSON opcional: {"stream": ruta} en modo multi-dron.
+    """
+    valida, sala = sala_de_peticion(request.get_json(silent=True) or {})
+    if not valida:
+        return jsonify({"success": False, "error": "Stream no válido"}), 404
+    with grabaciones_lock:
+        if sala in grabaciones:
+            id_grabacion, _ = grabaciones[sala]
+            return jsonify({"success": True, "id": id_grabacion, "message": "La grabación ya estaba en curso"})
+        from datetime import datetime
+        id_grabacion = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+        if sala is not None:
+            id_grabacion += '_' + sala.replace('/', '-')
+        grabador = crear_writer(config.RECORD_DIR / id_grabacion, config.FRAME_SIZE, config.OUTPUT_FPS,
+                                segmento_s=config.RECORD_SEGMENT)
+        if grabador is None:
+            return jsonify({"success": False, "error": "No se pudo iniciar ffmpeg"}), 500
+        grabaciones[sala] = (id_grabacion, grabador)
+    print(f"[INFO] Grabación iniciada: {id_grabacion}")
+    return jsonify({"success": True, "id": id_grabacion, "segmento_s": config.RECORD_SEGMENT})
+
+
+@app.route('/api/recording/stop', methods=['POST'])
+def stop_recording():
+    """Detiene la grabación en curso y devuelve sus segmentos para descargar."""
+    valida, sala = sala_de_peticion(request.get_json(silent=True) or {})
+    if not valida:
+        return jsonify({"success": False, "error": "Stream no válido"}), 404
+    with grabaciones_lock:
+        grabacion = grabaciones.pop(sala, None)
+    if grabacion is None:
+        return jsonify({"success": False, "error": "No hay grabación en curso"}), 400
+    id_grabacion, grabador = grabacion
+    grabador.release()  # Cierra el último segmento
+    stats = grabador.stats()
+    print(f"[OK] Grabación terminada: {id_grabacion} ({stats['escritos']} frames, {stats['descartados']} descartados)")
+    return jsonify({"success": True, **descripcion_grabacion(id_grabacion),
+                    "frames": stats['escritos'], "descartados": stats['descartados']})
+
+
+@app.route('/api/recordings', methods=['GET'])
+def list_recordings():
+    """Grabaciones guardadas en el servidor (la más reciente primero).
+    
+    Los segmentos aparecen en cuanto se cierran, aunque la grabación siga en curso.
+    """
+    activas = {id_grabacion for id_grabacion, _ in list(grabaciones.values())}
+    nombres = sorted(os.listdir(config.RECORD_DIR), reverse=True) if config.RECORD_DIR.is_dir() else []
+    return jsonify({"recordings": [
+        {**descripcion_grabacion(nombre), 'activa': nombre in activas}
+        for nombre in nombres if (config.RECORD_DIR / nombre).is_dir()
+    ]})
+
+
+@app.route('/api/recordings/<id_grabacion>/<archivo>', methods=['GET'])
+def download_recording(id_grabacion, archivo):
+    """Descarga un segmento de una grabación."""
+    if not config.RECORD_DIR.is_dir() or id_grabacion not in os.listdir(config.RECORD_DIR):
+        return jsonify({"success": False, "error": "Grabación no encontrada"}), 404
+    return send_from_directory(config.RECORD_DIR / id_grabacion, archivo, as_attachment=True,
+                               download_name=f"deteccion-uav-{id_grabacion}-{archivo}", max_age=0)
+
+
+@app.route('/api/streams', methods=['GET'])
+def get_streams():
+    """Obtiene los streams configurados (modo multi-dron) y sus métricas."""
+    if gestor_streams is None:
+        return jsonify({
+            "multi": False,
+            "policy": None,
+            "streams": [{"stream": "live/dron", "url": config.RTMP_URL, "ingesta": buzon_frames.stats()}]
+        })
+    return jsonify({
+        "multi": True,
+        "policy": gestor_streams.politica,
+        "streams": gestor_streams.metricas()
     })
 
 
@@ -406,8 +1251,13 @@ def toggle_hotspot():
 
 @app.route('/api/model/change', methods=['POST'])
 def change_model():
-    """Cambia el modelo de inferencia."""
-    global detector, inferir
+    """Cambia el modelo de inferencia sin pausar el pipeline.
+    
+    El nuevo modelo se carga y calienta en segundo plano mientras el actual
+    sigue sirviendo; el progreso se informa con el evento 'model_status' y el
+    cambio se aplica entre dos frames.
+    """
+    global hilo_cambio_modelo
     
     try:
         # Obtener el modelo solicitado del request
@@ -424,55 +1274,47 @@ def change_model():
                 "modelos_disponibles": list(MODELOS_DISPONIBLES.keys())
             }), 400
         
-        # Obtener la ruta del modelo
-        model_path = MODELOS_DISPONIBLES[model_name]
+        # Obtener la ruta y el backend del modelo
+        modelo = MODELOS_DISPONIBLES[model_name]
         
         # Verificar si el modelo está disponible (no es None)
-        if model_path is None:
+        if modelo is None:
             return jsonify({
                 "error": f"Modelo '{model_name}' aún no está disponible",
                 "message": "La ruta del modelo no ha sido configurada"
             }), 400
         
-        # Si la inferencia está activa, detenerla primero
-        if inferir:
-            print("[INFO] Deteniendo inferencia antes de cambiar modelo...")
-            inferir = False
-            time.sleep(0.5)  # Dar tiempo para que termine el frame actual
+        if hilo_cambio_modelo is not None and hilo_cambio_modelo.is_alive():
+            return jsonify({
+                "error": "Ya hay un cambio de modelo en curso",
+                "model": model_name
+            }), 409
         
-        # Cargar el nuevo modelo
-        print(f"[INFO] Cargando modelo '{model_name}' desde: {model_path}")
-        try:
-            detector = DetectorYOLO(model_path=model_path)
-            print(f"[OK] Modelo '{model_name}' cargado exitosamente")
-        except FileNotFoundError as exc:
+        if model_name == modelo_activo and cambio_pendiente is None and detector is not None:
             return jsonify({
-                "error": f"Modelo no encontrado: {exc}",
+                "success": True,
+                "status": "ready",
+                "message": f"El modelo '{model_name}' ya está activo",
                 "model": model_name,
-                "path": model_path
-            }), 404
-        except Exception as exc:
-            print(f"[ERROR] Error al cargar modelo: {exc}")
-            import traceback
-            traceback.print_exc()
-            return jsonify({
-                "error": f"Error al cargar modelo: {str(exc)}",
-                "model": model_name
-            }), 500
+                "classes": detector.get_class_names(),
+                "from_cache": True
+            })
         
-        # Obtener clases disponibles del nuevo modelo
-        class_names = {}
-        try:
-            class_names = detector.get_class_names()
-        except Exception:
-            pass
+        # Cargar en segundo plano; el detector actual sigue sirviendo mientras tanto
+        hilo_cambio_modelo = threading.Thread(
+            target=preparar_modelo,
+            args=(model_name, modelo),
+            daemon=True
+        )
+        hilo_cambio_modelo.start()
         
         return jsonify({
             "success": True,
-            "message": f"Modelo cambiado a '{model_name}'",
+            "status": "loading",
+            "message": f"Cargando modelo '{model_name}'",
             "model": model_name,
-            "classes": class_names
-        })
+            "from_cache": cache_modelos.contiene(model_name)
+        }), 202
     except Exception as exc:
         print(f"[ERROR] Error en change_model: {exc}")
         import traceback
@@ -480,6 +1322,18 @@ def change_model():
         return jsonify({"error": str(exc)}), 500
 
 
+@app.route('/api/model/cache', methods=['GET'])
+def get_model_cache():
+    """Obtiene el estado de la caché de modelos cargados."""
+    return jsonify({
+        "success": True,
+        "max_models": cache_modelos.max_modelos,
+        "max_mb": cache_modelos.max_mb,
+        "limit_exceeded": cache_modelos.limite_excedido,
+        "entries": cache_modelos.estado()
+    })
+
+
 @app.route('/api/model/classes', methods=['GET'])
 def get_model_classes():
     """Obtiene las clases disponibles del modelo actual."""
@@ -544,11 +1398,38 @@ def config_inference():
                         class_colors[class_name] = (b, g, r)  # Convertir a BGR
             print(f"[INFO] Colores de clases actualizados: {len(class_colors)} clases")
         
+        # Actualizar modo teselado (tiles para objetos pequeños)
+        claves_teselado = ('tiled', 'tile_size', 'tile_overlap', 'tile_grid', 'tile_include_full')
+        if detector is not None and any(clave in data for clave in claves_teselado):
+            detector.configurar_teselado(
+                activo=data.get('tiled'),
+                tile_size=data.get('tile_size'),
+                overlap=data.get('tile_overlap'),
+                grid=data.get('tile_grid'),
+                incluir_completo=data.get('tile_include_full')
+            )
+            if pool is not None:
+                # Los workers tienen su propia réplica del detector
+                pool.configurar_teselado(detector.teselado)
+            print(f"[INFO] Modo teselado actualizado: {detector.teselado}")
+        
+        # Actualizar compuerta de movimiento
+        claves_movimiento = ('motion_gate', 'motion_threshold', 'motion_max_skip')
+        if any(clave in data for clave in claves_movimiento):
+            compuerta.configurar(
+                activa=data.get('motion_gate'),
+                umbral=data.get('motion_threshold'),
+                max_saltos=data.get('motion_max_skip')
+            )
+            print(f"[INFO] Compuerta de movimiento actualizada: {compuerta.stats()}")
+        
         return jsonify({
             "success": True,
             "message": "Configuración actualizada",
+            "movimiento": compuerta.stats(),
             "selected_classes": selected_classes,
-            "conf_threshold": conf_threshold
+            "conf_threshold": conf_threshold,
+            "teselado": detector.teselado if detector is not None else None
         })
     except Exception as exc:
         print(f"[ERROR] Error al configurar inferencia: {exc}")
@@ -559,145 +1440,142 @@ def config_inference():
 
 @app.route('/api/video/convert', methods=['POST'])
 def convert_video_to_mp4():
-    """Convierte un video WebM a MP4 y lo envía al cliente, luego elimina los archivos temporales."""
+    """Recibe un video (WebM/MP4 de MediaRecorder) y encola su conversión a MP4.
+    
+    El cuerpo puede ser el video en crudo (Content-Type video/*), que se vuelca
+    a disco por bloques, o un formulario multipart con el campo 'video'.
+    Responde 202 con el id del trabajo: el progreso llega por el evento
+    'convert_progress' al cliente indicado en ?sid= (o se consulta en
+    /api/video/jobs/<id>) y el MP4 se descarga de /api/video/jobs/<id>/download.
+    """
+    conversiones.purgar(config.CONVERT_MAX_AGE)
+    extension = 'mp4' if 'mp4' in (request.content_type or '') else 'webm'
+    entrada = conversiones.nueva_entrada(extension)
     try:
-        # Verificar que se envió un archivo
-        if 'video' not in request.files:
-            return jsonify({'error': 'No se recibió ningún archivo de video'}), 400
-        
-        video_file = request.files['video']
-        
-        if video_file.filename == '':
-            return jsonify({'error': 'Archivo vacío'}), 400
-        
-        # Crear directorio temporal si no existe
-        temp_dir = os.path.join(BASE_DIR, 'temp_videos')
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        # Generar nombres únicos para los archivos temporales
-        import uuid
-        unique_id = str(uuid.uuid4())
-        webm_path = os.path.join(temp_dir, f'temp_{unique_id}.webm')
-        mp4_path = os.path.join(temp_dir, f'temp_{unique_id}.mp4')
-        
-        try:
-            # Guardar el archivo WebM temporalmente
-            video_file.save(webm_path)
-            print(f"[INFO] Video WebM recibido: {webm_path}")
-            
-            # Convertir WebM a MP4 usando ffmpeg
-            print(f"[INFO] Convirtiendo a MP4...")
-            ffmpeg_cmd = [
-                'ffmpeg',
-                '-i', webm_path,
-                '-c:v', 'libx264',
-                '-preset', 'fast',
-                '-crf', '23',
-                '-c:a', 'aac',
-                '-b:a', '128k',
-                '-movflags', '+faststart',  # Optimizar para streaming
-                '-y',  # Sobrescribir si existe
-                mp4_path
-            ]
-            
-            result = subprocess.run(
-                ffmpeg_cmd,
-                capture_output=True,
-                text=True,
-                timeout=300  # Timeout de 5 minutos
-            )
-            
-            if result.returncode != 0:
-                print(f"[ERROR] Error en conversión ffmpeg: {result.stderr}")
-                # Limpiar archivo WebM
-                if os.path.exists(webm_path):
-                    os.remove(webm_path)
-                return jsonify({'error': 'Error al convertir video: ' + result.stderr[:200]}), 500
-            
-            if not os.path.exists(mp4_path):
-                print(f"[ERROR] El archivo MP4 no se creó")
-                # Limpiar archivo WebM
-                if os.path.exists(webm_path):
-                    os.remove(webm_path)
-                return jsonify({'error': 'No se pudo crear el archivo MP4'}), 500
-            
-            print(f"[OK] Video convertido: {mp4_path}")
-            
-            # Generar nombre de archivo para descarga
-            from datetime import datetime
-            timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-            download_filename = f'deteccion-uav-{timestamp}.mp4'
-            
-            # Enviar el archivo MP4 al cliente
-            def remove_files():
-                """Función para eliminar archivos temporales después de enviar."""
-                try:
-                    if os.path.exists(webm_path):
-                        os.remove(webm_path)
-                        print(f"[INFO] Archivo WebM eliminado: {webm_path}")
-                    if os.path.exists(mp4_path):
-                        os.remove(mp4_path)
-                        print(f"[INFO] Archivo MP4 eliminado: {mp4_path}")
-                except Exception as e:
-                    print(f"[WARN] Error al eliminar archivos temporales: {e}")
-            
-            # Usar send_file para enviar el MP4
-            response = send_file(
-                mp4_path,
-                mimetype='video/mp4',
-                as_attachment=True,
-                download_name=download_filename
-            )
-            
-            # Programar limpieza después de enviar (en un hilo separado con delay)
-            def delayed_cleanup():
-                time.sleep(10)  # Esperar 10 segundos para asegurar que el archivo se descargó
-                try:
-                    if os.path.exists(webm_path):
-                        os.remove(webm_path)
-                        print(f"[INFO] Archivo WebM eliminado: {webm_path}")
-                    if os.path.exists(mp4_path):
-                        os.remove(mp4_path)
-                        print(f"[INFO] Archivo MP4 eliminado: {mp4_path}")
-                except Exception as e:
-                    print(f"[WARN] Error al eliminar archivos temporales: {e}")
-            
-            cleanup_thread = threading.Thread(target=delayed_cleanup, daemon=True)
-            cleanup_thread.start()
-            
-            return response
-            
-        except subprocess.TimeoutExpired:
-            print(f"[ERROR] Timeout al convertir video")
-            # Limpiar archivos
-            if os.path.exists(webm_path):
-                os.remove(webm_path)
-            if os.path.exists(mp4_path):
-                os.remove(mp4_path)
-            return jsonify({'error': 'Timeout al convertir video (muy largo)'}), 500
-            
-        except Exception as e:
-            print(f"[ERROR] Error en conversión: {e}")
-            import traceback
-            traceback.print_exc()
-            # Limpiar archivos en caso de error
-            if os.path.exists(webm_path):
-                try:
-                    os.remove(webm_path)
-                except:
-                    pass
-            if os.path.exists(mp4_path):
-                try:
-                    os.remove(mp4_path)
-                except:
-                    pass
-            return jsonify({'error': f'Error al procesar video: {str(e)}'}), 500
-            
-    except Exception as e:
-        print(f"[ERROR] Error en endpoint de conversión: {e}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({'error': 'Error interno del servidor'}), 500
+        if 'video' in request.files:
+            # Multipart: werkzeug ya volcó el archivo a un temporal en disco
+            request.files['video'].save(entrada)
+        else:
+            with open(entrada, 'wb') as f:
+                while True:
+                    bloque = request.stream.read(1024 * 1024)
+                    if not bloque:
+                        break
+                    f.write(bloque)
+    except OSError as exc:
+        print(f"[ERROR] Error al guardar el video subido: {exc}")
+        if os.path.exists(entrada):
+            os.remove(entrada)
+        return jsonify({'error': f'Error al guardar el video: {exc}'}), 500
+    
+    if os.path.getsize(entrada) == 0:
+        os.remove(entrada)
+        return jsonify({'error': 'Archivo vacío'}), 400
+    print(f"[INFO] Video recibido: {entrada}")
+    
+    trabajo = conversiones.encolar(entrada, sid=request.args.get('sid'))
+    if trabajo is None:
+        return jsonify({'error': 'Demasiadas conversiones en curso, inténtalo más tarde'}), 503
+    return jsonify({
+        **trabajo.a_dict(),
+        'estado_url': f'/api/video/jobs/{trabajo.id}',
+        'descarga_url': f'/api/video/jobs/{trabajo.id}/download',
+    }), 202
+
+
+@app.route('/api/video/upload', methods=['POST'])
+def start_live_upload():
+    """Inicia una conversión en vivo: la grabación se sube por fragmentos mientras dura.
+    
+    Body JSON: {"mime": tipo de MediaRecorder}. Responde 201 con el id del
+    trabajo, o 503 si ya hay demasiadas en curso (el cliente sube al terminar).
+    """
+    data = request.get_json(silent=True) or {}
+    trabajo = conversiones.iniciar_en_vivo(data.get('mime'), sid=request.args.get('sid'))
+    if trabajo is None:
+        return jsonify({'error': 'Demasiadas grabaciones subiéndose a la vez'}), 503
+    return jsonify(trabajo.a_dict()), 201
+
+
+@app.route('/api/video/upload/<id_trabajo>/append', methods=['POST'])
+def append_live_upload(id_trabajo):
+    """Añade el fragmento ?n= (en orden desde 0) de una conversión en vivo."""
+    trabajo = conversiones.obtener(id_trabajo)
+    if trabajo is None:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    try:
+        indice = int(request.args.get('n', ''))
+    except ValueError:
+        return jsonify({'error': 'Falta el número de fragmento'}), 400
+    error = conversiones.anadir(trabajo, indice, request.get_data())
+    if error is not None:
+        return jsonify({**trabajo.a_dict(), 'error': error}), 409
+    return jsonify({'bloques': trabajo.bloques})
+
+
+@app.route('/api/video/upload/<id_trabajo>/finish', methods=['POST'])
+def finish_live_upload(id_trabajo):
+    """Cierra una conversión en vivo; el MP4 queda listo en cuanto ffmpeg termina."""
+    trabajo = conversiones.obtener(id_trabajo)
+    if trabajo is None:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    conversiones.terminar_en_vivo(trabajo)
+    return jsonify(trabajo.a_dict()), 202
+
+
+@app.route('/api/video/upload/<id_trabajo>', methods=['DELETE'])
+def cancel_live_upload(id_trabajo):
+    """Descarta una conversión en vivo (el usuario no quiere guardar el video)."""
+    trabajo = conversiones.obtener(id_trabajo)
+    if trabajo is None:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    conversiones.cancelar_en_vivo(trabajo)
+    return jsonify({'success': True})
+
+
+@app.route('/api/video/jobs/<id_trabajo>', methods=['GET'])
+def get_convert_job(id_trabajo):
+    """Estado y progreso de una conversión."""
+    trabajo = conversiones.obtener(id_trabajo)
+    if trabajo is None:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return jsonify(trabajo.a_dict())
+
+
+@app.route('/api/video/jobs/<id_trabajo>/download', methods=['GET'])
+def download_convert_job(id_trabajo):
+    """Descarga el MP4 de una conversión terminada.
+    
+    La descarga retiene los archivos mientras dura; al cerrarse se suelta
+    también la reserva del cliente y, sin más referencias, se eliminan.
+    """
+    trabajo = conversiones.obtener(id_trabajo)
+    if trabajo is None:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    if trabajo.estado != 'listo':
+        return jsonify(trabajo.a_dict()), 409
+    if not trabajo.adquirir():
+        return jsonify({'error': 'El video ya no está disponible'}), 410
+    
+    from datetime import datetime
+    timestamp = datetime.fromtimestamp(trabajo.creado).strftime('%Y-%m-%d_%H-%M-%S')
+    try:
+        response = send_file(
+            trabajo.salida,
+            mimetype='video/mp4',
+            as_attachment=True,
+            download_name=f'deteccion-uav-{timestamp}.mp4'
+        )
+    except OSError:
+        trabajo.liberar()
+        raise
+    
+    def al_cerrar():
+        trabajo.liberar()
+        trabajo.liberar_reserva()
+    
+    response.call_on_close(al_cerrar)
+    return response
 
 
 @app.route('/api/shutdown', methods=['POST'])
@@ -706,6 +1584,7 @@ def shutdown_system():
     if sys.platform == "win32":
         return jsonify({"error": "Apagado no disponible en Windows"}), 400
     
+    import subprocess
     try:
         print("[INFO] Solicitud de apagado recibida desde cliente web")
         
@@ -713,7 +1592,6 @@ def shutdown_system():
         cleanup()
         
         # Ejecutar comando de apagado (requiere permisos sudo)
-        import subprocess
         result = subprocess.run(
             ['sudo', 'shutdown', '-h', 'now'],
             capture_output=True,
@@ -751,14 +1629,55 @@ def shutdown_system():
 def handle_connect():
     """Maneja la conexión de un cliente WebSocket."""
     print(f"[INFO] Cliente WebSocket conectado: {request.remote_addr}")
-    print(f"[DEBUG] Estado del sistema - cap: {cap is not None}, detector: {detector is not None}, frame_queue size: {frame_queue.qsize()}")
+    print(f"[DEBUG] Estado del sistema - cap: {cap is not None}, detector: {detector is not None}, buzón: {buzon_frames.stats()}")
     emit('connected', {'message': 'Conectado al servidor'})
+    ruta = None
+    if gestor_streams is not None and gestor_streams.streams:
+        # Por defecto cada cliente ve el primer stream; puede cambiar con 'join_stream'
+        ruta = next(iter(gestor_streams.streams))
+        join_room(ruta)
+        emit('stream_joined', {'stream': ruta, 'streams': list(gestor_streams.streams)})
+    visores.registrar(request.sid, ruta)
+
+
+@socketio.on('frame_ack')
+def handle_frame_ack(data):
+    """Recibe del navegador el tiempo entre la recepción y la visualización de un frame.
+    
+    El ack libera la ventana de envío del cliente; los frames que el navegador
+    descartó sin mostrar ('descartado') no cuentan para la latencia.
+    """
+    try:
+        traza = int(data['trace'])
+        navegador = float(data.get('display_ms', 0.0)) / 1000.0
+    except (TypeError, KeyError, ValueError):
+        return
+    t_envio = visores.ack(request.sid, traza, navegador)
+    if not data.get('descartado'):
+        trazador.ack(traza, navegador, t_envio)
+
+
+@socketio.on('join_stream')
+def handle_join_stream(data):
+    """Suscribe al cliente a la sala de un stream (modo multi-dron)."""
+    ruta = str((data or {}).get('stream', '')).strip('/')
+    if gestor_streams is None or ruta not in gestor_streams.streams:
+        emit('stream_error', {'error': f"Stream '{ruta}' no válido"})
+        return
+    # Un stream por cliente: salir de las demás salas
+    for otra in gestor_streams.streams:
+        if otra != ruta:
+            leave_room(otra)
+    join_room(ruta)
+    visores.cambiar_sala(request.sid, ruta)
+    emit('stream_joined', {'stream': ruta, 'streams': list(gestor_streams.streams)})
 
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Maneja la desconexión de un cliente WebSocket."""
     print(f"[INFO] Cliente WebSocket desconectado: {request.remote_addr}")
+    visores.quitar(request.sid)
 
 
 def cleanup_temp_videos():
@@ -771,10 +1690,14 @@ def cleanup_temp_videos():
         current_time = time.time()
         max_age = 3600  # 1 hora en segundos
         
+        # Los archivos de conversiones vivas se borran por referencias, no por antigüedad
+        conversiones.purgar(config.CONVERT_MAX_AGE)
+        en_uso = conversiones.archivos()
+        
         for filename in os.listdir(temp_dir):
             file_path = os.path.join(temp_dir, filename)
             try:
-                if os.path.isfile(file_path):
+                if os.path.isfile(file_path) and file_path not in en_uso:
                     file_age = current_time - os.path.getmtime(file_path)
                     if file_age > max_age:
                         os.remove(file_path)
@@ -798,9 +1721,21 @@ def cleanup():
     if cap is not None:
         cap.release()
     
+    if gestor_streams is not None:
+        gestor_streams.cerrar()
+    
     if writer is not None:
         writer.release()
     
+    if pool is not None:
+        pool.cerrar()
+    
+    for publicador in publicadores.values():
+        publicador.cerrar()
+    
+    for _, grabador in list(grabaciones.values()):
+        grabador.release()
+    
     if mediamtx_proc is not None:
         detener_mediamtx(mediamtx_proc)
     
@@ -7,6 +7,7 @@ const socket = io();
 let inferenceActive = false;
 let statusInterval = null;
 let currentModel = 'uav';
+let currentStream = null; // Ruta del stream en modo multi-dron (null = stream único)
 let availableClasses = {}; // Diccionario {id: nombre} de clases disponibles
 let selectedClasses = []; // Lista de nombres de clases seleccionadas
 let classColors = {}; // Diccionario {nombre_clase: [R, G, B]} para colores
@@ -21,6 +22,13 @@ let recordingStream = null;
 let isRecording = false;
 let recordedFrames = []; // Almacenar frames individuales para MP4
 let recordingStartTime = null;
+let grabacionServidor = false; // El servidor graba el video anotado (config.RECORD_SERVER)
+let grabacionServidorId = null; // Grabación en curso en el servidor
+let segmentosGrabados = []; // Segmentos MP4 de la última grabación en el servidor
+let subidaEnVivo = null; // Promesa de la subida en vivo ({id, bloques, error}) o null
+let colaSubida = Promise.resolve(); // Encadena los fragmentos para que lleguen en orden
+let finGrabacion = Promise.resolve(); // Se resuelve cuando MediaRecorder entrega el último fragmento
+const ESPERAS_REINTENTO_SUBIDA = [500, 1000, 2000, 4000]; // ms entre reintentos de un fragmento
 
 // Traducción de clases al español
 const classTranslations = {
@@ -89,6 +97,10 @@ const confidenceValue = document.getElementById('confidence-value');
 // Eventos WebSocket
 socket.on('connect', () => {
     console.log('Conectado al servidor');
+    // Tras una reconexión, volver a la sala del stream que se estaba viendo
+    if (currentStream) {
+        socket.emit('join_stream', { stream: currentStream });
+    }
     updateConnectionStatus(true);
     loadStatus();
     startStatusPolling();
@@ -104,73 +116,228 @@ socket.on('connected', (data) => {
     console.log('Mensaje del servidor:', data.message);
 });
 
+// Decodificación de frames: el JPEG se decodifica fuera del hilo principal
+// (createImageBitmap) y se dibuja en el canvas de video
+const videoContext = videoFrame.getContext('2d');
+const textDecoder = new TextDecoder();
+let framesRecibidos = 0;  // Orden de llegada (la decodificación es asíncrona)
+let ultimoFramePintado = 0;
+
+const CAMPOS_CAJA = 7;  // x1, y1, x2, y2, confianza, clase, track (-1 sin tracker)
+
+// Separa un mensaje binario del evento 'frame': longitud de la cabecera
+// (uint32 big-endian), cabecera JSON con los metadatos, cajas del overlay
+// (float32, solo con overlay en el cliente) y el JPEG
+function desempaquetarFrame(buffer) {
+    const largoCabecera = new DataView(buffer).getUint32(0);
+    const meta = JSON.parse(textDecoder.decode(new Uint8Array(buffer, 4, largoCabecera)));
+    let inicioJpeg = 4 + largoCabecera;
+    if (meta.cajas !== undefined) {
+        const cajas = new Float32Array(buffer, inicioJpeg, meta.cajas * CAMPOS_CAJA);
+        inicioJpeg += cajas.byteLength;
+        meta.cajas = cajas;
+    }
+    const jpeg = new Blob([new Uint8Array(buffer, inicioJpeg)], { type: 'image/jpeg' });
+    return { meta, jpeg };
+}
+
+// Frame en base64 dentro del JSON (servidor con WS_BINARY = False)
+function base64ABlob(base64) {
+    const binario = atob(base64);
+    const bytes = new Uint8Array(binario.length);
+    for (let i = 0; i < binario.length; i++) {
+        bytes[i] = binario.charCodeAt(i);
+    }
+    return new Blob([bytes], { type: 'image/jpeg' });
+}
+
+// Overlay en el cliente: dibuja las cajas con los colores y el filtro de clases
+// de este navegador, escaladas desde la resolución original del frame
+function dibujarCajas(cajas, tamano) {
+    const escalaX = videoFrame.width / tamano[0];
+    const escalaY = videoFrame.height / tamano[1];
+    videoContext.lineWidth = 2;
+    videoContext.font = '12px sans-serif';
+    for (let i = 0; i < cajas.length; i += CAMPOS_CAJA) {
+        const nombre = availableClasses[cajas[i + 5]];
+        if (nombre === undefined || (selectedClasses.length > 0 && !selectedClasses.includes(nombre))) {
+            continue;
+        }
+        const [r, g, b] = getClassColor(nombre);
+        const x = cajas[i] * escalaX;
+        const y = cajas[i + 1] * escalaY;
+        videoContext.strokeStyle = `rgb(${r}, ${g}, ${b})`;
+        videoContext.strokeRect(x, y, (cajas[i + 2] - cajas[i]) * escalaX, (cajas[i + 3] - cajas[i + 1]) * escalaY);
+        if (cajas[i + 6] >= 0) {
+            videoContext.fillStyle = `rgb(${r}, ${g}, ${b})`;
+            videoContext.fillText(`#${cajas[i + 6]}`, x + 2, y - 3);
+        }
+    }
+}
+
+// Confirma al servidor que un frame se mostró (en el siguiente repintado tras dibujarlo)
+function ackFrameMostrado(trace, seq, recibido) {
+    requestAnimationFrame(() => {
+        socket.emit('frame_ack', {
+            trace: trace,
+            seq: seq,
+            display_ms: performance.now() - recibido
+        });
+    });
+}
+
+// Confirma un frame que no se va a mostrar: libera la ventana de envío del
+// servidor sin contar para la latencia
+function ackFrameDescartado(meta) {
+    if (meta.trace !== undefined) {
+        socket.emit('frame_ack', { trace: meta.trace, seq: meta.seq, descartado: true });
+    }
+}
+
+function mostrarFrame(jpeg, meta, recibido) {
+    const orden = ++framesRecibidos;
+    createImageBitmap(jpeg)
+        .then((bitmap) => {
+            // Un frame posterior terminó de decodificarse antes y ya se pintó
+            if (orden < ultimoFramePintado) {
+                bitmap.close();
+                ackFrameDescartado(meta);
+                return;
+            }
+            ultimoFramePintado = orden;
+            if (videoFrame.width !== bitmap.width || videoFrame.height !== bitmap.height) {
+                videoFrame.width = bitmap.width;
+                videoFrame.height = bitmap.height;
+            }
+            videoContext.drawImage(bitmap, 0, 0);
+            if (meta.cajas) {
+                dibujarCajas(meta.cajas, meta.tamano);
+            }
+            videoPlaceholder.style.display = 'none';
+            
+            // Trazado de latencia: devolver al servidor el tiempo hasta que el frame se pinta
+            if (meta.trace !== undefined) {
+                ackFrameMostrado(meta.trace, meta.seq, recibido);
+            }
+            
+            // Si estamos grabando, capturar el frame en el canvas
+            if (isRecording && !grabacionServidorId && recordingContext) {
+                capturarFrameGrabacion(videoFrame);
+            }
+            bitmap.close();
+        })
+        .catch((error) => {
+            console.error('Error al decodificar frame:', error);
+            ackFrameDescartado(meta);
+        });
+}
+
+// Copia el frame mostrado (con el overlay si lo hay) en el canvas de grabación
+function capturarFrameGrabacion(origen) {
+    try {
+        // Limpiar canvas antes de dibujar
+        recordingContext.clearRect(0, 0, recordingCanvas.width, recordingCanvas.height);
+        // Dibujar el frame en el canvas
+        recordingContext.drawImage(origen, 0, 0, recordingCanvas.width, recordingCanvas.height);
+        
+        // Si usamos MediaRecorder, ya está grabando automáticamente
+        // Si no, guardar frame individual para MP4
+        if (!mediaRecorder || mediaRecorder.state !== 'recording') {
+            // Guardar frame como imagen para luego crear MP4
+            const timestamp = Date.now() - (recordingStartTime || Date.now());
+            recordingCanvas.toBlob((blob) => {
+                if (blob) {
+                    recordedFrames.push({
+                        blob: blob,
+                        timestamp: timestamp
+                    });
+                }
+            }, 'image/jpeg', 0.92);
+        }
+    } catch (error) {
+        console.error('Error al dibujar frame en canvas:', error);
+    }
+}
+
+// Modo multi-dron: el servidor confirma la sala del stream que se recibe
+socket.on('stream_joined', (data) => {
+    currentStream = data.stream;
+    console.log('Viendo stream:', data.stream, '- disponibles:', data.streams);
+});
+
+socket.on('stream_error', (data) => {
+    console.error('Error de stream:', data.error);
+});
+
+// Cambia el stream (dron) que se visualiza en modo multi-dron
+function joinStream(streamPath) {
+    socket.emit('join_stream', { stream: streamPath });
+}
+
+// Progreso del cambio de modelo (el modelo anterior sigue sirviendo mientras tanto)
+socket.on('model_status', (data) => {
+    console.log(`Modelo ${data.model}: ${data.stage} (${data.progress}%)`);
+    if (data.stage === 'listo') {
+        currentModel = data.model;
+        availableClasses = data.classes || {};
+        // Limpiar clases seleccionadas al cambiar modelo
+        selectedClasses = [];
+        classColors = {};
+        renderClasses();
+        updateInferenceConfig();
+    } else if (data.stage === 'error') {
+        alert('Error: ' + (data.error || 'No se pudo cambiar el modelo'));
+    }
+});
+
 socket.on('frame', (data) => {
+    const recibido = performance.now();
+    let meta = data;
+    let jpeg = null;
+    if (data instanceof ArrayBuffer) {
+        ({ meta, jpeg } = desempaquetarFrame(data));
+    } else if (data.frame) {
+        jpeg = base64ABlob(data.frame);
+        if (data.cajas) {
+            meta.cajas = Float32Array.from(data.cajas.flat());
+        }
+    }
+    
+    // Ignorar frames de otro stream que lleguen justo después de cambiar de sala
+    if (meta.stream && currentStream && meta.stream !== currentStream) {
+        ackFrameDescartado(meta);
+        return;
+    }
+    
     // Manejar error de stream
-    if (data.error) {
-        videoPlaceholder.textContent = data.error;
+    if (meta.error) {
+        videoPlaceholder.textContent = meta.error;
         videoPlaceholder.style.display = 'block';
-        videoFrame.src = '';
+        videoContext.clearRect(0, 0, videoFrame.width, videoFrame.height);
         return;
     }
     
     // Mostrar frame
-    if (data.frame) {
-        const frameSrc = 'data:image/jpeg;base64,' + data.frame;
-        videoFrame.src = frameSrc;
-        videoPlaceholder.style.display = 'none';
-        
-        // Si estamos grabando, capturar el frame en el canvas
-        if (isRecording && recordingContext) {
-            const img = new Image();
-            img.crossOrigin = 'anonymous'; // Permitir CORS si es necesario
-            img.onload = () => {
-                try {
-                    // Limpiar canvas antes de dibujar
-                    recordingContext.clearRect(0, 0, recordingCanvas.width, recordingCanvas.height);
-                    // Dibujar el frame en el canvas
-                    recordingContext.drawImage(img, 0, 0, recordingCanvas.width, recordingCanvas.height);
-                    
-                    // Si usamos MediaRecorder, ya está grabando automáticamente
-                    // Si no, guardar frame individual para MP4
-                    if (!mediaRecorder || mediaRecorder.state !== 'recording') {
-                        // Guardar frame como imagen para luego crear MP4
-                        const timestamp = Date.now() - (recordingStartTime || Date.now());
-                        recordingCanvas.toBlob((blob) => {
-                            if (blob) {
-                                recordedFrames.push({
-                                    blob: blob,
-                                    timestamp: timestamp
-                                });
-                            }
-                        }, 'image/jpeg', 0.92);
-                    }
-                } catch (error) {
-                    console.error('Error al dibujar frame en canvas:', error);
-                }
-            };
-            img.onerror = () => {
-                console.error('Error al cargar imagen para grabación');
-            };
-            img.src = frameSrc;
-        }
+    if (jpeg) {
+        mostrarFrame(jpeg, meta, recibido);
     } else {
         videoPlaceholder.textContent = 'Esperando video...';
         videoPlaceholder.style.display = 'block';
     }
     
     // Actualizar métricas
-    if (data.fps !== undefined) {
-        fpsValue.textContent = data.fps.toFixed(1);
+    if (meta.fps !== undefined) {
+        fpsValue.textContent = meta.fps.toFixed(1);
     }
-    if (data.fps_prom !== undefined) {
-        fpsAvgValue.textContent = data.fps_prom.toFixed(1);
+    if (meta.fps_prom !== undefined) {
+        fpsAvgValue.textContent = meta.fps_prom.toFixed(1);
     }
-    if (data.frames !== undefined) {
-        framesValue.textContent = data.frames;
+    if (meta.frames !== undefined) {
+        framesValue.textContent = meta.frames;
     }
     
     // Actualizar detecciones
-    updateDetections(data.detecciones || {});
+    updateDetections(meta.detecciones || {});
 });
 
 // Funciones de UI
@@ -215,6 +382,11 @@ function startRecording() {
         return;
     }
     
+    // Con grabación en el servidor no se codifica nada en el navegador
+    if (grabacionServidor) {
+        return startServerRecording();
+    }
+    
     try {
         // Verificar soporte de MediaRecorder
         if (!navigator.mediaDevices || !MediaRecorder) {
@@ -225,10 +397,10 @@ function startRecording() {
         recordedChunks = [];
         
         // Asegurar que el canvas tenga el tamaño correcto
-        if (videoFrame.complete && videoFrame.naturalWidth > 0) {
-            // Si la imagen ya está cargada, usar su tamaño real
-            recordingCanvas.width = videoFrame.naturalWidth || 640;
-            recordingCanvas.height = videoFrame.naturalHeight || 480;
+        if (ultimoFramePintado > 0) {
+            // Si ya se pintó algún frame, usar su tamaño real
+            recordingCanvas.width = videoFrame.width || 640;
+            recordingCanvas.height = videoFrame.height || 480;
         } else {
             // Usar tamaño por defecto
             recordingCanvas.width = 640;
@@ -240,32 +412,40 @@ function startRecording() {
         recordingStream = recordingCanvas.captureStream(fps);
         
         // Configurar MediaRecorder
+        // Preferir H.264 (MP4 en Safari/iPad, WebM en Chrome): el servidor solo
+        // remultiplexa a MP4 sin recodificar. Si no, vp9, vp8 o el tipo por defecto
+        const tiposPreferidos = [
+            'video/mp4;codecs=avc1',
+            'video/mp4',
+            'video/webm;codecs=h264',
+            'video/webm;codecs=vp9',
+            'video/webm;codecs=vp8',
+            'video/webm'
+        ];
         const options = {
-            mimeType: 'video/webm;codecs=vp9',
+            mimeType: tiposPreferidos.find((tipo) => MediaRecorder.isTypeSupported(tipo)) || '',
             videoBitsPerSecond: 2500000 // 2.5 Mbps
         };
         
-        // Intentar con codec vp9, si falla usar vp8
-        if (!MediaRecorder.isTypeSupported(options.mimeType)) {
-            options.mimeType = 'video/webm;codecs=vp8';
-        }
-        
-        // Si vp8 tampoco está disponible, usar el tipo por defecto
-        if (!MediaRecorder.isTypeSupported(options.mimeType)) {
-            options.mimeType = 'video/webm';
-        }
-        
         mediaRecorder = new MediaRecorder(recordingStream, options);
         
+        // Cada fragmento se sube al servidor en cuanto existe (en orden) y se guarda
+        // también en memoria: si la subida en vivo falla, el video se sube entero al terminar
+        subidaEnVivo = iniciarSubidaEnVivo(mediaRecorder.mimeType || options.mimeType);
+        colaSubida = Promise.resolve();
         mediaRecorder.ondataavailable = (event) => {
             if (event.data && event.data.size > 0) {
-                recordedChunks.push(event.data);
+                const datos = event.data;
+                colaSubida = colaSubida.then(() => subirFragmento(datos));
             }
         };
         
-        mediaRecorder.onstop = () => {
-            console.log('MediaRecorder detenido. Chunks guardados:', recordedChunks.length);
-        };
+        finGrabacion = new Promise((resolve) => {
+            mediaRecorder.onstop = () => {
+                console.log('MediaRecorder detenido. Chunks guardados:', recordedChunks.length);
+                resolve();
+            };
+        });
         
         mediaRecorder.onerror = (event) => {
             console.error('Error en MediaRecorder:', event.error);
@@ -288,6 +468,9 @@ function startRecording() {
 }
 
 function stopRecording() {
+    if (grabacionServidorId) {
+        return stopServerRecording();
+    }
     if (!isRecording || !mediaRecorder) return;
     
     try {
@@ -309,8 +492,177 @@ function stopRecording() {
     }
 }
 
+// Subida en vivo de la grabación del navegador (/api/video/upload): el servidor
+// convierte cada fragmento sobre la marcha y el MP4 está listo al terminar
+async function iniciarSubidaEnVivo(mime) {
+    try {
+        const response = await fetch(`/api/video/upload?sid=${encodeURIComponent(socket.id || '')}`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ mime: mime })
+        });
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.error || 'Error desconocido');
+        }
+        console.log('Subida en vivo iniciada:', data.id, '-', data.modo);
+        return { id: data.id, bloques: 0, error: null };
+    } catch (error) {
+        console.warn('Sin subida en vivo, el video se subirá al terminar:', error.message);
+        return null;
+    }
+}
+
+async function subirFragmento(datos) {
+    recordedChunks.push(datos);
+    const subida = await subidaEnVivo;
+    if (!subida || subida.error) return;
+    for (let intento = 0; ; intento++) {
+        try {
+            const response = await fetch(`/api/video/upload/${subida.id}/append?n=${subida.bloques}`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/octet-stream' },
+                body: datos
+            });
+            const data = await response.json().catch(() => ({}));
+            // Si se perdió la respuesta de un intento anterior, el servidor ya tiene el fragmento
+            if (response.ok || data.bloques === subida.bloques + 1) {
+                subida.bloques += 1;
+                return;
+            }
+            throw new Error(data.error || `HTTP ${response.status}`);
+        } catch (error) {
+            if (intento >= ESPERAS_REINTENTO_SUBIDA.length) {
+                console.error('Subida en vivo abandonada, el video se subirá entero al terminar:', error);
+                subida.error = error.message;
+                return;
+            }
+            console.warn(`Error al subir fragmento ${subida.bloques}, reintentando:`, error.message);
+            await new Promise((resolve) => setTimeout(resolve, ESPERAS_REINTENTO_SUBIDA[intento]));
+        }
+    }
+}
+
+// Espera a que se suba el último fragmento y devuelve la subida en vivo (o null)
+async function tomarSubidaEnVivo() {
+    if (!subidaEnVivo) return null;
+    const subida = await subidaEnVivo;
+    subidaEnVivo = null;
+    // Los fragmentos pendientes acaban en recordedChunks (y en el servidor si la subida sigue viva)
+    await finGrabacion;
+    await colaSubida;
+    return subida;
+}
+
+async function descartarSubidaEnVivo() {
+    const subida = await tomarSubidaEnVivo();
+    if (subida) {
+        fetch(`/api/video/upload/${subida.id}`, { method: 'DELETE' }).catch(() => {});
+    }
+}
+
+// Grabación en el servidor: segmentos MP4 del video anotado (/api/recording)
+async function startServerRecording() {
+    try {
+        const response = await fetch('/api/recording/start', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ stream: currentStream })
+        });
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.error || 'Error desconocido');
+        }
+        grabacionServidorId = data.id;
+        segmentosGrabados = [];
+        isRecording = true;
+        recordingStartTime = Date.now();
+        console.log('Grabación en el servidor iniciada:', data.id);
+    } catch (error) {
+        console.error('Error al iniciar grabación en el servidor:', error);
+        alert('No se pudo iniciar la grabación en el servidor: ' + error.message);
+    }
+}
+
+async function stopServerRecording() {
+    grabacionServidorId = null;
+    isRecording = false;
+    try {
+        const response = await fetch('/api/recording/stop', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ stream: currentStream })
+        });
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.error || 'Error desconocido');
+        }
+        segmentosGrabados = data.segmentos || [];
+        console.log('Grabación en el servidor terminada:', data.id, '- segmentos:', segmentosGrabados.length);
+    } catch (error) {
+        console.error('Error al detener grabación en el servidor:', error);
+    }
+}
+
+// Los segmentos ya están en MP4: se descargan directamente, sin conversión
+function descargarSegmentos() {
+    segmentosGrabados.forEach((segmento, indice) => {
+        // Espaciar las descargas para que el navegador no bloquee las siguientes
+        setTimeout(() => {
+            const a = document.createElement('a');
+            a.href = segmento.url;
+            a.download = '';
+            document.body.appendChild(a);
+            a.click();
+            document.body.removeChild(a);
+        }, indice * 500);
+    });
+    segmentosGrabados = [];
+}
+
+// Descarga el MP4 de una conversión terminada en el servidor
+async function descargarConversion(id) {
+    const response = await fetch(`/api/video/jobs/${id}/download`);
+    if (!response.ok) {
+        const errorData = await response.json().catch(() => ({ error: 'Error desconocido' }));
+        throw new Error(errorData.error || 'Error al convertir video en el servidor');
+    }
+    
+    // El servidor envía el MP4 como descarga
+    const blob = await response.blob();
+    const url = URL.createObjectURL(blob);
+    const a = document.createElement('a');
+    a.href = url;
+    
+    // Obtener nombre del archivo del header Content-Disposition o generar uno
+    const contentDisposition = response.headers.get('Content-Disposition');
+    let filename = 'deteccion-uav.mp4';
+    if (contentDisposition) {
+        const filenameMatch = contentDisposition.match(/filename[^;=\n]*=((['"]).*?\2|[^;\n]*)/);
+        if (filenameMatch && filenameMatch[1]) {
+            filename = filenameMatch[1].replace(/['"]/g, '');
+        }
+    }
+    
+    a.download = filename;
+    document.body.appendChild(a);
+    a.click();
+    document.body.removeChild(a);
+    
+    // Liberar URL
+    setTimeout(() => {
+        URL.revokeObjectURL(url);
+    }, 100);
+    
+    console.log('Video descargado en formato MP4');
+}
+
 async function downloadVideo() {
-    if (recordedChunks.length === 0 && recordedFrames.length === 0) {
+    if (segmentosGrabados.length > 0) {
+        descargarSegmentos();
+        return;
+    }
+    if (!subidaEnVivo && recordedChunks.length === 0 && recordedFrames.length === 0) {
         alert('No hay video grabado para descargar');
         return;
     }
@@ -322,62 +674,62 @@ async function downloadVideo() {
         processingMsg.innerHTML = 'Convirtiendo video a MP4 en el servidor...<br>Por favor espera.';
         document.body.appendChild(processingMsg);
         
+        // Subida en vivo: el servidor ya fue convirtiendo los fragmentos, solo falta cerrarla.
+        // Si falló, se descarta y el video completo (recordedChunks) se sube como antes
+        const subida = await tomarSubidaEnVivo();
+        if (subida && subida.error) {
+            console.warn('La subida en vivo falló, se sube el video completo:', subida.error);
+            fetch(`/api/video/upload/${subida.id}`, { method: 'DELETE' }).catch(() => {});
+        } else if (subida) {
+            try {
+                const respuesta = await fetch(`/api/video/upload/${subida.id}/finish`, { method: 'POST' });
+                if (!respuesta.ok) {
+                    const errorData = await respuesta.json().catch(() => ({ error: 'Error desconocido' }));
+                    throw new Error(errorData.error || 'Error al cerrar la subida');
+                }
+                const final = await esperarConversion(subida.id, processingMsg);
+                if (final.estado !== 'listo') {
+                    throw new Error(final.error || 'Error al convertir video en el servidor');
+                }
+                await descargarConversion(subida.id);
+                recordedChunks = [];
+                document.body.removeChild(processingMsg);
+                return;
+            } catch (error) {
+                // Los fragmentos siguen en memoria: se sube el video completo como antes
+                console.error('Error al convertir la subida en vivo, se sube el video completo:', error);
+            }
+        }
+        
         // Si tenemos chunks de MediaRecorder, enviar al servidor para conversión
         if (recordedChunks.length > 0) {
-            const webmBlob = new Blob(recordedChunks, { type: 'video/webm' });
-            
-            // Crear FormData para enviar el video
-            const formData = new FormData();
-            formData.append('video', webmBlob, 'recording.webm');
+            const webmBlob = new Blob(recordedChunks, { type: mediaRecorder.mimeType || 'video/webm' });
             
             try {
-                // Enviar al servidor para conversión
-                const response = await fetch('/api/video/convert', {
+                // Subir el video en crudo (el servidor lo vuelca a disco por bloques) y encolar la conversión
+                const respuestaTrabajo = await fetch(`/api/video/convert?sid=${encodeURIComponent(socket.id || '')}`, {
                     method: 'POST',
-                    body: formData
+                    headers: { 'Content-Type': webmBlob.type },
+                    body: webmBlob
                 });
+                const trabajo = await respuestaTrabajo.json().catch(() => ({ error: 'Error desconocido' }));
+                if (!respuestaTrabajo.ok) {
+                    throw new Error(trabajo.error || 'Error al enviar video al servidor');
+                }
                 
-                if (response.ok) {
-                    // El servidor envía el MP4 directamente como descarga
-                    const blob = await response.blob();
-                    const url = URL.createObjectURL(blob);
-                    const a = document.createElement('a');
-                    a.href = url;
-                    
-                    // Obtener nombre del archivo del header Content-Disposition o generar uno
-                    const contentDisposition = response.headers.get('Content-Disposition');
-                    let filename = 'deteccion-uav.mp4';
-                    if (contentDisposition) {
-                        const filenameMatch = contentDisposition.match(/filename[^;=\n]*=((['"]).*?\2|[^;\n]*)/);
-                        if (filenameMatch && filenameMatch[1]) {
-                            filename = filenameMatch[1].replace(/['"]/g, '');
-                        }
-                    }
-                    
-                    a.download = filename;
-                    document.body.appendChild(a);
-                    a.click();
-                    document.body.removeChild(a);
-                    
-                    // Liberar URL
-                    setTimeout(() => {
-                        URL.revokeObjectURL(url);
-                    }, 100);
-                    
-                    // Remover mensaje de procesamiento
-                    document.body.removeChild(processingMsg);
-                    
-                    // Limpiar
-                    recordedChunks = [];
-                    recordedFrames = [];
-                    
-                    console.log('Video descargado en formato MP4');
-                    return;
-                } else {
-                    // Error en el servidor
-                    const errorData = await response.json().catch(() => ({ error: 'Error desconocido' }));
-                    throw new Error(errorData.error || 'Error al convertir video en el servidor');
+                const final = await esperarConversion(trabajo.id, processingMsg);
+                if (final.estado !== 'listo') {
+                    throw new Error(final.error || 'Error al convertir video en el servidor');
                 }
+                await descargarConversion(trabajo.id);
+                
+                // Remover mensaje de procesamiento
+                document.body.removeChild(processingMsg);
+                
+                // Limpiar
+                recordedChunks = [];
+                recordedFrames = [];
+                return;
             } catch (error) {
                 console.error('Error al convertir video:', error);
                 document.body.removeChild(processingMsg);
@@ -396,11 +748,11 @@ async function downloadVideo() {
                                   '¿Deseas descargarlo como WebM de todas formas?';
                     
                     if (confirm(message)) {
-                        downloadBlob(webmBlob, 'webm');
+                        downloadBlob(webmBlob, webmBlob.type.includes('mp4') ? 'mp4' : 'webm');
                     }
                 } else {
                     alert('Error al convertir video: ' + error.message + '\n\nSe descargará como WebM.');
-                    downloadBlob(webmBlob, 'webm');
+                    downloadBlob(webmBlob, webmBlob.type.includes('mp4') ? 'mp4' : 'webm');
                 }
                 return;
             }
@@ -416,6 +768,56 @@ async function downloadVideo() {
     }
 }
 
+// Conversiones en el servidor: el progreso llega por Socket.IO ('convert_progress')
+const conversionesPendientes = {}; // {id: función(estado)} de las conversiones en espera
+
+socket.on('convert_progress', (estado) => {
+    const actualizar = conversionesPendientes[estado.id];
+    if (actualizar) {
+        actualizar(estado);
+    }
+});
+
+// Espera a que termine una conversión mostrando su progreso; resuelve con el estado final
+function esperarConversion(id, processingMsg) {
+    return new Promise((resolve) => {
+        let terminado = false;
+        let sondeo = null;
+        const actualizar = (estado) => {
+            if (terminado) return;
+            if (estado.estado === 'listo' || estado.estado === 'error') {
+                terminado = true;
+                delete conversionesPendientes[id];
+                clearInterval(sondeo);
+                resolve(estado);
+                return;
+            }
+            if (estado.estado === 'en_cola') {
+                processingMsg.innerHTML = 'Video en cola de conversión...<br>Por favor espera.';
+            } else {
+                const accion = estado.modo === 'remux' ? 'Remultiplexando' : 'Convirtiendo';
+                const avance = estado.progreso !== null ? `${Math.round(estado.progreso * 100)}%` : `${estado.segundos} s`;
+                processingMsg.innerHTML = `${accion} video a MP4 en el servidor... ${avance}<br>Por favor espera.`;
+            }
+        };
+        conversionesPendientes[id] = actualizar;
+        
+        // Respaldo por si se pierde algún evento (p. ej. reconexión del socket)
+        sondeo = setInterval(async () => {
+            try {
+                const respuesta = await fetch(`/api/video/jobs/${id}`);
+                if (respuesta.ok) {
+                    actualizar(await respuesta.json());
+                } else if (respuesta.status === 404) {
+                    actualizar({ id: id, estado: 'error', error: 'Trabajo no encontrado' });
+                }
+            } catch (error) {
+                console.error('Error al consultar conversión:', error);
+            }
+        }, 2000);
+    });
+}
+
 async function createMP4FromFrames(frames) {
     // Esta función crearía un MP4 desde frames individuales
     // Por ahora, retornamos null ya que requiere una librería compleja
@@ -486,8 +888,8 @@ async function startInference() {
 
 async function stopInference() {
     try {
-        // Detener grabación primero
-        stopRecording();
+        // Detener grabación primero (en el servidor, espera a que se cierre el último segmento)
+        await stopRecording();
         
         const response = await fetch('/api/inference/stop', {
             method: 'POST',
@@ -504,7 +906,7 @@ async function stopInference() {
             // Esperar un momento para que MediaRecorder termine de procesar
             setTimeout(() => {
                 // Mostrar diálogo para guardar video
-                if (recordedChunks.length > 0) {
+                if (subidaEnVivo || recordedChunks.length > 0 || segmentosGrabados.length > 0) {
                     const saveVideo = confirm(
                         '¿Deseas guardar el video de las detecciones?\n\n' +
                         'El video se descargará en tu dispositivo.'
@@ -513,8 +915,10 @@ async function stopInference() {
                     if (saveVideo) {
                         downloadVideo();
                     } else {
-                        // Limpiar chunks si no quiere guardar
+                        // Limpiar chunks si no quiere guardar (los segmentos siguen en /api/recordings)
                         recordedChunks = [];
+                        segmentosGrabados = [];
+                        descartarSubidaEnVivo();
                     }
                 } else {
                     console.log('No hay video grabado para guardar');
@@ -573,6 +977,8 @@ async function loadStatus() {
             btnInferencia.classList.add('active');
         }
         
+        grabacionServidor = !!(data.grabacion && data.grabacion.servidor);
+        
         // Actualizar estado del stream
         streamStatus.textContent = data.stream_connected ? 'Conectado' : 'Desconectado';
         
@@ -615,7 +1021,10 @@ async function changeModel(modelName) {
         
         const data = await response.json();
         
-        if (response.ok) {
+        if (response.status === 202) {
+            // Carga en segundo plano: las clases llegan con el evento 'model_status'
+            console.log('Cargando modelo:', modelName);
+        } else if (response.ok) {
             console.log('Modelo cambiado a:', modelName);
             currentModel = modelName;
             